@@ -0,0 +1,365 @@
+"""
+离线基准测试：在 ./cache 的临时副本上测量数据加载和策略热点路径的耗时与内存。
+
+    python bench/run_bench.py                    # 运行全部用例，与基线比较
+    python bench/run_bench.py --save-baseline    # 运行后把结果存为基线
+    python bench/run_bench.py backtest_s0_ub1 boll_find_s1 --limit 300
+
+每个用例在单独的子进程里运行，峰值内存互不影响。全程离线：实时快照用按代码生成的
+固定数据代替 stock_zh_a_spot_em，任何联网请求都会报错。结果同时写入 bench_output.txt。
+
+基线 bench/baseline.json 故意不入库：耗时只在同一台机器上可比，换机器或新克隆后
+要先用 --save-baseline 在改动前的代码上跑一次，之后的运行才有基线可比。
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+import numpy as np
+import pandas as pd
+from typing import Callable, Dict, List, NamedTuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_FILE = os.path.join(ROOT, "bench", "baseline.json")
+OUTPUT_FILE = os.path.join(ROOT, "bench_output.txt")
+SPOT_FILE = "bench_spot.pkl"       # 工作目录中的合成快照
+RESULT_PREFIX = "BENCH_RESULT "
+SPOT_SEED = 20230103
+DEFAULT_LIMIT = 500                # 逐只回测/监测用例的股票数
+SLOWER_RATIO = 1.10                # 比基线慢 10% 以上时标记
+
+# 回测参数：区间放宽，尽量让每只股票都走完撮合
+BACKTEST_PARAMS = dict(period_s="2023-01-16", sh_min=3000, sh_max=3800,
+                       marketValMin=20, marketValMax=20000, peRatioMin=0, peRatioMax=200)
+FIND_PARAMS = dict(marketValMin=20, marketValMax=20000, peRatioMin=0, peRatioMax=200)
+
+
+def peak_rss_mb() -> float:
+    """本进程到目前为止的峰值常驻内存（MB）"""
+    if sys.platform == 'win32':
+        import ctypes
+        from ctypes import wintypes
+
+        class ProcessMemoryCounters(ctypes.Structure):
+            _fields_ = [('cb', wintypes.DWORD), ('PageFaultCount', wintypes.DWORD),
+                        ('PeakWorkingSetSize', ctypes.c_size_t), ('WorkingSetSize', ctypes.c_size_t),
+                        ('QuotaPeakPagedPoolUsage', ctypes.c_size_t), ('QuotaPagedPoolUsage', ctypes.c_size_t),
+                        ('QuotaPeakNonPagedPoolUsage', ctypes.c_size_t), ('QuotaNonPagedPoolUsage', ctypes.c_size_t),
+                        ('PagefileUsage', ctypes.c_size_t), ('PeakPagefileUsage', ctypes.c_size_t)]
+
+        counters = ProcessMemoryCounters()
+        counters.cb = ctypes.sizeof(counters)
+        ctypes.windll.psapi.GetProcessMemoryInfo(ctypes.windll.kernel32.GetCurrentProcess(),
+                                                 ctypes.byref(counters), counters.cb)
+        return counters.PeakWorkingSetSize / 2 ** 20
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2 ** 20 if sys.platform == 'darwin' else peak / 1024
+
+
+def synthetic_spot(codes: List[str], closes: np.ndarray, names: Dict[str, str]) -> pd.DataFrame:
+    """按代码顺序和固定种子生成的实时快照：最新价取最后收盘价，市值/市盈率为固定的伪随机数"""
+    rng = np.random.default_rng(SPOT_SEED)
+    n = len(codes)
+    return pd.DataFrame({
+        '序号': np.arange(1, n + 1),
+        '代码': codes,
+        '名称': [names.get(code) or code for code in codes],
+        '最新价': closes,
+        '总市值': np.exp(rng.uniform(np.log(20), np.log(5000), n)) * 100000000,
+        '市盈率-动态': rng.uniform(-20, 150, n).round(2),
+        '日期': time.strftime('%Y-%m-%d'),
+    })
+
+
+# ---------------- 用例 ----------------
+# prepare(limit) 不计时，返回 run 的输入；run(state) 计时，返回处理的股票数
+
+class Case(NamedTuple):
+    prepare: Callable[[int], object]
+    run: Callable[[object], int]
+    limited: bool = False  # 是否受 --limit 限制
+
+
+def _codes(limit: int = None) -> List[str]:
+    from view.policy.stock import get_bar_store
+    codes = get_bar_store().codes()
+    return codes[:limit] if limit else codes
+
+
+def _period_e() -> str:
+    from view.policy.stock import get_sh_series
+    return pd.Timestamp(get_sh_series().index.max()).strftime("%Y-%m-%d")
+
+
+def _run_cold_load(backing: str):
+    def run(_):
+        from view.policy.stock import get_stock_data
+        return len(get_stock_data(backing=backing))
+    return Case(lambda limit: None, run)
+
+
+def _prepare_noop(limit):
+    from view.policy.stock import get_bar_store, stale_codes
+    codes = _codes()
+    last = pd.Timestamp(np.nanmax(get_bar_store().last_dates(codes))).strftime("%Y%m%d")
+    # 已经落后的股票离线时无法更新，只测已是最新的
+    stale = set(stale_codes(codes, last))
+    return [code for code in codes if code not in stale], last
+
+
+def _run_noop(state):
+    from view.policy.stock import load_or_update
+    codes, day = state
+    for code in codes:
+        load_or_update(code, True, day)
+    return len(codes)
+
+
+def _backtest_case(policySelect: int, upperBreak: bool) -> Case:
+    def prepare(limit):
+        from view.policy.stock import get_stock_data
+        stock_data = get_stock_data()
+        return stock_data, _codes(limit), _period_e()
+
+    def run(state):
+        from view.policy.boll_break import boll_reverse_backtest
+        stock_data, codes, period_e = state
+        for code in codes:
+            boll_reverse_backtest(code, stock_data[code], policySelect, 0, upperBreak,
+                                  period_e=period_e, **BACKTEST_PARAMS)
+        return len(codes)
+    return Case(prepare, run, limited=True)
+
+
+def _panel_case(policySelect: int, upperBreak: bool) -> Case:
+    def prepare(limit):
+        from view.policy.stock import get_stock_data
+        from view.policy.indicator_cache import get_indicator_cache
+        stock_data = get_stock_data(backing="mmap")
+        codes = _codes()
+        get_indicator_cache(policySelect).refresh(stock_data, codes)  # 只测指标缓存已就绪的常态
+        return stock_data, codes, _period_e()
+
+    def run(state):
+        from view.policy.boll_panel import boll_reverse_backtest_panel
+        stock_data, codes, period_e = state
+        boll_reverse_backtest_panel(stock_data, policySelect, 0, upperBreak, period_e=period_e,
+                                    codes=codes, **BACKTEST_PARAMS)
+        return len(codes)
+    return Case(prepare, run)
+
+
+def _find_case(policySelect: int) -> Case:
+    def prepare(limit):
+        from view.policy.stock import get_stock_data, get_spot_index
+        return get_stock_data(), get_spot_index(), _codes(limit)
+
+    def run(state):
+        from view.policy.boll_break import boll_find
+        stock_data, spot, codes = state
+        for code in codes:
+            boll_find(code, stock_data[code], spot, policySelect, True, **FIND_PARAMS)
+        return len(codes)
+    return Case(prepare, run, limited=True)
+
+
+def _find_all_case(policySelect: int) -> Case:
+    def prepare(limit):
+        from view.policy.stock import get_stock_data, get_spot_index
+        from view.policy.indicator_cache import get_indicator_cache
+        stock_data = get_stock_data(backing="mmap")
+        get_indicator_cache(policySelect).refresh(stock_data)
+        return stock_data, get_spot_index()
+
+    def run(state):
+        from view.policy.boll_scan import boll_find_all
+        stock_data, spot = state
+        boll_find_all(stock_data, spot, policySelect, True, **FIND_PARAMS)
+        return len(stock_data)
+    return Case(prepare, run)
+
+
+def _portfolio_case(policySelect: int, upperBreak: bool) -> Case:
+    def prepare(limit):
+        from view.policy.stock import get_stock_data
+        from view.policy.boll_panel import boll_reverse_backtest_panel
+        stock_data = get_stock_data(backing="mmap")
+        trades = boll_reverse_backtest_panel(stock_data, policySelect, 0, upperBreak, period_e=_period_e(),
+                                             codes=_codes(), **BACKTEST_PARAMS)
+        return stock_data, trades
+
+    def run(state):
+        from view.policy.portfolio import simulate_portfolio
+        stock_data, trades = state
+        simulate_portfolio(trades, stock_data)
+        return len(trades)
+    return Case(prepare, run)
+
+
+CASES: Dict[str, Case] = {
+    'get_stock_data_cold': _run_cold_load("frame"),
+    'get_stock_data_mmap_cold': _run_cold_load("mmap"),
+    'load_or_update_noop': Case(_prepare_noop, _run_noop),
+}
+for _sel in (0, 1, 2):
+    for _ub in (False, True):
+        CASES[f'backtest_s{_sel}_ub{int(_ub)}'] = _backtest_case(_sel, _ub)
+for _sel in (0, 1, 2):
+    for _ub in (False, True):
+        CASES[f'panel_s{_sel}_ub{int(_ub)}'] = _panel_case(_sel, _ub)
+for _sel in (0, 1, 2):
+    CASES[f'boll_find_s{_sel}'] = _find_case(_sel)
+CASES['boll_find_all_s1'] = _find_all_case(1)
+CASES['portfolio_s0_ub1'] = _portfolio_case(0, True)
+
+
+# ---------------- 子进程 ----------------
+
+def _child_setup(workdir: str):
+    os.chdir(workdir)
+    sys.path.insert(0, ROOT)
+    from view.policy import stock
+    stock.set_offline()
+    if os.path.exists(SPOT_FILE):
+        stock.set_current_stock_info(pd.read_pickle(SPOT_FILE))
+    return stock
+
+
+def run_prepare(workdir: str):
+    """生成日线仓库、OHLC 镜像和合成快照，之后的用例都从这里开始"""
+    stock = _child_setup(workdir)
+    store = stock.get_bar_store()
+    columns, index = store.snapshot()
+    codes = sorted(index)
+    closes = np.array([columns['close'][s + n - 1] if n else np.nan for s, n in (index[c] for c in codes)])
+    stock.load_or_update_stock_code_name_dict()
+    names = {code: stock.stock_name(code) for code in codes}
+    synthetic_spot(codes, closes, names).to_pickle(SPOT_FILE)
+    stock.get_stock_data(backing="mmap")
+
+
+def run_case(name: str, workdir: str, limit: int):
+    _child_setup(workdir)
+    case = CASES[name]
+    state = case.prepare(limit if case.limited else None)
+    rss_before = peak_rss_mb()
+    t = time.perf_counter()
+    items = case.run(state)
+    wall = time.perf_counter() - t
+    rss = peak_rss_mb()
+    print(RESULT_PREFIX + json.dumps({
+        'wall': wall, 'items': items, 'per_stock_ms': wall * 1000 / max(items, 1),
+        'peak_rss_mb': rss, 'rss_growth_mb': rss - rss_before,
+    }))
+
+
+def _spawn(args: List[str], workdir: str) -> dict:
+    proc = subprocess.run([sys.executable, os.path.abspath(__file__)] + args + ['--workdir', workdir],
+                          cwd=workdir, capture_output=True, text=True, encoding='utf-8', errors='replace')
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else f"退出码 {proc.returncode}")
+    for line in proc.stdout.splitlines():
+        if line.startswith(RESULT_PREFIX):
+            return json.loads(line[len(RESULT_PREFIX):])
+    return {}
+
+
+# ---------------- 主进程 ----------------
+
+def _machine() -> dict:
+    return {'platform': platform.platform(), 'python': platform.python_version(),
+            'cpus': os.cpu_count(), 'pandas': pd.__version__, 'numpy': np.__version__}
+
+
+def format_report(results: Dict[str, dict], baseline: dict, limit: int) -> str:
+    lines = [f"基准测试 {time.strftime('%Y-%m-%d %H:%M:%S')}  {_machine()}",
+             f"逐只用例股票数: {limit}"]
+    if baseline:
+        lines.append(f"基线: {baseline.get('time')}  {baseline.get('machine')}")
+    else:
+        lines.append("基线: 无（基线只保存在本机，先在改动前用 --save-baseline 跑一次）")
+    lines.append(f"{'用例':<26}{'耗时(s)':>10}{'每只(ms)':>10}{'峰值内存(MB)':>14}{'增长(MB)':>10}{'基线(s)':>10}{'变化':>9}")
+    base_cases = baseline.get('cases', {}) if baseline else {}
+    for name, r in results.items():
+        if 'error' in r:
+            lines.append(f"{name:<26}失败: {r['error']}")
+            continue
+        base = base_cases.get(name)
+        if base:
+            ratio = r['wall'] / base['wall'] if base['wall'] else float('nan')
+            mark = ' 变慢' if ratio > SLOWER_RATIO else ''
+            cmp = f"{base['wall']:>10.2f}{(ratio - 1) * 100:>+8.1f}%{mark}"
+        else:
+            cmp = f"{'-':>10}{'-':>9}"
+        lines.append(f"{name:<26}{r['wall']:>10.2f}{r['per_stock_ms']:>10.2f}"
+                     f"{r['peak_rss_mb']:>14.0f}{r['rss_growth_mb']:>10.0f}{cmp}")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="离线基准测试")
+    parser.add_argument('cases', nargs='*', help=f"要运行的用例，默认全部：{', '.join(CASES)}")
+    parser.add_argument('--limit', type=int, default=DEFAULT_LIMIT, help="逐只回测/监测用例的股票数")
+    parser.add_argument('--save-baseline', action='store_true', help="把本次结果存为基线")
+    parser.add_argument('--keep', action='store_true', help="保留临时工作目录")
+    parser.add_argument('--workdir', help=argparse.SUPPRESS)
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child == '__prepare__':
+        run_prepare(args.workdir)
+        return
+    if args.child:
+        run_case(args.child, args.workdir, args.limit)
+        return
+
+    names = args.cases or list(CASES)
+    unknown = [n for n in names if n not in CASES]
+    if unknown:
+        parser.error(f"未知用例: {', '.join(unknown)}")
+
+    workdir = tempfile.mkdtemp(prefix="bench_")
+    try:
+        print(f"复制缓存到 {workdir} ...")
+        shutil.copytree(os.path.join(ROOT, "cache"), os.path.join(workdir, "cache"),
+                        ignore=shutil.ignore_patterns('bars', 'indicators', 'trade_calendar.pkl'))
+        print("准备日线仓库和合成快照 ...")
+        _spawn(['--child', '__prepare__'], workdir)
+
+        results = {}
+        for name in names:
+            print(f"运行 {name} ...", flush=True)
+            try:
+                results[name] = _spawn(['--child', name, '--limit', str(args.limit)], workdir)
+            except RuntimeError as e:
+                results[name] = {'error': str(e)}
+    finally:
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    baseline = None
+    if os.path.exists(BASELINE_FILE):
+        with open(BASELINE_FILE, encoding='utf-8') as f:
+            baseline = json.load(f)
+    report = format_report(results, baseline, args.limit)
+    print(report)
+    with open(OUTPUT_FILE, 'w', encoding='utf-8') as f:
+        f.write(report + "\n")
+
+    if args.save_baseline:
+        cases = dict(baseline.get('cases', {})) if baseline else {}
+        cases.update({n: r for n, r in results.items() if 'error' not in r})
+        with open(BASELINE_FILE, 'w', encoding='utf-8') as f:
+            json.dump({'time': time.strftime('%Y-%m-%d %H:%M:%S'), 'machine': _machine(),
+                       'limit': args.limit, 'cases': cases}, f, ensure_ascii=False, indent=2)
+        print(f"基线已保存到 {BASELINE_FILE}")
+
+
+if __name__ == '__main__':
+    main()
@@ -47,3 +47,19 @@ def set_window_center(window):
     cp = window.screen().availableGeometry().center()
     qr.moveCenter(cp)
     window.move(qr.topLeft())
+
+
+def format_eta(seconds: float) -> str:
+    """ 预计剩余时间的显示文本 """
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return f"{seconds // 3600}时{seconds % 3600 // 60}分"
+    if seconds >= 60:
+        return f"{seconds // 60}分{seconds % 60}秒"
+    return f"{seconds}秒"
+
+
+def show_task_progress(bar, progress: int, eta: float):
+    """ 在进度条上显示百分比和预计剩余时间，eta < 0 表示未知 """
+    bar.setValue(progress)
+    bar.setFormat(f"%p%  剩余约 {format_eta(eta)}" if eta >= 0 else "%p%")
@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+from PySide6.QtCore import Qt, QPointF, QRectF
+from PySide6.QtGui import QPainter, QPen, QColor, QPolygonF
+from PySide6.QtWidgets import QWidget, QLabel
+from qfluentwidgets import MessageBoxBase
+
+
+class EquityCurve(QWidget):
+    """用 QPainter 画总资产折线，纵轴标最高/最低值，横轴标首尾日期"""
+
+    MARGIN = 60
+
+    def __init__(self, equity: pd.DataFrame, parent=None):
+        super().__init__(parent)
+        self.setMinimumSize(720, 360)
+        self._dates = pd.to_datetime(equity['日期']).dt.strftime('%Y-%m-%d').to_numpy() if len(equity) else []
+        self._values = equity['总资产'].to_numpy(dtype=float) if len(equity) else np.empty(0)
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.setRenderHint(QPainter.Antialiasing)
+        plot = QRectF(self.MARGIN, 20, self.width() - self.MARGIN - 20, self.height() - 60)
+        painter.setPen(QPen(QColor(160, 160, 160), 1))
+        painter.drawRect(plot)
+        if len(self._values) < 2:
+            painter.drawText(plot, Qt.AlignCenter, '没有资金曲线')
+            return
+
+        low, high = float(self._values.min()), float(self._values.max())
+        span = high - low or 1.0
+        xs = plot.left() + np.arange(len(self._values)) * plot.width() / (len(self._values) - 1)
+        ys = plot.bottom() - (self._values - low) / span * plot.height()
+        painter.setPen(QPen(QColor(0, 120, 212), 1.5))
+        painter.drawPolyline(QPolygonF([QPointF(x, y) for x, y in zip(xs, ys)]))
+
+        painter.setPen(QColor(90, 90, 90))
+        painter.drawText(QRectF(0, plot.top() - 8, self.MARGIN - 4, 16), Qt.AlignRight | Qt.AlignVCenter,
+                         f'{high / 10000:.1f}万')
+        painter.drawText(QRectF(0, plot.bottom() - 8, self.MARGIN - 4, 16), Qt.AlignRight | Qt.AlignVCenter,
+                         f'{low / 10000:.1f}万')
+        painter.drawText(QRectF(plot.left(), plot.bottom() + 4, 120, 20), Qt.AlignLeft, self._dates[0])
+        painter.drawText(QRectF(plot.right() - 120, plot.bottom() + 4, 120, 20), Qt.AlignRight, self._dates[-1])
+
+
+class EquityCurveDialog(MessageBoxBase):
+    """组合模拟结果：资金曲线和统计"""
+
+    def __init__(self, equity: pd.DataFrame, stats: dict, parent=None):
+        super().__init__(parent)
+        self.curve = EquityCurve(equity, self.widget)
+        self.statsLabel = QLabel('  '.join(f'{k}: {v}' for k, v in stats.items()), self.widget)
+        self.statsLabel.setWordWrap(True)
+        self.viewLayout.addWidget(self.curve)
+        self.viewLayout.addWidget(self.statsLabel)
+        self.yesButton.setText('确定')
+        self.cancelButton.hide()
@@ -0,0 +1,158 @@
+import numpy as np
+import pandas as pd
+from typing import List, Tuple
+from PySide6.QtCore import Qt, QAbstractTableModel, QModelIndex, QTimer
+from PySide6.QtWidgets import QTableView, QTableWidget
+
+
+class FrameTableModel(QAbstractTableModel):
+    """
+    以 DataFrame 列数组为后端的只读表格模型。
+    append() 只把数据放进缓冲区，由定时器按批次并入并一次性通知视图，
+    排序在模型内对列数组做 argsort，不逐格构造 QTableWidgetItem。
+    """
+
+    def __init__(self, columns: List[Tuple[str, str]], parent=None, flush_ms: int = 100):
+        """columns 为 [(表头, DataFrame 列名)]"""
+        super().__init__(parent)
+        self._headers = [h for h, _ in columns]
+        self._keys = [k for _, k in columns]
+        self._values: List[np.ndarray] = [np.empty(0, dtype=object) for _ in columns]
+        self._rows = 0
+        self._pending: List[pd.DataFrame] = []
+        self._pending_rows: List[dict] = []
+        self._timer = QTimer(self)
+        self._timer.setInterval(flush_ms)
+        self._timer.timeout.connect(self.flush)
+
+    def rowCount(self, parent=QModelIndex()) -> int:
+        return 0 if parent.isValid() else self._rows
+
+    def columnCount(self, parent=QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self._keys)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self._headers[section]
+        if role == Qt.DisplayRole and orientation == Qt.Vertical:
+            return section + 1
+        return None
+
+    def data(self, index: QModelIndex, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        if role == Qt.DisplayRole:
+            value = self._values[index.column()][index.row()]
+            if isinstance(value, (float, np.floating)) and np.isnan(value):
+                return ''
+            return str(value)
+        if role == Qt.TextAlignmentRole:
+            return int(Qt.AlignCenter)
+        return None
+
+    def append(self, df: pd.DataFrame):
+        """追加一批行，稍后由定时器并入"""
+        if df is None or df.empty:
+            return
+        self._pending.append(df)
+        if not self._timer.isActive():
+            self._timer.start()
+
+    def append_row(self, row: dict):
+        """追加单行，与 append() 一样按批并入"""
+        self._pending_rows.append(row)
+        if not self._timer.isActive():
+            self._timer.start()
+
+    def flush(self):
+        """把缓冲区一次性并入模型"""
+        frames = self._pending
+        if self._pending_rows:
+            frames = frames + [pd.DataFrame(self._pending_rows)]
+        self._pending, self._pending_rows = [], []
+        self._timer.stop()
+        if not frames:
+            return
+        batch = pd.concat([df[self._keys] for df in frames], ignore_index=True)
+        first = self._rows
+        self.beginInsertRows(QModelIndex(), first, first + len(batch) - 1)
+        self._values = [np.concatenate([old, batch[key].to_numpy(dtype=object)])
+                        for old, key in zip(self._values, self._keys)]
+        self._rows += len(batch)
+        self.endInsertRows()
+
+    def upsert(self, df: pd.DataFrame, key: str):
+        """按 key 列就地更新已有行，没有的行追加到末尾"""
+        self.flush()
+        if df is None or df.empty:
+            return
+        col = self._values[self._keys.index(key)]
+        where = {value: i for i, value in enumerate(col)}
+        rows = np.array([where.get(value, -1) for value in df[key]], dtype=np.int64)
+        found = rows >= 0
+        if found.any():
+            for values, k in zip(self._values, self._keys):
+                values[rows[found]] = df[k].to_numpy(dtype=object)[found]
+            self.dataChanged.emit(self.index(int(rows[found].min()), 0),
+                                  self.index(int(rows[found].max()), len(self._keys) - 1))
+        if not found.all():
+            self.append(df[~found])
+            self.flush()
+
+    def remove(self, key: str, values):
+        """删除 key 列取值在 values 中的行"""
+        self.flush()
+        keep = ~np.isin(self._values[self._keys.index(key)], np.asarray(list(values), dtype=object))
+        if keep.all():
+            return
+        self.beginResetModel()
+        self._values = [v[keep] for v in self._values]
+        self._rows = int(keep.sum())
+        self.endResetModel()
+
+    def clear(self):
+        self.beginResetModel()
+        self._values = [np.empty(0, dtype=object) for _ in self._keys]
+        self._rows = 0
+        self._pending, self._pending_rows = [], []
+        self._timer.stop()
+        self.endResetModel()
+
+    def to_frame(self) -> pd.DataFrame:
+        """当前显示顺序下的全部数据"""
+        self.flush()
+        return pd.DataFrame({key: values for key, values in zip(self._keys, self._values)})
+
+    def sort(self, column: int, order=Qt.AscendingOrder):
+        self.flush()
+        values = self._values[column]
+        # 数值列按数值排，空值（NaN/None，如无成交的寻优组合）不论升降序都排在最后；
+        # 有非空值解析不成数值时按字符串排。稳定排序，相同值保持原有先后
+        numeric = pd.to_numeric(pd.Series(values), errors='coerce').to_numpy(dtype=np.float64)
+        if not (np.isnan(numeric) & ~pd.isna(values)).any():
+            keys = -numeric if order == Qt.DescendingOrder else numeric
+            idx = np.argsort(keys, kind='stable')
+        else:
+            keys = np.array([str(v) for v in values], dtype=object)
+            idx = np.argsort(keys, kind='stable')
+            if order == Qt.DescendingOrder:
+                idx = idx[::-1]
+        self.layoutAboutToBeChanged.emit()
+        self._values = [v[idx] for v in self._values]
+        self.layoutChanged.emit()
+
+
+def replace_table_widget(table: QTableWidget, model: FrameTableModel) -> QTableView:
+    """用绑定 model 的 QTableView 替换 .ui 里生成的 QTableWidget，位置和尺寸策略不变"""
+    view = QTableView(table.parentWidget())
+    view.setObjectName(table.objectName())
+    view.setSizePolicy(table.sizePolicy())
+    view.setModel(model)
+    view.setAlternatingRowColors(True)
+    view.setSelectionBehavior(QTableView.SelectRows)
+    view.setEditTriggers(QTableView.NoEditTriggers)
+    table.parentWidget().layout().replaceWidget(table, view)
+    table.deleteLater()
+    # 每并入一批只滚动一次
+    model.rowsInserted.connect(lambda *_: view.scrollToBottom())
+    return view
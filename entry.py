@@ -1,4 +1,5 @@
 import sys
+import multiprocessing
 
 from PySide6.QtCore import Qt, QTranslator
 from PySide6.QtGui import QFont
@@ -10,18 +11,6 @@ from common.utils import show_dialog
 from view.login_window.window import LoginWindow
 from view.main_window import MainWindow
 
-# 适配缩放比例
-QApplication.setHighDpiScaleFactorRoundingPolicy(Qt.HighDpiScaleFactorRoundingPolicy.PassThrough)
-app = QApplication(sys.argv)
-font = app.font()
-font.setHintingPreference(QFont.HintingPreference.PreferNoHinting)
-app.setFont(font)
-app.setAttribute(Qt.ApplicationAttribute.AA_DontCreateNativeWidgetSiblings) # 解决弹dialog后frameless窗口无法在调整大小
-translator = QTranslator()
-translator.load(":/resource/i18n/zh.qm")
-app.installTranslator(translator)
-
-
 def main():
     #if cfg.auto_login.value:
     if True:
@@ -39,8 +28,22 @@ def main():
         app.exec()
 
 
-try:
-    main()
-except Exception as e:
-    logger.exception(e)
-    show_dialog(parent=None, content='程序出现异常，请尝试重新运行！')
+# 回测/监测的多进程模式以 spawn 方式启动子进程，子进程导入本模块时不能创建窗口
+if __name__ == '__main__':
+    multiprocessing.freeze_support()
+    # 适配缩放比例
+    QApplication.setHighDpiScaleFactorRoundingPolicy(Qt.HighDpiScaleFactorRoundingPolicy.PassThrough)
+    app = QApplication(sys.argv)
+    font = app.font()
+    font.setHintingPreference(QFont.HintingPreference.PreferNoHinting)
+    app.setFont(font)
+    app.setAttribute(Qt.ApplicationAttribute.AA_DontCreateNativeWidgetSiblings) # 解决弹dialog后frameless窗口无法在调整大小
+    translator = QTranslator()
+    translator.load(":/resource/i18n/zh.qm")
+    app.installTranslator(translator)
+
+    try:
+        main()
+    except Exception as e:
+        logger.exception(e)
+        show_dialog(parent=None, content='程序出现异常，请尝试重新运行！')
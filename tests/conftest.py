@@ -0,0 +1,50 @@
+import os
+import sys
+import pandas as pd
+import pytest
+
+# 测试只读仓库自带的 cache/ 数据，不联网、不写缓存文件。
+# stock.py 的缓存目录是相对路径，导入前先切到仓库根目录。
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+os.chdir(ROOT)
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from view.policy import stock
+from view.policy.index_series import IndexSeries
+from view.policy.trade_calendar import TradeCalendar
+
+SAMPLE_STEP = 50    # 每隔多少只取一只做样本
+
+
+@pytest.fixture(scope="session", autouse=True)
+def offline_state():
+    """与多进程子进程相同：快照/上证指数/日历直接取本地文件，进入离线模式"""
+    sh = pd.read_pickle(stock._local_path("sh_index"))
+    stock.use_worker_state({
+        'spot': pd.read_pickle(stock._all_stock_file_path),
+        'sh_index': IndexSeries.from_frame(sh),
+        'calendar': TradeCalendar(sh['日期']),
+    })
+    yield
+    stock.set_offline(False)
+
+
+def cached_codes() -> list:
+    names = sorted(f for f in os.listdir(stock.CACHE_DIR) if f.endswith('.pkl') and f[:6].isdigit())
+    return [f[:6] for f in names]
+
+
+@pytest.fixture(scope="session")
+def sample_bars() -> dict:
+    """按代码排序后每隔 SAMPLE_STEP 只取一只的日线"""
+    return {code: pd.read_pickle(stock._local_path(code)) for code in cached_codes()[::SAMPLE_STEP]}
+
+
+@pytest.fixture
+def indicator_dir(tmp_path, monkeypatch):
+    """指标缓存写到临时目录，不动仓库里的 cache/"""
+    from view.policy import indicator_cache
+    monkeypatch.setattr(indicator_cache, 'INDICATOR_DIR', str(tmp_path))
+    monkeypatch.setattr(indicator_cache, '_caches', {})
+    return tmp_path
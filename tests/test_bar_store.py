@@ -0,0 +1,83 @@
+import os
+import numpy as np
+import pandas as pd
+import pytest
+
+from view.policy import bar_store
+from view.policy.bar_store import BarStore
+
+
+def _bars(start: str, days: int, close: float) -> pd.DataFrame:
+    dates = pd.bdate_range(start, periods=days)
+    price = close + np.arange(days, dtype=np.float64)
+    return pd.DataFrame({'日期': dates, '开盘': price, '收盘': price, '最高': price + 1, '最低': price - 1,
+                         '成交量': np.arange(days) * 100})
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = BarStore(str(tmp_path))
+    store.put('000001', _bars('2024-01-01', 30, 10.0))
+    store.put('000002', _bars('2024-01-01', 20, 50.0))
+    store.flush()
+    store.append('000001', _bars('2024-02-12', 3, 40.0))
+    store.flush()
+    return store
+
+
+def _read_all(root: str) -> dict:
+    fresh = BarStore(root)
+    return {code: fresh.get(code) for code in fresh.codes()}
+
+
+def test_compact_switches_generation(store):
+    before = _read_all(store.root)
+    store.compact()
+    after = _read_all(store.root)
+    assert before.keys() == after.keys()
+    for code in before:
+        pd.testing.assert_frame_equal(before[code], after[code])
+    dirs = [d for d in os.listdir(store.root) if d.startswith(bar_store.BASE_DIR_PREFIX)]
+    assert dirs == [f"{bar_store.BASE_DIR_PREFIX}1"]
+    assert not os.path.exists(os.path.join(store.root, bar_store.DELTA_FILE))
+
+
+def test_compact_interrupted_before_switch_keeps_old_layout(store, monkeypatch):
+    before = _read_all(store.root)
+    store.append('000002', _bars('2024-02-01', 5, 90.0))
+    real_replace = os.replace
+
+    def crash_on_meta(src, dst):
+        if dst.endswith(bar_store.META_FILE):
+            raise OSError("模拟中断")
+        real_replace(src, dst)
+
+    monkeypatch.setattr(bar_store.os, 'replace', crash_on_meta)
+    with pytest.raises(OSError):
+        store.compact()
+    monkeypatch.undo()
+
+    # 新目录里的列文件已经写完，但 meta.json 没换：读到的仍是中断前已落盘的数据
+    after = _read_all(store.root)
+    for code in before:
+        pd.testing.assert_frame_equal(before[code], after[code])
+
+
+def test_compact_interrupted_after_switch_has_same_bars(store, monkeypatch):
+    before = _read_all(store.root)
+    real_remove = os.remove
+
+    def crash_on_delta(path):
+        if path.endswith(bar_store.DELTA_FILE):
+            raise OSError("模拟中断")
+        real_remove(path)
+
+    monkeypatch.setattr(bar_store.os, 'remove', crash_on_delta)
+    with pytest.raises(OSError):
+        store.compact()
+    monkeypatch.undo()
+
+    # 追加段已并入新目录又没被删掉，再合并一次按日期去重，结果不变
+    after = _read_all(store.root)
+    for code in before:
+        pd.testing.assert_frame_equal(before[code], after[code])
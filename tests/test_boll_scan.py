@@ -0,0 +1,23 @@
+import pandas as pd
+import pytest
+
+from view.policy import stock
+from view.policy.boll_break import boll_find
+from view.policy.boll_scan import boll_find_all
+
+# 这两只在全市场监测里曾因 shift 后 fillna 得到 object 列、取反出错而被逐只监测多选出来
+EXTRA_CODES = ['002488', '601985']
+BOUNDS = dict(marketValMin=50, marketValMax=20000, peRatioMin=-1e9, peRatioMax=1e9)
+
+
+@pytest.mark.parametrize("upperBreak", [True, False])
+@pytest.mark.parametrize("policySelect", [0, 1, 2])
+def test_boll_find_matches_boll_find_all(sample_bars, indicator_dir, policySelect, upperBreak):
+    bars = dict(sample_bars)
+    for code in EXTRA_CODES:
+        bars[code] = pd.read_pickle(stock._local_path(code))
+    spot = stock.get_spot_index()
+    found = [boll_find(code, df, spot, policySelect, upperBreak, **BOUNDS) for code, df in bars.items()]
+    single = {code for df in found if not df.empty for code in df['代码']}
+    batch = boll_find_all(bars, spot, policySelect, upperBreak, codes=sorted(bars), **BOUNDS)
+    assert single == set(batch['代码'] if len(batch) else ())
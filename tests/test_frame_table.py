@@ -0,0 +1,47 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip('PySide6')
+from PySide6.QtCore import QCoreApplication, Qt
+
+from components.frame_table import FrameTableModel
+
+
+@pytest.fixture(scope='module')
+def app():
+    return QCoreApplication.instance() or QCoreApplication([])
+
+
+def _model(app, values) -> FrameTableModel:
+    model = FrameTableModel([('代码', '代码'), ('日收益率', '日收益率')])
+    model.append(pd.DataFrame({'代码': [f'c{i}' for i in range(len(values))], '日收益率': values}))
+    model.flush()
+    return model
+
+
+def _column(model: FrameTableModel, key: str) -> list:
+    return model.to_frame()[key].tolist()
+
+
+def test_sort_numeric_with_nan_and_negative(app):
+    model = _model(app, [25.1, -12.3, 100.5, np.nan, 3.0, None])
+    model.sort(1, Qt.AscendingOrder)
+    assert _column(model, '日收益率')[:4] == [-12.3, 3.0, 25.1, 100.5]
+    assert pd.isna(_column(model, '日收益率')[4:]).all()
+    assert _column(model, '代码')[4:] == ['c3', 'c5']
+    model.sort(1, Qt.DescendingOrder)
+    assert _column(model, '日收益率')[:4] == [100.5, 25.1, 3.0, -12.3]
+    assert _column(model, '代码')[4:] == ['c3', 'c5']
+
+
+def test_sort_numeric_strings(app):
+    model = _model(app, ['10', '-2', '9.5'])
+    model.sort(1, Qt.AscendingOrder)
+    assert _column(model, '日收益率') == ['-2', '9.5', '10']
+
+
+def test_sort_falls_back_to_strings(app):
+    model = _model(app, ['b', 2.0, np.nan, 'a'])
+    model.sort(1, Qt.AscendingOrder)
+    assert _column(model, '代码') == ['c1', 'c3', 'c0', 'c2']
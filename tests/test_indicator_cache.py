@@ -0,0 +1,79 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from view.policy.boll_break import build_policy_df
+from view.policy.boll_panel import split_panel
+from view.policy.indicator_cache import IndicatorCache, get_indicator_cache
+
+
+def _assert_policy_equal(actual: pd.DataFrame, expected: pd.DataFrame):
+    pd.testing.assert_frame_equal(actual.reset_index(drop=True), expected.reset_index(drop=True),
+                                  check_dtype=False, rtol=1e-9)
+
+
+@pytest.mark.parametrize("policySelect", [0, 1, 2])
+def test_panel_matches_per_code(sample_bars, indicator_dir, policySelect):
+    codes = sorted(sample_bars)
+    panel = get_indicator_cache(policySelect).panel(sample_bars, codes)
+    bounds = split_panel(panel, len(codes))
+    for i, code in enumerate(codes):
+        _, expected = build_policy_df(sample_bars[code], policySelect)
+        _assert_policy_equal(panel.iloc[bounds[i]:bounds[i + 1]].drop(columns='_ord'), expected)
+
+
+def _truncated(sample_bars: dict) -> dict:
+    """各股票去掉末尾不同根数，覆盖周期中间和周期边界处的追加"""
+    cut = [1, 2, 3, 4, 7, 30]
+    bars = {}
+    for i, code in enumerate(sorted(sample_bars)):
+        df = sample_bars[code].sort_values('日期')
+        bars[code] = df.iloc[:len(df) - cut[i % len(cut)]]
+    return bars
+
+
+@pytest.mark.parametrize("policySelect", [0, 1, 2])
+def test_tail_refresh_matches_full_recompute(sample_bars, indicator_dir, monkeypatch, policySelect):
+    codes = sorted(sample_bars)
+    cache = IndicatorCache(str(indicator_dir), policySelect)
+    assert cache.refresh(_truncated(sample_bars), codes) == len(codes)
+
+    # 追加日线后只走增量路径
+    monkeypatch.setattr(cache, '_compute_full', lambda *args: pytest.fail("追加日线不应整只重算"))
+    assert cache.refresh(sample_bars, codes) == len(codes)
+    assert cache.refresh(sample_bars, codes) == 0
+
+    fresh = IndicatorCache(str(indicator_dir / 'fresh'), policySelect)
+    fresh.refresh(sample_bars, codes)
+    for code in codes:
+        _assert_policy_equal(cache.frame(code), fresh.frame(code))
+
+    # 保存后重新加载，日线没变时不再计算
+    reloaded = IndicatorCache(str(indicator_dir), policySelect)
+    assert reloaded.refresh(sample_bars, codes) == 0
+    _assert_policy_equal(reloaded.frame(codes[0]), fresh.frame(codes[0]))
+
+
+def test_history_change_recomputes_whole_code(sample_bars, indicator_dir):
+    code = sorted(sample_bars)[0]
+    cache = IndicatorCache(str(indicator_dir), 1)
+    cache.refresh(sample_bars, [code])
+    changed = sample_bars[code].copy()
+    changed.loc[changed.index[len(changed) // 2], '收盘'] += 1.0
+    changed = changed.iloc[:-1]     # 行数变少
+    assert cache.refresh({code: changed}, [code]) == 1
+    _, expected = build_policy_df(changed, 1)
+    _assert_policy_equal(cache.frame(code), expected)
+
+
+def test_corrupt_pickle_is_rebuilt(sample_bars, indicator_dir):
+    codes = sorted(sample_bars)[:5]
+    cache = IndicatorCache(str(indicator_dir), 0)
+    with open(cache.path(), 'wb') as f:
+        f.write(b'not a pickle')
+    assert cache.refresh(sample_bars, codes) == len(codes)
+    for code in codes:
+        _, expected = build_policy_df(sample_bars[code], 0)
+        _assert_policy_equal(cache.frame(code), expected)
+    # 重建后的文件可以正常读取
+    assert IndicatorCache(str(indicator_dir), 0).refresh(sample_bars, codes) == 0
@@ -0,0 +1,83 @@
+import json
+import math
+import numpy as np
+import pytest
+
+from view.policy import indicators as ind
+
+
+def _ohlc(size: int = 600, nan_at=()) -> tuple:
+    rng = np.random.default_rng(7)
+    close = 10 + np.cumsum(rng.normal(0, 0.2, size))
+    high = close + rng.uniform(0, 0.3, size)
+    low = close - rng.uniform(0, 0.3, size)
+    for i in nan_at:
+        high[i] = low[i] = close[i] = np.nan
+    return high, low, close
+
+
+# 停牌：开头、单根、连续多根、窗口内两段
+NAN_AT = (0, 1, 50, 120, 121, 122, 123, 124, 300, 305, 599)
+
+CASES = [
+    ('sma', lambda h, l, c: ind.sma(c, 20), lambda: ind.OnlineSMA(20), 'c'),
+    ('std', lambda h, l, c: (ind.sma(c, 20), ind.rolling_std(c, 20)), lambda: ind.OnlineRollingStats(20), 'c'),
+    ('boll', lambda h, l, c: ind.bollinger(c, 20), lambda: ind.OnlineBollinger(20), 'c'),
+    ('ema', lambda h, l, c: ind.ema(c, 12), lambda: ind.OnlineEMA(12), 'c'),
+    ('macd', lambda h, l, c: ind.macd(c), lambda: ind.OnlineMACD(), 'c'),
+    ('kdj', lambda h, l, c: ind.kdj(h, l, c), lambda: ind.OnlineKDJ(), 'hlc'),
+    ('atr', lambda h, l, c: ind.atr(h, l, c), lambda: ind.OnlineATR(), 'hlc'),
+]
+
+
+def _run_online(make, inputs: str, high, low, close, restore_at: int = None) -> np.ndarray:
+    obj = make()
+    rows = []
+    for i in range(len(close)):
+        if i == restore_at:
+            obj = ind.restore(json.loads(json.dumps(obj.state())))
+        bar = (close[i],) if inputs == 'c' else (high[i], low[i], close[i])
+        rows.append(obj.update(*bar))
+    return np.asarray(rows, dtype=np.float64)
+
+
+def _batch(func, high, low, close) -> np.ndarray:
+    result = func(high, low, close)
+    if isinstance(result, tuple):
+        return np.column_stack(result)
+    return np.asarray(result)
+
+
+@pytest.mark.parametrize('nan_at', [(), NAN_AT], ids=['finite', 'nan'])
+@pytest.mark.parametrize('name, batch, make, inputs', CASES, ids=[c[0] for c in CASES])
+def test_online_matches_batch(name, batch, make, inputs, nan_at):
+    high, low, close = _ohlc(nan_at=nan_at)
+    expected = _batch(batch, high, low, close)
+    actual = _run_online(make, inputs, high, low, close)
+    np.testing.assert_allclose(actual, expected, rtol=1e-9, atol=1e-9, equal_nan=True)
+
+
+@pytest.mark.parametrize('name, batch, make, inputs', CASES, ids=[c[0] for c in CASES])
+def test_state_roundtrip(name, batch, make, inputs):
+    high, low, close = _ohlc(nan_at=NAN_AT)
+    expected = _run_online(make, inputs, high, low, close)
+    for restore_at in (50, 122, 303):
+        actual = _run_online(make, inputs, high, low, close, restore_at=restore_at)
+        np.testing.assert_allclose(actual, expected, rtol=0, atol=0, equal_nan=True)
+
+
+def test_bollinger_recovers_after_nan():
+    boll = ind.OnlineBollinger(3)
+    values = [boll.update(x)[0] for x in [1, 2, math.nan, 4, 5, 6, 7]]
+    expected = ind.bollinger([1, 2, math.nan, 4, 5, 6, 7], 3)[0]
+    np.testing.assert_allclose(values, expected, equal_nan=True)
+    assert values[-2:] == [5.0, 6.0]
+
+
+def test_resync_keeps_nan_count(monkeypatch):
+    monkeypatch.setattr(ind, 'RESYNC_EVERY', 7)
+    values = [1.0, 2.0, math.nan, 4.0, math.nan, 6.0, 7.0, 8.0, 9.0, 10.0, 11.0, 12.0]
+    stats, sma = ind.OnlineRollingStats(3), ind.OnlineSMA(3)
+    online = [(stats.update(x)[1], sma.update(x)) for x in values]
+    expected = np.column_stack([ind.rolling_std(values, 3), ind.sma(values, 3)])
+    np.testing.assert_allclose(online, expected, rtol=1e-12, equal_nan=True)
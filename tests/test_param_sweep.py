@@ -0,0 +1,50 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from view.policy import stock
+from view.policy.boll_break import boll_reverse_backtest
+from view.policy.param_sweep import sweep_combos, sweep_trade_keys, sweep_trades, sweep_grid, trade_stats
+
+PERIOD = ('2023-01-16', '2025-08-15')
+SH_RANGES = [(2800, 4000), (3100, 3400)]
+MV_RANGES = [(50, 20000), (200, 20000)]
+PE_RANGES = [(0, 80)]
+
+
+@pytest.fixture(scope="module")
+def combos():
+    return sweep_combos([0, 1, 2], [0, 1], [True, False], SH_RANGES, MV_RANGES, PE_RANGES)
+
+
+def test_trade_keys_shared(combos):
+    keys = sweep_trade_keys(combos, PERIOD[1])
+    # 突破上轨时上证区间事后筛选，不单独撮合；市值/市盈率区间从不单独撮合
+    assert len(keys) == 3 * 2 * (1 + len(SH_RANGES))
+    assert all(key[3] is None for key in keys if key[2])
+
+
+def test_sweep_grid_matches_backtest(sample_bars, indicator_dir, combos):
+    codes = sorted(sample_bars)[::3]
+    bars = {code: sample_bars[code] for code in codes}
+    spot = stock.get_spot_index()
+    keys = sweep_trade_keys(combos, PERIOD[1])
+    trades = sweep_trades(bars, codes, keys, [PERIOD])
+    grid = sweep_grid(combos, keys, trades, spot)
+    assert len(grid) == len(combos)
+
+    total = 0
+    for row, c in zip(grid.to_dict('records'), combos):
+        frames = [boll_reverse_backtest(code, bars[code], c.policySelect, c.sellPos, c.upperBreak, *PERIOD,
+                                        c.sh_min, c.sh_max, c.marketValMin, c.marketValMax,
+                                        c.peRatioMin, c.peRatioMax) for code in codes]
+        frames = [df for df in frames if not df.empty]
+        expected = trade_stats(pd.concat(frames, ignore_index=True) if frames else None)
+        assert row['交易次数'] == expected['交易次数'], c
+        for name in ('平均收益率', '平均持有天数', '日收益率'):
+            np.testing.assert_allclose(row[name], expected[name], equal_nan=True, err_msg=str(c))
+        total += expected['交易次数']
+    assert total > 0
+    # 突破上轨的组合共用一遍撮合，窄的上证区间要确实筛掉一部分交易
+    broke = grid[grid['突破上轨'] == '是'].groupby('上证区间')['交易次数'].sum()
+    assert broke['3100-3400'] < broke['2800-4000']
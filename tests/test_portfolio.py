@@ -0,0 +1,88 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from view.policy.portfolio import PortfolioConfig, simulate_portfolio, max_drawdown
+
+DAYS = pd.to_datetime(['2024-01-02', '2024-01-03', '2024-01-04', '2024-01-05'])
+CLOSES = {
+    'A': [10.5, 11.0, 12.0, 12.0],
+    'B': [21.0, 22.0, 22.0, 22.0],
+    'C': [5.0, 5.5, 5.8, 6.0],
+    'D': [10.0, 10.0, 10.0, 11.0],
+}
+
+
+def _bars(closes) -> pd.DataFrame:
+    return pd.DataFrame({'日期': DAYS, '开盘': closes, '最高': closes, '最低': closes, '收盘': closes})
+
+
+def _signals(rows) -> pd.DataFrame:
+    return pd.DataFrame([(code, DAYS[b], buy, DAYS[s], sell) for code, b, buy, s, sell in rows],
+                        columns=['代码', '买入日期', '买入价', '卖出日期', '卖出价'])
+
+
+@pytest.fixture
+def stock_data():
+    return {code: _bars(closes) for code, closes in CLOSES.items()}
+
+
+def test_hand_computed_account(stock_data):
+    trades = _signals([
+        ('A', 0, 10.3, 2, 12.0),
+        ('B', 0, 20.7, 1, 22.0),
+        ('C', 0, 5.0, 3, 6.0),      # 第 0 天已满 2 只，放弃
+        ('C', 1, 5.0, 3, 6.0),      # 第 1 天 B 先卖出腾出位置
+        ('A', 1, 11.0, 3, 12.0),    # A 仍在持有，放弃
+        ('D', 3, 10.0, 3, 11.0),    # 当天买入当天卖出
+    ])
+    config = PortfolioConfig(initial_cash=100000, max_positions=2, position_pct=0.5, lot_size=100, fee_rate=0)
+    result = simulate_portfolio(trades, stock_data, config, calendar=DAYS.to_numpy())
+
+    # 第 0 天：预算 50000；A 50000/10.3 → 4800 股；B min(50000, 现金 50560)/20.7 → 2400 股
+    # 第 1 天：B 卖出 52800 后按前一天收盘计总资产 53680 + 4800×10.5 = 104080，C 买 52040/5 → 10400 股
+    # 第 3 天：C 卖出后只剩现金 121680，D 买 60840/10 → 6000 股，收盘前卖出
+    fills = result.fills
+    assert fills['代码'].tolist() == ['A', 'B', 'C', 'D']
+    assert fills['股数'].tolist() == [4800, 2400, 10400, 6000]
+    assert fills['盈亏'].tolist() == [8160.0, 3120.0, 10400.0, 6000.0]
+
+    equity = result.equity
+    assert equity['日期'].tolist() == DAYS.tolist()
+    assert equity['现金'].tolist() == [880.0, 1680.0, 59280.0, 127680.0]
+    assert equity['持仓市值'].tolist() == [100800.0, 110000.0, 60320.0, 0.0]
+    assert equity['总资产'].tolist() == [101680.0, 111680.0, 119600.0, 127680.0]
+    assert equity['持仓数'].tolist() == [2, 2, 1, 0]
+
+    stats = result.stats
+    assert stats['期末资产'] == 127680.0
+    assert stats['总收益率'] == 27.68
+    assert stats['成交笔数'] == 4
+    assert stats['放弃信号'] == 2
+    assert stats['胜率'] == 100.0
+    assert stats['最大持仓数'] == 2
+    assert stats['最大回撤'] == 0.0
+
+
+def test_fee_and_lot_rounding(stock_data):
+    trades = _signals([('A', 0, 10.0, 1, 11.0)])
+    config = PortfolioConfig(initial_cash=10000, max_positions=1, position_pct=1.0, lot_size=100, fee_rate=0.001)
+    result = simulate_portfolio(trades, stock_data, config, calendar=DAYS.to_numpy())
+    # 10000 / (10 × 1.001) = 999 股，按整手取 900 股；买入 9009，卖出 900 × 11 × 0.999 = 9890.1
+    assert result.fills['股数'].tolist() == [900]
+    assert result.fills['盈亏'].tolist() == [881.1]
+    assert result.equity['现金'].tolist() == [991.0, 10881.1]
+
+
+def test_signal_below_one_lot_is_skipped(stock_data):
+    trades = _signals([('B', 0, 20.7, 1, 22.0)])
+    config = PortfolioConfig(initial_cash=1000, max_positions=1, position_pct=1.0, fee_rate=0)
+    result = simulate_portfolio(trades, stock_data, config, calendar=DAYS.to_numpy())
+    assert result.fills.empty and result.equity.empty
+    assert result.stats['放弃信号'] == 1
+    assert result.stats['期末资产'] == 1000
+
+
+def test_max_drawdown():
+    assert max_drawdown(np.array([100.0, 120.0, 90.0, 130.0, 117.0])) == pytest.approx(0.25)
+    assert max_drawdown(np.empty(0)) == 0.0
@@ -0,0 +1,78 @@
+import threading
+import time
+import pytest
+
+pytest.importorskip('PySide6')
+from PySide6.QtCore import QCoreApplication
+
+from workers.TaskManager import TaskManager, DEFAULT_QUEUES
+
+
+@pytest.fixture(scope='module')
+def app():
+    return QCoreApplication.instance() or QCoreApplication([])
+
+
+@pytest.fixture
+def manager(app):
+    manager = TaskManager()
+    manager.add_queue('q', 1, 2)
+    manager.release = threading.Event()
+    yield manager
+    manager.release.set()  # 断言失败时也放开占住线程池的任务
+
+
+def _wait(app, cond, timeout: float = 5.0):
+    deadline = time.monotonic() + timeout
+    while not cond():
+        assert time.monotonic() < deadline, '等待超时'
+        app.processEvents()
+        time.sleep(0.005)
+
+
+def _blocker(manager, events: list) -> threading.Event:
+    manager.submit_task(manager.release.wait, on_success=lambda _: events.append('blocker'), queue='q')
+    return manager.release
+
+
+def test_data_queue_has_pending_slot():
+    assert dict((name, pending) for name, _, pending in DEFAULT_QUEUES)['data'] > 0
+
+
+def test_pending_runs_by_priority(app, manager):
+    events = []
+    release = _blocker(manager, events)
+    low = manager.submit_task(lambda: 'low', on_success=events.append, queue='q', priority=0)
+    high = manager.submit_task(lambda: 'high', on_success=events.append, queue='q', priority=1)
+    with pytest.raises(RuntimeError):
+        manager.submit_task(lambda: None, queue='q')
+    assert not low.started and not high.started
+    release.set()
+    _wait(app, lambda: low.done and high.done and len(events) == 3)
+    assert events == ['blocker', 'high', 'low']
+
+
+def test_cancelled_while_pending_emits_cancelled(app, manager):
+    events = []
+    release = _blocker(manager, events)
+    kwargs = dict(on_success=lambda _: events.append('finished'), on_error=lambda _: events.append('error'),
+                  on_start=lambda: events.append('started'), on_cancel=lambda: events.append('cancelled'),
+                  queue='q')
+    handle = manager.submit_task(lambda: 'ran', **kwargs)
+    handle.cancel()
+    release.set()
+    _wait(app, lambda: 'cancelled' in events and not manager.is_busy('q'))
+    assert handle.done and not handle.started
+    assert events == ['blocker', 'cancelled']
+
+
+def test_cancel_queue_drops_pending_at_once(app, manager):
+    events = []
+    release = _blocker(manager, events)
+    handle = manager.submit_task(lambda: 'ran', on_cancel=lambda: events.append('cancelled'), queue='q')
+    manager.cancel_queue('q')
+    _wait(app, lambda: 'cancelled' in events)
+    assert handle.done and not handle.started
+    release.set()
+    _wait(app, lambda: not manager.is_busy('q'))
+    assert events == ['cancelled', 'blocker']
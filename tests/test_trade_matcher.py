@@ -0,0 +1,96 @@
+import pandas as pd
+import pytest
+
+from view.policy.boll_break import PERIOD_DELTAS, build_policy_df, extract_reverse_trades, get_sh
+from view.policy.stock import stock_name
+
+PERIOD_S = "2023-01-16"
+PERIOD_E = "2025-08-15"
+SH_MIN, SH_MAX = 2800, 4000
+
+
+def rescan_reverse_trades(code, df, policy_df, policySelect, sellPos,
+                          period_s, period_e, sh_min, sh_max, marketVal, peRatio):
+    """TradeMatcher 之前的 upperBreak 撮合：每次突破上轨都重新过滤整段周期线和日线，作为参照"""
+    period_delta = PERIOD_DELTAS[policySelect]
+    period_s = pd.to_datetime(period_s)
+    period_e = pd.to_datetime(period_e)
+    sub = policy_df[
+        (policy_df['日期'] >= period_s) &
+        (policy_df['日期'] <= period_e)
+    ].reset_index(drop=True)
+
+    upper_dates = sub.loc[sub['Break_Upper'], '日期'].tolist()
+    lower_dates = sub.loc[sub['Break_Lower'], '日期'].tolist()
+    trades = []
+    for up_date in reversed(upper_dates):
+        lows_after = [d for d in lower_dates if d > up_date]
+        if not lows_after:
+            continue
+        low_date = min(lows_after)
+
+        # 区间干净检查
+        mids = sub[(sub['日期'] > up_date) & (sub['日期'] < low_date)]
+        if mids['Break_Upper'].any() or mids['Break_Lower'].any():
+            continue
+
+        buy_day_candidates = df[(df['日期'] >= up_date) & (df['日期'] <= low_date)]
+        buy_price = policy_df[policy_df['日期'] == low_date]['Lower'].values[0]
+        buy_day_candidates = buy_day_candidates[buy_day_candidates['最低'] <= buy_price]
+        if buy_day_candidates.empty:
+            continue
+        buy_bar = buy_day_candidates.iloc[0]
+
+        sh = get_sh(buy_bar['日期'])
+        if sh < sh_min or sh > sh_max:
+            continue
+
+        sell_candidates = sub[sub['日期'] > low_date]
+        if sellPos == 0:
+            cond = sell_candidates['最高'] >= sell_candidates['MA20']
+        else:
+            cond = sell_candidates['最高'] >= sell_candidates['Upper']
+        if not cond.any():
+            continue
+        sell_policy_bar = sell_candidates[cond].iloc[0]
+
+        sell_date = sell_policy_bar['日期']
+        sell_day_candidates = df[(df['日期'] > buy_bar['日期']) & (df['日期'] >= (sell_date - period_delta)) &
+                                 (df['日期'] <= sell_date)]
+        sell_price = sell_policy_bar['MA20'] if sellPos == 0 else sell_policy_bar['Upper']
+        sell_day_candidates = sell_day_candidates[sell_day_candidates['最高'] >= sell_price]
+        if sell_day_candidates.empty:
+            continue
+        sell_bar = sell_day_candidates.iloc[0]
+
+        buy_price = round(buy_price, 2)
+        sell_price = round(sell_price, 2)
+        trades.append({
+            '代码': code,
+            '名称': stock_name(code),
+            '买入价': buy_price,
+            '卖出价': sell_price,
+            '买入日期': buy_bar['日期'].strftime("%Y-%m-%d"),
+            '卖出日期': sell_bar['日期'].strftime("%Y-%m-%d"),
+            '收益率': (sell_price - buy_price) / buy_price,
+            '持有天数': (sell_bar['日期'] - buy_bar['日期']).days,
+            '上证指数': sh,
+            '市值': round(marketVal, 2),
+            '市盈率': round(peRatio, 2),
+        })
+    return trades
+
+
+@pytest.mark.parametrize("sellPos", [0, 1])
+@pytest.mark.parametrize("policySelect", [0, 1, 2])
+def test_matcher_matches_rescan(sample_bars, policySelect, sellPos):
+    total = 0
+    for code, bars in sample_bars.items():
+        df, policy_df = build_policy_df(bars, policySelect)
+        args = (PERIOD_S, PERIOD_E, SH_MIN, SH_MAX, 100.0, 15.0)
+        expected = pd.DataFrame(rescan_reverse_trades(code, df, policy_df, policySelect, sellPos, *args))
+        actual = pd.DataFrame(extract_reverse_trades(code, df, policy_df, policySelect, sellPos, True, *args))
+        pd.testing.assert_frame_equal(actual, expected, obj=code)
+        total += len(actual)
+    # 样本要真的撮合出交易，否则比较没有意义
+    assert total > 0
@@ -0,0 +1,68 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from view.policy import stock
+from view.policy.param_sweep import SweepCombo, sweep_trade_keys, TRADE_COLUMNS
+from view.policy.walk_forward import WalkWindow, walk_forward_windows, window_periods, walk_forward_report
+
+WIDE = (0, 10 ** 9, -10 ** 9, 10 ** 9)  # 市值/市盈率区间放开，只看撮合结果
+
+
+def test_windows_roll_by_out_sample():
+    assert walk_forward_windows('2024-01-01', '2024-12-31', 6, 3) == [
+        WalkWindow('2024-01-01', '2024-06-30', '2024-07-01', '2024-09-30'),
+        WalkWindow('2024-04-01', '2024-09-30', '2024-10-01', '2024-12-31'),
+    ]
+    # 最后一个样本外截止到 period_e
+    assert walk_forward_windows('2024-01-01', '2024-11-15', 6, 3)[-1].out_e == '2024-11-15'
+    assert walk_forward_windows('2024-01-01', '2024-06-30', 6, 3) == []
+    with pytest.raises(ValueError):
+        walk_forward_windows('2024-01-01', '2024-12-31', 0, 3)
+
+
+def test_window_periods_interleave():
+    windows = walk_forward_windows('2024-01-01', '2024-12-31', 6, 3)
+    assert window_periods(windows) == [('2024-01-01', '2024-06-30'), ('2024-07-01', '2024-09-30'),
+                                       ('2024-04-01', '2024-09-30'), ('2024-10-01', '2024-12-31')]
+
+
+def _trades(rows) -> pd.DataFrame:
+    return pd.DataFrame(rows, columns=['_key', '_period', '代码', '收益率', '持有天数', '上证指数'])[TRADE_COLUMNS]
+
+
+def test_report_picks_in_sample_best_and_scores_out_sample():
+    a, b = sorted(stock.get_spot_index().codes)[:2]
+    combos = [SweepCombo(0, 0, True, 2800, 4000, *WIDE),
+              SweepCombo(1, 0, True, 2800, 4000, *WIDE),
+              SweepCombo(0, 0, True, 3000, 3100, *WIDE)]     # 与第一组共用撮合，上证区间事后筛选
+    keys = sweep_trade_keys(combos)
+    k0, k1 = keys.index((0, 0, True, None, None)), keys.index((1, 0, True, None, None))
+    windows = [WalkWindow('w0', '', 'o0', ''), WalkWindow('w1', '', 'o1', ''), WalkWindow('w2', '', 'o2', '')]
+    trades = _trades([
+        # 窗口 0 样本内：周线 4%/2天 = 2%/天，胜过三日线 1%/天
+        (k0, 0, a, 0.10, 10, 3050), (k1, 0, a, 0.04, 2, 3200),
+        # 窗口 0 样本外：只计周线的交易
+        (k1, 1, b, -0.02, 4, 3300), (k1, 1, a, 0.06, 6, 3300), (k0, 1, a, 0.50, 1, 3000),
+        # 窗口 1 样本内：三日线 (9%/3天, 20%/2天) 平均 5.8%/天；窄上证区间只剩第一笔 3%/天
+        (k0, 2, a, 0.09, 3, 3050), (k0, 2, b, 0.20, 2, 3500), (k1, 2, a, 0.01, 1, 3000),
+        # 窗口 1 样本外
+        (k0, 3, a, 0.03, 3, 3050), (k0, 3, b, 0.01, 1, 3500),
+        # 窗口 2 没有任何交易
+    ])
+    report, total = walk_forward_report(windows, combos, keys, trades, stock.get_spot_index())
+
+    assert report['样本内'].tolist()[:2] == ['w0~', 'w1~']
+    assert report['周期'].tolist()[:2] == ['周线', '三日线']
+    assert report['上证区间'].tolist()[:2] == ['2800-4000', '2800-4000']
+    np.testing.assert_allclose(report['样本内日收益率'].iloc[:2], [2.0, 5.8])
+    assert report['样本外交易次数'].tolist()[:2] == [2, 2]
+    np.testing.assert_allclose(report['样本外平均收益率'].iloc[:2], [2.0, 2.0])
+    np.testing.assert_allclose(report['样本外日收益率'].iloc[:2], [0.4, 1.0])
+    # 样本内没有交易的窗口只有日期
+    assert report['周期'].isna().iloc[2] and report['样本外交易次数'].isna().iloc[2]
+    # 合计为全部样本外交易合并统计：平均 2%，平均 3.5 天
+    assert total['交易次数'] == 4
+    assert total['平均收益率'] == 2.0
+    assert total['平均持有天数'] == 3.5
+    assert total['日收益率'] == round(2.0 / 3.5, 3)
@@ -1,10 +1,36 @@
-from PySide6.QtWidgets import QWidget, QMenu
-from PySide6.QtCore import Qt
+from PySide6.QtWidgets import QWidget, QMenu, QCheckBox, QSpinBox, QHBoxLayout, QLabel, QComboBox
+from PySide6.QtCore import Qt, QSize
+from qfluentwidgets import PushButton
 from PySide6.QtGui import QAction
 from common.utils import show_dialog
 from components.bar import ProgressInfoBar
+from components.frame_table import FrameTableModel, replace_table_widget
 from ui_page.ui_page_two import Ui_page_two
 from view.pages.page_back_test_handler import PageBackTestHandler
+from view.policy.strategy import list_strategies, ALL_STRATEGIES
+
+# (表头, 交易记录列名)
+BACKTEST_COLUMNS = [
+    ('股票代码', '代码'), ('名称', '名称'), ('买入价', '买入价'), ('卖出价', '卖出价'),
+    ('买入日期', '买入日期'), ('卖出日期', '卖出日期'), ('收益率（%）', '收益率'), ('持有天数', '持有天数'),
+    ('上证指数', '上证指数'), ('当前市值(亿)', '市值'), ('当前市盈率', '市盈率'), ('策略', '策略'),
+]
+
+# 参数寻优结果表：(表头, 结果列名)
+SWEEP_COLUMNS = [
+    ('周期', '周期'), ('卖出位置', '卖出位置'), ('突破上轨', '突破上轨'), ('上证区间', '上证区间'),
+    ('市值区间(亿)', '市值区间'), ('市盈率区间', '市盈率区间'), ('交易次数', '交易次数'),
+    ('平均收益率（%）', '平均收益率'), ('平均持有天数', '平均持有天数'), ('日收益率（%）', '日收益率'),
+]
+
+# 滚动验证结果表：每个窗口一行，样本内选出的参数及其样本内/样本外表现
+WALK_FORWARD_COLUMNS = [
+    ('样本内', '样本内'), ('样本外', '样本外'), ('周期', '周期'), ('卖出位置', '卖出位置'),
+    ('突破上轨', '突破上轨'), ('上证区间', '上证区间'), ('市值区间(亿)', '市值区间'), ('市盈率区间', '市盈率区间'),
+    ('样本内交易次数', '样本内交易次数'), ('样本内日收益率（%）', '样本内日收益率'),
+    ('样本外交易次数', '样本外交易次数'), ('样本外平均收益率（%）', '样本外平均收益率'),
+    ('样本外平均持有天数', '样本外平均持有天数'), ('样本外日收益率（%）', '样本外日收益率'),
+]
 
 # 从ui文件生成的Ui_page_one类继承
 class PageBackTest(QWidget, Ui_page_two):
@@ -16,10 +42,12 @@ class PageBackTest(QWidget, Ui_page_two):
         self.bind_event()
 
     def form_init(self):
-        self.stockBackTestTable.setColumnCount(11)
-        self.stockBackTestTable.setHorizontalHeaderLabels(['股票代码', '名称', '买入价', '卖出价', '买入日期',
-                                                           '卖出日期', '收益率（%）', '持有天数', '上证指数',
-                                                           '当前市值(亿)', '当前市盈率'])
+        # 结果表改用模型/视图，交易记录按批并入，排序在模型内完成
+        self.stockBackTestModel = FrameTableModel(BACKTEST_COLUMNS, self)
+        self.stockBackTestTable = replace_table_widget(self.stockBackTestTable, self.stockBackTestModel)
+        # 参数寻优时表格切换到结果表模型
+        self.sweepModel = FrameTableModel(SWEEP_COLUMNS, self)
+        self.walkForwardModel = FrameTableModel(WALK_FORWARD_COLUMNS, self)
         self.stockBackTestTable.setColumnWidth(0, 80)
         self.stockBackTestTable.setColumnWidth(1, 80)
         self.stockBackTestTable.setColumnWidth(2, 60)
@@ -31,13 +59,91 @@ class PageBackTest(QWidget, Ui_page_two):
         self.stockBackTestTable.setColumnWidth(8, 80)
         self.stockBackTestTable.setColumnWidth(9, 80)
         self.stockBackTestTable.setColumnWidth(10, 80)
-        self.stockBackTestTable.setAlternatingRowColors(True)
+        self.stockBackTestTable.setColumnWidth(11, 80)
 
         # 让表头接收右键事件
         header = self.stockBackTestTable.horizontalHeader()
         header.setContextMenuPolicy(Qt.CustomContextMenu)
         header.customContextMenuRequested.connect(self.header_context_menu)
 
+        # 策略选择：已注册的策略逐个列出，选「全部策略」时各策略共用特征依次回测
+        self.strategyRow = QWidget(self.widget)
+        strategyLayout = QHBoxLayout(self.strategyRow)
+        strategyLayout.setContentsMargins(0, 0, 0, 0)
+        strategyLabel = QLabel('策略', self.strategyRow)
+        strategyLabel.setStyleSheet(u"font: 11pt \"Microsoft YaHei UI\";")
+        strategyLayout.addWidget(strategyLabel)
+        self.strategySelect = QComboBox(self.strategyRow)
+        for strategy in list_strategies():
+            self.strategySelect.addItem(strategy.title, strategy.name)
+        self.strategySelect.addItem('全部策略', ALL_STRATEGIES)
+        strategyLayout.addWidget(self.strategySelect, 1)
+        self.verticalLayout.insertWidget(0, self.strategyRow)
+
+        # 多进程并行开关与停止按钮
+        self.parallelMode = QCheckBox('多进程并行', self.widget_11)
+        self.parallelMode.setStyleSheet(u"font: 11pt \"Microsoft YaHei UI\";")
+        self.horizontalLayout_10.addWidget(self.parallelMode)
+        # 参数寻优：区间输入框可填逗号分隔的多个值；周期/卖出位置/突破方式默认只取当前选择，勾选后遍历全部取值
+        self.sweepMode = QCheckBox('参数寻优', self.widget_11)
+        self.sweepMode.setStyleSheet(u"font: 11pt \"Microsoft YaHei UI\";")
+        self.sweepMode.setToolTip('上证/市值/市盈率可填多个值，如 3100,3200；周期/卖出位置/突破方式按右侧勾选遍历')
+        self.horizontalLayout_10.addWidget(self.sweepMode)
+        self.sweepPolicy = QCheckBox('遍历周期', self.widget_11)
+        self.sweepSellPos = QCheckBox('遍历卖出位置', self.widget_11)
+        self.sweepBreak = QCheckBox('遍历突破方式', self.widget_11)
+        for box in (self.sweepPolicy, self.sweepSellPos, self.sweepBreak):
+            box.setStyleSheet(u"font: 11pt \"Microsoft YaHei UI\";")
+            box.setToolTip('不勾选时只用当前选择的值，勾选后参数寻优/滚动验证遍历全部取值')
+            self.horizontalLayout_10.addWidget(box)
+        # 滚动验证：按 样本内/样本外 月数切窗口，样本内寻优、样本外检验，参数取值同参数寻优
+        self.walkForwardMode = QCheckBox('滚动验证', self.widget_11)
+        self.walkForwardMode.setStyleSheet(u"font: 11pt \"Microsoft YaHei UI\";")
+        self.horizontalLayout_10.addWidget(self.walkForwardMode)
+        self.inSampleMonths = QSpinBox(self.widget_11)
+        self.inSampleMonths.setRange(1, 120)
+        self.inSampleMonths.setValue(12)
+        self.inSampleMonths.setPrefix('样本内 ')
+        self.inSampleMonths.setSuffix(' 月')
+        self.horizontalLayout_10.addWidget(self.inSampleMonths)
+        self.outSampleMonths = QSpinBox(self.widget_11)
+        self.outSampleMonths.setRange(1, 60)
+        self.outSampleMonths.setValue(3)
+        self.outSampleMonths.setPrefix('样本外 ')
+        self.outSampleMonths.setSuffix(' 月')
+        self.horizontalLayout_10.addWidget(self.outSampleMonths)
+        # 组合模拟：回测结束后把全部交易信号放进一个账户，按资金/仓位/持仓数上限执行，显示资金曲线
+        self.portfolioRow = QWidget(self.widget)
+        portfolioLayout = QHBoxLayout(self.portfolioRow)
+        portfolioLayout.setContentsMargins(0, 0, 0, 0)
+        self.portfolioMode = QCheckBox('组合模拟', self.portfolioRow)
+        self.portfolioMode.setStyleSheet(u"font: 11pt \"Microsoft YaHei UI\";")
+        portfolioLayout.addWidget(self.portfolioMode)
+        self.initialCash = QSpinBox(self.portfolioRow)
+        self.initialCash.setRange(1, 100000)
+        self.initialCash.setValue(100)
+        self.initialCash.setPrefix('资金 ')
+        self.initialCash.setSuffix(' 万')
+        portfolioLayout.addWidget(self.initialCash)
+        self.maxPositions = QSpinBox(self.portfolioRow)
+        self.maxPositions.setRange(1, 200)
+        self.maxPositions.setValue(10)
+        self.maxPositions.setPrefix('最多持仓 ')
+        self.maxPositions.setSuffix(' 只')
+        portfolioLayout.addWidget(self.maxPositions)
+        self.positionPct = QSpinBox(self.portfolioRow)
+        self.positionPct.setRange(1, 100)
+        self.positionPct.setValue(10)
+        self.positionPct.setPrefix('单笔 ')
+        self.positionPct.setSuffix(' %')
+        portfolioLayout.addWidget(self.positionPct)
+        self.verticalLayout.insertWidget(self.verticalLayout.indexOf(self.backTestBtn), self.portfolioRow)
+        self.cancelBtn = PushButton('停止', self.widget)
+        self.cancelBtn.setMinimumSize(QSize(150, 0))
+        self.cancelBtn.setStyleSheet(u"font: 11pt \"Microsoft YaHei UI\";")
+        self.verticalLayout.insertWidget(self.verticalLayout.indexOf(self.backTestBtn) + 1,
+                                         self.cancelBtn, 0, Qt.AlignHCenter)
+
     def header_context_menu(self, pos):
         col = self.stockBackTestTable.horizontalHeader().logicalIndexAt(pos)
 
@@ -53,6 +159,7 @@ class PageBackTest(QWidget, Ui_page_two):
         menu.exec(self.stockBackTestTable.horizontalHeader().viewport().mapToGlobal(pos))
 
     def bind_event(self):
+        self.cancelBtn.clicked.connect(self.handler.cancel_task)
         self.backTestBtn.clicked.connect(self.handler.back_test)
 
     def show_state_tooltip(self, title, content):
@@ -68,7 +175,14 @@ class PageBackTest(QWidget, Ui_page_two):
             pass
 
     def clear_stock_table(self):
-        self.stockBackTestTable.setRowCount(0)
+        self.stockBackTestModel.clear()
+        self.sweepModel.clear()
+        self.walkForwardModel.clear()
+
+    def show_result_model(self, model: FrameTableModel):
+        """表格在交易记录、参数寻优和滚动验证结果之间切换"""
+        if self.stockBackTestTable.model() is not model:
+            self.stockBackTestTable.setModel(model)
 
     def on_common_error(self, msg):
         show_dialog(self, msg, '提示')
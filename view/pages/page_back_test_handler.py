@@ -3,24 +3,40 @@ from PySide6.QtWidgets import QApplication, QTableWidget, QTableWidgetItem, QVBo
 from typing import List, Dict, Tuple
 from api.api import demo_api
 import pandas as pd
-from common.utils import show_dialog
-from workers.TaskManager import task_manager
-from view.policy.stock import get_stock_data
-from view.policy.boll_break import boll_reverse_backtest
+from common.utils import show_dialog, show_task_progress
+from workers.TaskManager import task_manager, BatchChannel, CancelToken
+from view.policy.stock import get_stock_data, get_current_stock_info, spot_index_of, worker_state
+from view.policy.scan_plan import plan_backtest
+from view.policy.indicator_cache import get_indicator_cache
+from view.policy.parallel import run_sharded, sweep_shard, strategy_backtest_shard
+from view.policy.strategy import select_strategies, backtest_strategies, prepare_strategies
+from view.policy.param_sweep import (parse_values, value_ranges, sweep_combos, sweep_trade_keys, plan_sweep,
+                                     sweep_trades, sweep_grid, POLICY_NAMES, SELL_POS_NAMES)
+from view.policy.portfolio import PortfolioConfig, PortfolioResult, simulate_portfolio
+from components.equity_curve import EquityCurveDialog
+from view.policy.walk_forward import walk_forward_windows, window_periods, walk_forward_report, REPORT_COLUMNS
 #from common.my_logger import my_logger as logger
 
 class PageBackTestHandler(QObject):
     progress_signal = Signal(int)
     back_reverse_data_signal = Signal(pd.DataFrame)
     back_reverse_fail = Signal()
+    sweep_grid_signal = Signal(pd.DataFrame)
+    walk_forward_signal = Signal(pd.DataFrame, dict)
 
     def __init__(self, parent: 'PageBackTest'):
         super().__init__(parent)
         self._parent = parent
         self.all_res = []
+        self.plan = None
+        self.grid = None
+        self.walk_total = None
+        self._task = None
         self.progress_signal.connect(self.set_progress)
         self.back_reverse_data_signal.connect(self.back_reverse_data_handle)
         self.back_reverse_fail.connect(self.back_reverse_test_fail)
+        self.sweep_grid_signal.connect(self.sweep_grid_handle)
+        self.walk_forward_signal.connect(self.walk_forward_handle)
 
     def boll_reverse_backtest_task(self,
                                    policySelect :int,   # 0:三日线 1:周线 2:月线
@@ -33,22 +49,48 @@ class PageBackTestHandler(QObject):
                                    marketValMin: int,
                                    marketValMax: int,
                                    peRatioMin: int,
-                                   peRatioMax: int):
+                                   peRatioMax: int,
+                                   strategy: str = 'boll_reverse',
+                                   parallel: bool = False,
+                                   token: CancelToken = None):
         self.progress_signal.emit(0)
-        stock_data = get_stock_data()
+        stock_data = get_stock_data(backing="mmap")
         if stock_data is not None:
-            total = len(stock_data)
-            cnt = 0
-            for code, df in stock_data.items():
-                df_trades = boll_reverse_backtest(code, df, policySelect, sellPos, upperBreak, startTime, endTime,
-                                                  shMin, shMax, marketValMin, marketValMax, peRatioMin, peRatioMax)
-                if df_trades.empty:
-                    continue
-                self.back_reverse_data_signal.emit(df_trades)
-                cnt = cnt + 1
-                progress = cnt * 100 / total
-                self.progress_signal.emit(progress)
-            self.progress_signal.emit(100)
+            # 规划：先用快照和上证指数剔除不可能成交的股票，被剔除的不读日线
+            curr_data = get_current_stock_info()
+            self.plan = plan_backtest(list(stock_data), spot_index_of(curr_data), shMin, shMax, endTime,
+                                      marketValMin, marketValMax, peRatioMin, peRatioMax)
+            print(f"回测规划: {self.plan.summary()}")
+            # 交易记录和进度在工作线程里攒批/节流后再发给界面
+            trades = BatchChannel(self.back_reverse_data_signal.emit,
+                                  combine=lambda frames: pd.concat(frames, ignore_index=True))
+
+            def on_progress(value):
+                trades.poll()
+                token.report(value)
+
+            params = dict(policySelect=policySelect, sellPos=sellPos, upperBreak=upperBreak,
+                          period_s=startTime, period_e=endTime, sh_min=shMin, sh_max=shMax,
+                          marketValMin=marketValMin, marketValMax=marketValMax,
+                          peRatioMin=peRatioMin, peRatioMax=peRatioMax)
+            strategies = select_strategies(strategy)
+            if parallel:
+                # 多进程：按分片回测，每完成一个分片推送一次交易记录
+                # 子进程只读指标缓存等特征，先在主进程里预处理好
+                prepare_strategies(strategies, stock_data, self.plan.codes, params)
+                run_sharded(strategy_backtest_shard, self.plan.codes,
+                            dict(strategies=[s.name for s in strategies], params=params), worker_state(),
+                            on_result=trades.put,
+                            on_progress=on_progress,
+                            is_cancelled=token.is_cancelled)
+            elif self.plan.codes:
+                # 单个策略走整批算法（布林反转为全市场一次性计算布林带），多个策略逐只共用特征
+                backtest_strategies(strategies, stock_data, self.plan.codes, params,
+                                    on_trades=trades.put,
+                                    on_progress=on_progress,
+                                    is_cancelled=token.is_cancelled)
+            trades.close()
+            token.report(100)
         else:
             self.back_reverse_fail.emit()
                 #all_res.append(df_trades)
@@ -56,11 +98,94 @@ class PageBackTestHandler(QObject):
         #sorted_df = combined_df.sort_values(by='收益率', ascending=False)  # 按照收益率降序排列
         #self.data_signal.emit(sorted_df)
 
+    def _sweep_trades(self, stock_data, codes: list, keys: list, periods: list,
+                      parallel: bool, token: CancelToken) -> pd.DataFrame:
+        """按撮合键和区间批量撮合，参数寻优和滚动验证共用"""
+        params = dict(keys=keys, periods=periods)
+        if parallel and codes:
+            # 子进程只读指标缓存，先在主进程里刷新好
+            for policySelect in {key[0] for key in keys}:
+                get_indicator_cache(policySelect).refresh(stock_data, codes)
+            return run_sharded(sweep_shard, codes, params, worker_state(),
+                               on_progress=token.report,
+                               is_cancelled=token.is_cancelled)
+        return sweep_trades(stock_data, codes, on_progress=token.report,
+                            is_cancelled=token.is_cancelled, **params)
+
+    def param_sweep_task(self,
+                         choices: tuple,
+                         startTime: str,
+                         endTime: str,
+                         shRanges: list,
+                         marketValRanges: list,
+                         peRatioRanges: list,
+                         parallel: bool = False,
+                         token: CancelToken = None):
+        """参数寻优：所选 周期/卖出位置/突破方式 × 各区间组合，结果表一次性发给界面"""
+        token.report(0)
+        stock_data = get_stock_data(backing="mmap")
+        if stock_data is None:
+            self.back_reverse_fail.emit()
+            return
+        curr_data = get_current_stock_info()
+        spot = spot_index_of(curr_data)
+        combos = sweep_combos(*choices, shRanges, marketValRanges, peRatioRanges)
+        keys = sweep_trade_keys(combos, endTime)
+        codes = plan_sweep(list(stock_data), spot, combos) if keys else []
+        print(f"参数寻优: {len(combos)} 组参数，撮合 {len(keys)} 遍，评估 {len(codes)} 只")
+        trades = self._sweep_trades(stock_data, codes, keys, [(startTime, endTime)], parallel, token)
+        self.sweep_grid_signal.emit(sweep_grid(combos, keys, trades, spot))
+        token.report(100)
+
+    def walk_forward_task(self,
+                          choices: tuple,
+                          startTime: str,
+                          endTime: str,
+                          inMonths: int,
+                          outMonths: int,
+                          shRanges: list,
+                          marketValRanges: list,
+                          peRatioRanges: list,
+                          parallel: bool = False,
+                          token: CancelToken = None):
+        """滚动验证：各窗口样本内寻优、样本外记录，所有窗口一次撮合"""
+        token.report(0)
+        stock_data = get_stock_data(backing="mmap")
+        if stock_data is None:
+            self.back_reverse_fail.emit()
+            return
+        windows = walk_forward_windows(startTime, endTime, inMonths, outMonths)
+        if not windows:
+            self.walk_forward_signal.emit(pd.DataFrame(columns=REPORT_COLUMNS), {})
+            return
+        curr_data = get_current_stock_info()
+        spot = spot_index_of(curr_data)
+        combos = sweep_combos(*choices, shRanges, marketValRanges, peRatioRanges)
+        keys = sweep_trade_keys(combos, endTime)
+        codes = plan_sweep(list(stock_data), spot, combos) if keys else []
+        print(f"滚动验证: {len(windows)} 个窗口，{len(combos)} 组参数，撮合 {len(keys)} 遍，评估 {len(codes)} 只")
+        trades = self._sweep_trades(stock_data, codes, keys, window_periods(windows), parallel, token)
+        report, total = walk_forward_report(windows, combos, keys, trades, spot)
+        self.walk_forward_signal.emit(report, total)
+        token.report(100)
+
+    def portfolio_task(self, trades: pd.DataFrame, config: PortfolioConfig) -> PortfolioResult:
+        """组合模拟：按日期顺序在一个账户里执行全部交易信号"""
+        return simulate_portfolio(trades, get_stock_data(backing="mmap"), config)
+
     def back_test(self):
         self.set_progress(0)
+        if self._parent.walkForwardMode.isChecked():
+            self.walk_forward()
+            return
+        if self._parent.sweepMode.isChecked():
+            self.param_sweep()
+            return
         policySelect = self._parent.policySelect.currentIndex()
         sellPos = self._parent.sellPos.currentIndex()
         upperBreak = self._parent.breakUp.isChecked()
+        strategy = self._parent.strategySelect.currentData()
+        parallel = self._parent.parallelMode.isChecked()
         startTime = ''
         endTime = ''
         shMin = 0
@@ -85,66 +210,121 @@ class PageBackTestHandler(QObject):
         try:
             self._parent.show_state_tooltip('正在回测', '请稍后...')
             self._parent.clear_stock_table()
+            self._parent.show_result_model(self._parent.stockBackTestModel)
             self.all_res = []
-            task_manager.submit_task(
+            self.plan = None
+            self.grid = None
+            self._task = task_manager.submit_task(
                 self.boll_reverse_backtest_task, args=(policySelect, sellPos, upperBreak, startTime, endTime,
-                                                       shMin, shMax, marketValMin, marketValMax, peRatioMin, peRatioMax),
+                                                       shMin, shMax, marketValMin, marketValMax, peRatioMin, peRatioMax,
+                                                       strategy, parallel),
                 kwargs={},
                 on_success=self.back_reverse_test_success, 
-                on_error=lambda msg: self._parent.on_common_error(msg)
+                on_error=lambda msg: self._parent.on_common_error(msg),
+                on_progress=self.set_task_progress,
+                queue='backtest'
             )
         except RuntimeError as e:
             self._parent.close_state_tooltip()
             self._parent.on_common_error(str(e))
 
-    def back_reverse_data_handle(self, df: pd.DataFrame):
-        table = self._parent.stockBackTestTable
-        if not df.empty:
-            self.all_res.append(df)
-            for index, row in df.iterrows():
-                pos = table.rowCount()
-                table.insertRow(pos)
-
-                # 创建并设置每个单元格的内容和居中对齐
-                table.setItem(pos, 0, QTableWidgetItem(row['代码']))
-                table.item(pos, 0).setTextAlignment(Qt.AlignCenter)  # 股票代码居中
-
-                table.setItem(pos, 1, QTableWidgetItem(row['名称']))
-                table.item(pos, 1).setTextAlignment(Qt.AlignCenter)  # 股票名称居中
-
-                table.setItem(pos, 2, QTableWidgetItem(str(row['买入价'])))
-                table.item(pos, 2).setTextAlignment(Qt.AlignCenter)  # 买入价居中
+    def read_sweep_ranges(self):
+        """读取回测区间和各区间输入框（可填多个值），非法时提示并返回 None"""
+        try:
+            startTime = self._parent.startTime.date().toString("yyyyMMdd")
+            endTime = self._parent.endTime.date().toString("yyyyMMdd")
+            shRanges = value_ranges(parse_values(self._parent.shMin.text()),
+                                    parse_values(self._parent.shMax.text()))
+            marketValRanges = value_ranges(parse_values(self._parent.marketValMin.text()),
+                                           parse_values(self._parent.marketValMax.text()))
+            peRatioRanges = value_ranges(parse_values(self._parent.peRatioMin.text()),
+                                         parse_values(self._parent.peRatioMax.text()))
+        except ValueError:
+            show_dialog(self._parent, '输入了非法数据')
+            return None
+        if not shRanges or not marketValRanges or not peRatioRanges:
+            show_dialog(self._parent, '区间下限都大于上限，没有可评估的组合')
+            return None
+        return startTime, endTime, shRanges, marketValRanges, peRatioRanges
 
-                table.setItem(pos, 3, QTableWidgetItem(str(row['卖出价'])))
-                table.item(pos, 3).setTextAlignment(Qt.AlignCenter)  # 卖出价居中
+    def read_sweep_choices(self) -> tuple:
+        """(周期列表, 卖出位置列表, 突破方式列表)：勾选遍历的取全部值，否则只取当前选择"""
+        page = self._parent
+        policySelects = list(range(len(POLICY_NAMES))) if page.sweepPolicy.isChecked() \
+            else [page.policySelect.currentIndex()]
+        sellPositions = list(range(len(SELL_POS_NAMES))) if page.sweepSellPos.isChecked() \
+            else [page.sellPos.currentIndex()]
+        upperBreaks = [True, False] if page.sweepBreak.isChecked() else [page.breakUp.isChecked()]
+        return policySelects, sellPositions, upperBreaks
 
-                table.setItem(pos, 4, QTableWidgetItem(row['买入日期']))
-                table.item(pos, 4).setTextAlignment(Qt.AlignCenter)  # 买入日期居中
+    def _submit_grid_task(self, title: str, model, func, args: tuple, on_success):
+        try:
+            self._parent.show_state_tooltip(title, '请稍后...')
+            self._parent.clear_stock_table()
+            self._parent.show_result_model(model)
+            self.all_res = []
+            self.plan = None
+            self.grid = None
+            self.walk_total = None
+            self._task = task_manager.submit_task(
+                func, args=args,
+                kwargs={},
+                on_success=on_success,
+                on_error=lambda msg: self._parent.on_common_error(msg),
+                on_progress=self.set_task_progress,
+                queue='backtest'
+            )
+        except RuntimeError as e:
+            self._parent.close_state_tooltip()
+            self._parent.on_common_error(str(e))
 
-                table.setItem(pos, 5, QTableWidgetItem(row['卖出日期']))
-                table.item(pos, 5).setTextAlignment(Qt.AlignCenter)  # 卖出日期居中
+    def param_sweep(self):
+        ranges = self.read_sweep_ranges()
+        if ranges is None:
+            return
+        parallel = self._parent.parallelMode.isChecked()
+        self._submit_grid_task('正在参数寻优', self._parent.sweepModel, self.param_sweep_task,
+                               (self.read_sweep_choices(), *ranges, parallel), self.param_sweep_success)
 
-                item = QTableWidgetItem()
-                item.setData(Qt.DisplayRole, round(float(row['收益率'] * 100), 2))  # 存 float
-                table.setItem(pos, 6, item)
-                table.item(pos, 6).setTextAlignment(Qt.AlignCenter)  # 收益率居中
+    def walk_forward(self):
+        ranges = self.read_sweep_ranges()
+        if ranges is None:
+            return
+        startTime, endTime, shRanges, marketValRanges, peRatioRanges = ranges
+        inMonths = self._parent.inSampleMonths.value()
+        outMonths = self._parent.outSampleMonths.value()
+        parallel = self._parent.parallelMode.isChecked()
+        self._submit_grid_task('正在滚动验证', self._parent.walkForwardModel, self.walk_forward_task,
+                               (self.read_sweep_choices(), startTime, endTime, inMonths, outMonths, shRanges, marketValRanges,
+                                peRatioRanges, parallel),
+                               self.walk_forward_success)
 
-                table.setItem(pos, 7, QTableWidgetItem(str(row['持有天数'])))
-                table.item(pos, 7).setTextAlignment(Qt.AlignCenter)  # 持有天数居中
+    def cancel_task(self):
+        """请求停止正在进行的回测，已算出的结果保留"""
+        if self._task is not None:
+            self._task.cancel()
 
-                table.setItem(pos, 8, QTableWidgetItem(str(row['上证指数'])))
-                table.item(pos, 8).setTextAlignment(Qt.AlignCenter)  # 上证指数居中
+    def back_reverse_data_handle(self, df: pd.DataFrame):
+        if not df.empty:
+            self.all_res.append(df)
+            # 收益率按百分比显示，仍存数值以便排序
+            self._parent.stockBackTestModel.append(df.assign(收益率=(df['收益率'] * 100).round(2)))
 
-                table.setItem(pos, 9, QTableWidgetItem(str(row['市值'])))
-                table.item(pos, 9).setTextAlignment(Qt.AlignCenter)  # 市值居中
+    def sweep_grid_handle(self, grid: pd.DataFrame):
+        self.grid = grid
+        self._parent.sweepModel.append(grid)
 
-                table.setItem(pos, 10, QTableWidgetItem(str(row['市盈率'])))
-                table.item(pos, 10).setTextAlignment(Qt.AlignCenter)  # 市盈率居中
-                table.scrollToBottom()
+    def walk_forward_handle(self, report: pd.DataFrame, total: dict):
+        self.grid = report
+        self.walk_total = total
+        self._parent.walkForwardModel.append(report)
 
     def set_progress(self, progress):
         self._parent.backTestProgress.setValue(progress)
 
+    def set_task_progress(self, progress: int, eta: float):
+        show_task_progress(self._parent.backTestProgress, progress, eta)
+
     def back_reverse_test_fail(self):
         self._parent.close_state_tooltip()
         if not self.all_res:
@@ -152,8 +332,11 @@ class PageBackTestHandler(QObject):
 
     def back_reverse_test_success(self):
         self._parent.close_state_tooltip()
+        finish_msg = '回测已停止' if self._task is not None and self._task.is_cancelled() else '回测结束'
+        if self.plan is not None:
+            finish_msg = f'{finish_msg}（{self.plan.summary()}）'
         if not self.all_res:
-            show_dialog(self._parent, '回测结束, 没有任何交易记录')
+            show_dialog(self._parent, f'{finish_msg}, 没有任何交易记录')
             return
         result = pd.concat(self.all_res, ignore_index=True)
         avg_ret = result['收益率'].mean()
@@ -166,4 +349,61 @@ class PageBackTestHandler(QObject):
         self._parent.day_ret.setText(str(day_ret))
         self._parent.avg_ret.setText(str(avg_ret))
         self._parent.avg_days.setText(str(avg_days))
-        show_dialog(self._parent, '回测结束')
+        show_dialog(self._parent, finish_msg)
+        if self._parent.portfolioMode.isChecked():
+            self.simulate(result)
+
+    def simulate(self, trades: pd.DataFrame):
+        config = PortfolioConfig(initial_cash=self._parent.initialCash.value() * 10000,
+                                 max_positions=self._parent.maxPositions.value(),
+                                 position_pct=self._parent.positionPct.value() / 100)
+        try:
+            self._parent.show_state_tooltip('正在组合模拟', '请稍后...')
+            task_manager.submit_task(
+                self.portfolio_task, args=(trades, config),
+                kwargs={},
+                on_success=self.portfolio_success,
+                on_error=lambda msg: self._parent.on_common_error(msg),
+                queue='backtest'
+            )
+        except RuntimeError as e:
+            self._parent.close_state_tooltip()
+            self._parent.on_common_error(str(e))
+
+    def portfolio_success(self, result: PortfolioResult):
+        self._parent.close_state_tooltip()
+        if result.fills.empty:
+            show_dialog(self._parent, '组合模拟：资金不足一手或没有可成交的信号')
+            return
+        EquityCurveDialog(result.equity, result.stats, self._parent).exec()
+
+    def param_sweep_success(self):
+        self._parent.close_state_tooltip()
+        finish_msg = '参数寻优已停止' if self._task is not None and self._task.is_cancelled() else '参数寻优结束'
+        if self.grid is None or not (self.grid['交易次数'] > 0).any():
+            show_dialog(self._parent, f'{finish_msg}, 没有任何交易记录')
+            return
+        # 汇总栏显示日收益率最高的一组
+        best = self.grid.sort_values('日收益率', ascending=False, na_position='last').iloc[0]
+        self._parent.day_ret.setText(str(best['日收益率']))
+        self._parent.avg_ret.setText(str(best['平均收益率']))
+        self._parent.avg_days.setText(str(best['平均持有天数']))
+        show_dialog(self._parent, f"{finish_msg}（{len(self.grid)} 组参数，最优：{best['周期']}/"
+                                  f"{best['卖出位置']}/突破上轨{best['突破上轨']}/上证 {best['上证区间']}/"
+                                  f"市值 {best['市值区间']}/市盈率 {best['市盈率区间']}）")
+
+    def walk_forward_success(self):
+        self._parent.close_state_tooltip()
+        finish_msg = '滚动验证已停止' if self._task is not None and self._task.is_cancelled() else '滚动验证结束'
+        if self.grid is None or self.grid.empty:
+            show_dialog(self._parent, f'{finish_msg}, 回测区间不足一个样本内+样本外窗口')
+            return
+        total = self.walk_total or {}
+        if not total.get('交易次数'):
+            show_dialog(self._parent, f'{finish_msg}, 样本外没有任何交易记录')
+            return
+        # 汇总栏显示全部样本外交易合并后的表现
+        self._parent.day_ret.setText(str(total['日收益率']))
+        self._parent.avg_ret.setText(str(total['平均收益率']))
+        self._parent.avg_days.setText(str(total['平均持有天数']))
+        show_dialog(self._parent, f"{finish_msg}（{len(self.grid)} 个窗口，样本外共 {total['交易次数']} 笔交易）")
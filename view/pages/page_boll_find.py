@@ -1,10 +1,19 @@
-from PySide6.QtWidgets import QWidget, QMenu
-from PySide6.QtCore import Qt
+from PySide6.QtWidgets import QWidget, QMenu, QCheckBox, QSpinBox, QHBoxLayout, QLabel, QComboBox
+from PySide6.QtCore import Qt, QSize
+from qfluentwidgets import PushButton
 from PySide6.QtGui import QAction
 from common.utils import show_dialog
 from components.bar import ProgressInfoBar
+from components.frame_table import FrameTableModel, replace_table_widget
 from ui_page.ui_page_three import Ui_page_three
 from view.pages.page_boll_find_handler import PageBollFindHandler
+from view.policy.strategy import list_strategies, ALL_STRATEGIES
+
+# (表头, 结果列名)
+BOLL_FIND_COLUMNS = [
+    ('股票代码', '代码'), ('名称', '名称'), ('当前市值(亿)', '市值'),
+    ('当前市盈率', '市盈率'), ('日期', '日期'), ('价格', '价格'), ('策略', '策略'),
+]
 
 # 从ui文件生成的Ui_page_one类继承
 class PageBollFind(QWidget, Ui_page_three):
@@ -16,18 +25,54 @@ class PageBollFind(QWidget, Ui_page_three):
         self.bind_event()
 
     def form_init(self):
-        self.stockBollTable.setColumnCount(6)
-        self.stockBollTable.setHorizontalHeaderLabels(['股票代码', '名称', '当前市值(亿)', '当前市盈率', '日期', '价格'])
+        self.stockBollModel = FrameTableModel(BOLL_FIND_COLUMNS, self)
+        self.stockBollTable = replace_table_widget(self.stockBollTable, self.stockBollModel)
         self.stockBollTable.setColumnWidth(0, 80)   #股票代码
         self.stockBollTable.setColumnWidth(1, 80)   #名称
         self.stockBollTable.setColumnWidth(2, 80)   #当前市值
         self.stockBollTable.setColumnWidth(3, 80)  #市盈率
         self.stockBollTable.setColumnWidth(4, 80)  #日期
         self.stockBollTable.setColumnWidth(5, 80)  #价格
-        self.stockBollTable.setAlternatingRowColors(True)
+        self.stockBollTable.setColumnWidth(6, 80)  #策略
+
+        # 策略选择：已注册的策略逐个列出，选「全部策略」时各策略共用特征依次监测
+        self.strategyRow = QWidget(self.widget)
+        strategyLayout = QHBoxLayout(self.strategyRow)
+        strategyLayout.setContentsMargins(0, 0, 0, 0)
+        strategyLabel = QLabel('策略', self.strategyRow)
+        strategyLabel.setStyleSheet(u"font: 11pt \"Microsoft YaHei UI\";")
+        strategyLayout.addWidget(strategyLabel)
+        self.strategySelect = QComboBox(self.strategyRow)
+        for strategy in list_strategies():
+            self.strategySelect.addItem(strategy.title, strategy.name)
+        self.strategySelect.addItem('全部策略', ALL_STRATEGIES)
+        strategyLayout.addWidget(self.strategySelect, 1)
+        self.verticalLayout.insertWidget(0, self.strategyRow)
+
+        # 多进程并行开关与停止按钮
+        self.parallelMode = QCheckBox('多进程并行', self.widget_11)
+        self.parallelMode.setStyleSheet(u"font: 11pt \"Microsoft YaHei UI\";")
+        self.horizontalLayout_10.addWidget(self.parallelMode)
+        # 盯盘开关与快照轮询间隔（秒），目前只支持布林反转
+        self.watchMode = QCheckBox('盯盘', self.widget_11)
+        self.watchMode.setStyleSheet(u"font: 11pt \"Microsoft YaHei UI\";")
+        self.horizontalLayout_10.addWidget(self.watchMode)
+        self.watchInterval = QSpinBox(self.widget_11)
+        self.watchInterval.setRange(5, 600)
+        self.watchInterval.setValue(30)
+        self.watchInterval.setSuffix(' 秒')
+        self.horizontalLayout_10.addWidget(self.watchInterval)
+        self.cancelBtn = PushButton('停止', self.widget)
+        self.cancelBtn.setMinimumSize(QSize(150, 0))
+        self.cancelBtn.setStyleSheet(u"font: 11pt \"Microsoft YaHei UI\";")
+        self.verticalLayout.insertWidget(self.verticalLayout.indexOf(self.bollFindBtn) + 1,
+                                         self.cancelBtn, 0, Qt.AlignHCenter)
 
     def bind_event(self):
+        self.cancelBtn.clicked.connect(self.handler.cancel_task)
         self.bollFindBtn.clicked.connect(self.handler.find_boll_codes)
+        self.watchMode.toggled.connect(self.handler.toggle_watch)
+        self.watchInterval.valueChanged.connect(self.handler.set_watch_interval)
 
     def show_state_tooltip(self, title, content):
         self.loading_bar = ProgressInfoBar(title, content, self)
@@ -42,7 +87,7 @@ class PageBollFind(QWidget, Ui_page_three):
             pass
 
     def clear_stock_table(self):
-        self.stockBollTable.setRowCount(0)
+        self.stockBollModel.clear()
 
     def on_common_error(self, msg):
         show_dialog(self, msg, '提示')
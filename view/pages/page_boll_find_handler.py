@@ -1,26 +1,38 @@
-from PySide6.QtCore import Qt , QObject, Signal
+from PySide6.QtCore import Qt , QObject, Signal, QTimer
 from PySide6.QtWidgets import QApplication, QTableWidget, QTableWidgetItem, QVBoxLayout, QWidget
 from typing import List, Dict, Tuple
 from api.api import demo_api
 import pandas as pd
-from common.utils import show_dialog
-from workers.TaskManager import task_manager
-from view.policy.stock import get_stock_data, get_current_stock_info
-from view.policy.boll_break import boll_find
+from common.utils import show_dialog, show_task_progress
+from workers.TaskManager import task_manager, BatchChannel, CancelToken
+from view.policy.stock import get_stock_data, get_current_stock_info, spot_index_of, worker_state, _is_trade_time
+from view.policy.boll_scan import BollWatch
+from view.policy.scan_plan import plan_boll_find
+from view.policy.parallel import run_sharded, strategy_scan_shard
+from view.policy.strategy import select_strategies, scan_strategies, prepare_strategies, get_strategy
 #from common.my_logger import my_logger as logger
 
+WATCH_STRATEGY = 'boll_reverse'     # 盯盘的增量重判只实现了布林反转
+
 class PageBollFindHandler(QObject):
     progress_signal = Signal(int)
     boll_find_data_signal = Signal(pd.DataFrame)
     boll_find_fail_signal = Signal()
+    watch_signal = Signal(pd.DataFrame, list)
 
     def __init__(self, parent: 'PageBollFind'):
         super().__init__(parent)
         self._parent = parent
         self.all_res = []
+        self.plan = None
+        self._task = None
+        self._watch = None
+        self._watch_timer = QTimer(self)
+        self._watch_timer.timeout.connect(self.watch_tick)
         self.progress_signal.connect(self.set_progress)
         self.boll_find_data_signal.connect(self.boll_find_data_handle)
         self.boll_find_fail_signal.connect(self.boll_find_fail)
+        self.watch_signal.connect(self.watch_data_handle)
 
     def boll_find_task(self,
                        policySelect :int,   # 0:三日线 1:周线 2:月线
@@ -28,90 +40,167 @@ class PageBollFindHandler(QObject):
                        marketValMin: int,
                        marketValMax: int,
                        peRatioMin: int,
-                       peRatioMax: int):
+                       peRatioMax: int,
+                       strategy: str = 'boll_reverse',
+                       parallel: bool = False,
+                       token: CancelToken = None):
         self.progress_signal.emit(0)
-        stock_data = get_stock_data()
+        stock_data = get_stock_data(backing="mmap")
         curr_data = get_current_stock_info(update=True)
         if stock_data is not None:
-            total = len(stock_data)
-            cnt = 0
-            for code, df in stock_data.items():
-                df_trades = boll_find(code, df, curr_data, policySelect,  upperBreak,
-                                      marketValMin, marketValMax, peRatioMin, peRatioMax)
-                if df_trades.empty:
-                    continue
-                self.boll_find_data_signal.emit(df_trades)
-                cnt = cnt + 1
-                progress = cnt * 100 / total
-                self.progress_signal.emit(progress)
-            self.progress_signal.emit(100)
+            # 规划：先用快照的市值/市盈率剔除，不合格的股票不读取日线
+            spot = spot_index_of(curr_data)
+            self.plan = plan_boll_find(list(stock_data), spot, marketValMin, marketValMax, peRatioMin, peRatioMax)
+            print(f"监测规划: {self.plan.summary()}")
+            codes = self.plan.codes
+            # 结果在工作线程里攒批后再发给界面
+            found = BatchChannel(self.boll_find_data_signal.emit,
+                                 combine=lambda frames: pd.concat(frames, ignore_index=True))
+            params = dict(policySelect=policySelect, upperBreak=upperBreak,
+                          marketValMin=marketValMin, marketValMax=marketValMax,
+                          peRatioMin=peRatioMin, peRatioMax=peRatioMax)
+            strategies = select_strategies(strategy)
+            if parallel:
+                # 子进程只读指标缓存等特征，先在主进程里预处理好
+                prepare_strategies(strategies, stock_data, codes, params)
+                run_sharded(strategy_scan_shard, codes,
+                            dict(strategies=[s.name for s in strategies], params=params), worker_state(),
+                            on_result=found.put,
+                            on_progress=token.report,
+                            is_cancelled=token.is_cancelled)
+                found.close()
+                token.report(100)
+                return
+            # 单个策略走整批算法（布林反转为增量监测），多个策略逐只共用特征
+            hits = scan_strategies(strategies, stock_data, spot, codes, params,
+                                   on_progress=token.report, is_cancelled=token.is_cancelled)
+            if not hits.empty:
+                found.put(hits)
+            found.close()
+            token.report(100)
         else:
             self.boll_find_fail_signal.emit()
 
+    def read_bounds(self) -> Tuple[int, int, int, int]:
+        """界面上的 (市值下限, 市值上限, 市盈率下限, 市盈率上限)，输入非法时返回 None"""
+        try:
+            return (int(self._parent.marketValMin.text()),
+                    int(self._parent.marketValMax.text()),
+                    int(self._parent.peRatioMin.text()),
+                    int(self._parent.peRatioMax.text()))
+        except ValueError:
+            show_dialog(self._parent, '输入了非法数据')
+            return None
+
     def find_boll_codes(self):
+        if self._parent.watchMode.isChecked():
+            self._parent.watchMode.setChecked(False)
         self.set_progress(0)
         policySelect = self._parent.policySelect.currentIndex()
         upperBreak = self._parent.breakUp.isChecked()
-        marketValMin = 0
-        marketValMax = 0
-        peRatioMin = 0
-        peRatioMax = 0
-        try:
-            marketValMin = int(self._parent.marketValMin.text())
-            marketValMax = int(self._parent.marketValMax.text())
-            peRatioMin = int(self._parent.peRatioMin.text())
-            peRatioMax = int(self._parent.peRatioMax.text())
-        except ValueError:
-            show_dialog(self._parent, '输入了非法数据')
+        strategy = self._parent.strategySelect.currentData()
+        parallel = self._parent.parallelMode.isChecked()
+        bounds = self.read_bounds()
+        if bounds is None:
             return
+        marketValMin, marketValMax, peRatioMin, peRatioMax = bounds
 
         try:
             self._parent.show_state_tooltip('正在查找', '请稍后...')
             self._parent.clear_stock_table()
             self.all_res = []
-            task_manager.submit_task(
+            self.plan = None
+            self._task = task_manager.submit_task(
                 self.boll_find_task, args=(policySelect, upperBreak,
-                                            marketValMin, marketValMax, peRatioMin, peRatioMax),
+                                            marketValMin, marketValMax, peRatioMin, peRatioMax,
+                                            strategy, parallel),
                 kwargs={},
                 on_success=self.boll_find_success, 
-                on_error=lambda msg: self._parent.on_common_error(msg)
+                on_error=lambda msg: self._parent.on_common_error(msg),
+                on_progress=self.set_task_progress,
+                queue='scan'
             )
         except RuntimeError as e:
             self._parent.close_state_tooltip()
             self._parent.on_common_error(str(e))
 
-    def boll_find_data_handle(self, df: pd.DataFrame):
-        table = self._parent.stockBollTable
-        if not df.empty:
-            self.all_res.append(df)
-            for index, row in df.iterrows():
-                pos = table.rowCount()
-                table.insertRow(pos)
+    def cancel_task(self):
+        """请求停止正在进行的查找，已找到的结果保留"""
+        if self._parent.watchMode.isChecked():
+            self._parent.watchMode.setChecked(False)
+        if self._task is not None:
+            self._task.cancel()
 
-                # 创建并设置每个单元格的内容和居中对齐
-                table.setItem(pos, 0, QTableWidgetItem(row['代码']))
-                table.item(pos, 0).setTextAlignment(Qt.AlignCenter)  # 股票代码居中
+    def toggle_watch(self, checked: bool):
+        """盯盘开关：打开时先整体查找一次，之后在交易时段按间隔只重判快照有变化的股票"""
+        if not checked:
+            self._watch_timer.stop()
+            self._watch = None
+            return
+        if self._parent.strategySelect.currentData() != WATCH_STRATEGY:
+            show_dialog(self._parent, '盯盘目前只支持布林反转策略')
+            self._parent.watchMode.setChecked(False)
+            return
+        bounds = self.read_bounds()
+        if bounds is None:
+            self._parent.watchMode.setChecked(False)
+            return
+        self._watch = BollWatch(self._parent.policySelect.currentIndex(),
+                                self._parent.breakUp.isChecked(), *bounds)
+        self._parent.clear_stock_table()
+        self.all_res = []
+        self._watch_timer.start(self._parent.watchInterval.value() * 1000)
+        self.watch_tick(force=True)
 
-                table.setItem(pos, 1, QTableWidgetItem(row['名称']))
-                table.item(pos, 1).setTextAlignment(Qt.AlignCenter)  # 股票名称居中
+    def set_watch_interval(self, seconds: int):
+        if self._watch_timer.isActive():
+            self._watch_timer.setInterval(seconds * 1000)
 
-                table.setItem(pos, 2, QTableWidgetItem(str(row['市值'])))
-                table.item(pos, 2).setTextAlignment(Qt.AlignCenter)  # 市值居中
+    def watch_tick(self, force: bool = False):
+        # 非交易时段快照不会变化；上一轮还没结束时跳过本轮
+        if self._watch is None or task_manager.is_busy('scan'):
+            return
+        if not force and not _is_trade_time():
+            return
+        self._task = task_manager.submit_task(
+            self.watch_task, args=(self._watch, force),
+            kwargs={},
+            on_error=lambda msg: self._parent.on_common_error(msg),
+            queue='scan'
+        )
 
-                table.setItem(pos, 3, QTableWidgetItem(str(row['市盈率'])))
-                table.item(pos, 3).setTextAlignment(Qt.AlignCenter)  # 市盈率居中
+    def watch_task(self, watch: BollWatch, force: bool):
+        stock_data = get_stock_data(backing="mmap")
+        if stock_data is None:
+            self.boll_find_fail_signal.emit()
+            return
+        # 首轮沿用已有快照，之后每轮都重新拉取
+        curr_data = get_current_stock_info(update=not force)
+        changed, exits = watch.update(stock_data, spot_index_of(curr_data))
+        if not changed.empty or exits:
+            self.watch_signal.emit(changed, exits)
 
-                table.setItem(pos, 4, QTableWidgetItem(str(row['日期'])))
-                table.item(pos, 4).setTextAlignment(Qt.AlignCenter)  # 日期居中
+    def watch_data_handle(self, changed: pd.DataFrame, exits: list):
+        if self._watch is None:
+            return
+        if exits:
+            print(f"盯盘: {len(exits)} 只不再满足条件: {', '.join(exits)}")
+            self._parent.stockBollModel.remove('代码', exits)
+        if not changed.empty:
+            changed = changed.assign(策略=get_strategy(WATCH_STRATEGY).title)
+            self._parent.stockBollModel.upsert(changed, '代码')
 
-                table.setItem(pos, 5, QTableWidgetItem(str(row['价格'])))
-                table.item(pos, 5).setTextAlignment(Qt.AlignCenter)  # 价格居中
-                
-                table.scrollToBottom()
+    def boll_find_data_handle(self, df: pd.DataFrame):
+        if not df.empty:
+            self.all_res.append(df)
+            self._parent.stockBollModel.append(df)
 
     def set_progress(self, progress):
         self._parent.backTestProgress.setValue(progress)
 
+    def set_task_progress(self, progress: int, eta: float):
+        show_task_progress(self._parent.backTestProgress, progress, eta)
+
     def boll_find_fail(self):
         self._parent.close_state_tooltip()
         if not self.all_res:
@@ -119,7 +208,10 @@ class PageBollFindHandler(QObject):
 
     def boll_find_success(self):
         self._parent.close_state_tooltip()
+        finish_msg = '查找结束'
+        if self.plan is not None:
+            finish_msg = f'{finish_msg}（{self.plan.summary()}）'
         if not self.all_res:
-            show_dialog(self._parent, '查找结束, 没有符合策略的股票')
+            show_dialog(self._parent, f'{finish_msg}, 没有符合策略的股票')
             return
-        show_dialog(self._parent, '查找结束')
+        show_dialog(self._parent, finish_msg)
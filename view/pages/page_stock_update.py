@@ -2,9 +2,16 @@ from PySide6.QtWidgets import QWidget
 
 from common.utils import show_dialog
 from components.bar import ProgressInfoBar
+from components.frame_table import FrameTableModel, replace_table_widget
 from ui_page.ui_page_one import Ui_page_one
 from view.pages.page_stock_update_handler import PageOneHandler
 
+# (表头, 行数据键)
+STOCK_UPDATE_COLUMNS = [
+    ('股票代码', '代码'), ('名称', '名称'), ('最新日期', '日期'),
+    ('开盘', '开盘'), ('最高', '最高'), ('最低', '最低'), ('收盘', '收盘'),
+]
+
 class PageStockUpdate(QWidget, Ui_page_one):
     def __init__(self, parent=None):
         super().__init__(parent)
@@ -15,8 +22,8 @@ class PageStockUpdate(QWidget, Ui_page_one):
         self.bind_event()
 
     def form_init(self):
-        self.stockUpdataTable.setColumnCount(7)
-        self.stockUpdataTable.setHorizontalHeaderLabels(['股票代码', '名称', '最新日期', '开盘', '最高', '最低', '收盘'])
+        self.stockUpdataModel = FrameTableModel(STOCK_UPDATE_COLUMNS, self)
+        self.stockUpdataTable = replace_table_widget(self.stockUpdataTable, self.stockUpdataModel)
         self.stockUpdataTable.setColumnWidth(0, 100)
         self.stockUpdataTable.setColumnWidth(1, 130)
         self.stockUpdataTable.setColumnWidth(2, 140)
@@ -24,7 +31,6 @@ class PageStockUpdate(QWidget, Ui_page_one):
         self.stockUpdataTable.setColumnWidth(4, 100)
         self.stockUpdataTable.setColumnWidth(5, 100)
         self.stockUpdataTable.setColumnWidth(6, 100)
-        self.stockUpdataTable.setAlternatingRowColors(True)
 
     def bind_event(self):
         self.loadLocalBtn.clicked.connect(self.handler.load_local_stock)
@@ -44,7 +50,7 @@ class PageStockUpdate(QWidget, Ui_page_one):
             pass
 
     def clear_stock_table(self):
-        self.stockUpdataTable.setRowCount(0)
+        self.stockUpdataModel.clear()
 
     def on_common_error(self, msg):
         show_dialog(self, msg, '提示')
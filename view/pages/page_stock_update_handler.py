@@ -2,86 +2,153 @@ from PySide6.QtCore import Qt , QObject, Signal, QDate
 from PySide6.QtWidgets import QApplication, QTableWidget, QTableWidgetItem, QVBoxLayout, QWidget
 import pandas as pd
 from api.api import demo_api
-from common.utils import show_dialog
-from workers.TaskManager import task_manager
-from view.policy.stock import load_or_update, get_all_stock_from_cache, get_all_stock
+from common.utils import show_dialog, show_task_progress
+from workers.TaskManager import task_manager, BatchChannel, CancelToken
+from view.policy.stock import (load_or_update, get_all_stock_from_cache, get_all_stock, flush_stock_data, get_stock_data,
+                               stale_codes, HIST_WORKERS)
+from view.policy.downloader import download_all
+from view.policy.indicator_cache import refresh_indicator_caches
 #from common.my_logger import my_logger as logger
 
 class PageOneHandler(QObject):
     progress_signal = Signal(int)
-    row_ready = Signal(str, str, str, pd.Series)
+    rows_ready = Signal(list)
 
     def __init__(self, parent: 'PageOne'):
         super().__init__(parent)
         self._parent = parent
         self.progress_signal.connect(self.set_progress)
-        self.row_ready.connect(self.add_row_to_table)
-
-    def load_show_stock_task(self, codes, names, update=False, update_day = ''):
+        self.rows_ready.connect(self.add_rows_to_table)
+
+    def _emit_latest_row(self, rows: BatchChannel, code, names, df):
+        """把某只股票最新一天的数据放入发往界面的批次，返回是否成功"""
+        if '日期' not in df.columns:
+            print(f"[{code}] 缺失列：日期，跳过")
+            return False
+        # 确保日期列是 datetime 类型（虽然代码中已经转换过了，但这里再确认一下）
+        df['日期'] = pd.to_datetime(df['日期'])
+
+        # 找到最新一天的日期
+        latest_date = df['日期'].max()
+
+        # 筛选出最新一天的数据
+        latest_data = df[df['日期'] == latest_date]
+
+        # 获取最新一天的数据，包括 '日期', '开盘', '最高', '最低', '收盘'
+        latest_data = latest_data[['日期', '开盘', '最高', '最低', '收盘']]
+        if latest_data.empty:
+            return False
+        latest_data_row = latest_data.iloc[0]
+        # 将日期转换为字符串格式
+        latest_date_str = latest_data_row['日期'].strftime("%Y-%m-%d")
+        rows.put({
+            '代码': code,
+            '名称': names.get(code, ''),
+            '日期': latest_date_str,
+            '开盘': latest_data_row['开盘'],
+            '最高': latest_data_row['最高'],
+            '最低': latest_data_row['最低'],
+            '收盘': latest_data_row['收盘'],
+        })
+        return True
+
+    def load_show_stock_task(self, codes, names, update=False, update_day = '', token: CancelToken = None):
         total = len(codes)
         cnt = 0
+        # 表格行攒批后再发给界面，进度经 token 节流上报
+        rows = BatchChannel(self.rows_ready.emit)
+        progress = token.report
         try:
             self.progress_signal.emit(0)
+            if update:
+                # 按交易日历只下载确实落后的股票，其余直接显示本地数据
+                stale = stale_codes(codes, update_day)
+                stale_set = set(stale)
+                print(f"需要下载 {len(stale)} 只，{total - len(stale)} 只已是最新")
+                for code in codes:
+                    if token.is_cancelled():
+                        return
+                    if code in stale_set:
+                        continue
+                    cnt = cnt + 1
+                    self._emit_latest_row(rows, code, names, load_or_update(code, False, update_day))
+                    progress(cnt * 100 / total)
+
+                # 并发下载，每完成一只就登记表格行和进度
+                def on_result(code, df):
+                    nonlocal cnt
+                    cnt = cnt + 1
+                    self._emit_latest_row(rows, code, names, df)
+                    progress(cnt * 100 / total)
+
+                def on_error(code, e):
+                    nonlocal cnt
+                    cnt = cnt + 1
+                    print(f"[{code}] 更新失败：{e}")
+                    rows.poll()
+                    progress(cnt * 100 / total)
+
+                _, errors = download_all(stale, lambda code: load_or_update(code, True, update_day),
+                                         workers=HIST_WORKERS, on_result=on_result, on_error=on_error,
+                                         is_cancelled=token.is_cancelled)
+                if errors:
+                    print(f"共 {len(errors)} 只股票更新失败")
+                return
             for code in codes:
+                if token.is_cancelled():
+                    break
                 df = load_or_update(code, update, update_day)
-
-                if '日期' not in df.columns:
-                    print(f"[{code}] 缺失列：日期，跳过")
-                    continue
-                # 确保日期列是 datetime 类型（虽然代码中已经转换过了，但这里再确认一下）
-                df['日期'] = pd.to_datetime(df['日期'])
-
-                # 找到最新一天的日期
-                latest_date = df['日期'].max()
-
-                # 筛选出最新一天的数据
-                latest_data = df[df['日期'] == latest_date]
-
-                # 获取最新一天的数据，包括 '日期', '开盘', '最高', '最低', '收盘'
-                latest_data = latest_data[['日期', '开盘', '最高', '最低', '收盘']]
-                if not latest_data.empty:
-                    latest_data_row = latest_data.iloc[0]
-                    # 将日期转换为字符串格式
-                    latest_date_str = latest_data_row['日期'].strftime("%Y-%m-%d")
-                    self.row_ready.emit(code, names[code], latest_date_str, latest_data_row)
+                if self._emit_latest_row(rows, code, names, df):
                     cnt = cnt + 1
-                    progress = cnt * 100 / total
-                    self.progress_signal.emit(progress)
+                    progress(cnt * 100 / total)
         except RuntimeError as e:
             show_dialog(self._parent, '加载失败')
+        finally:
+            rows.close()
+            if update:
+                flush_stock_data()
+                # 日线追加后增量刷新已有的指标缓存，回测/监测时不必再算
+                refresh_indicator_caches(get_stock_data(backing="mmap"))
+
+    def start_task(self, title):
+        """data 队列的任务可能在排队，开始运行时才显示提示框并清空表格"""
+        self._parent.show_state_tooltip(title, '请稍后...')
+        self._parent.clear_stock_table()
+        self._parent.updateProgress.setValue(0)
 
     def load_local_stock(self):
         try:
             codes, names = get_all_stock_from_cache()
-            self._parent.show_state_tooltip('正在加载', '请稍后...')
-            self._parent.clear_stock_table()
-            self._parent.updateProgress.setValue(0)
             task_manager.submit_task(
                 self.load_show_stock_task, args=(codes, names, ),
                 kwargs={'update': False, 'update_day': ''},
                 on_success=self.load_stock_success,
-                on_error=lambda msg: self._parent.on_common_error(msg)
+                on_error=self.on_task_error,
+                on_progress=self.set_task_progress,
+                on_start=lambda: self.start_task('正在加载'),
+                queue='data'
             )
         except RuntimeError as e:
-            self._parent.close_state_tooltip()
             self._parent.on_common_error(str(e))
 
     def update_stock(self):
         try:
             # = pd.Timestamp(self._parent.update_day.date().toPyDate()).strftime("%Y%m%d")
             update_day = self._parent.update_day.date().toString("yyyyMMdd")
-            codes, names = get_all_stock()
-            self._parent.show_state_tooltip('正在更新', '请稍后...')
-            self._parent.clear_stock_table()
-            self._parent.updateProgress.setValue(0)
+            codes, names = get_all_stock_from_cache()
+            # 节假日或本地已是最新时不联网拉取股票列表
+            if not codes or stale_codes(codes, update_day):
+                codes, names = get_all_stock()
             task_manager.submit_task(
                 self.load_show_stock_task, args=(codes, names, ),
                 kwargs={'update': True, 'update_day': update_day},
                 on_success=self.update_stock_success,
-                on_error=lambda msg: self._parent.on_common_error(msg)
+                on_error=self.on_task_error,
+                on_progress=self.set_task_progress,
+                on_start=lambda: self.start_task('正在更新'),
+                queue='data'
             )
         except RuntimeError as e:
-            self._parent.close_state_tooltip()
             self._parent.on_common_error(str(e))
 
     def clear_stock(self):
@@ -89,6 +156,10 @@ class PageOneHandler(QObject):
         self._parent.clear_stock_table()
         self._parent.updateProgress.setValue(0)
 
+    def on_task_error(self, msg):
+        self._parent.close_state_tooltip()
+        self._parent.on_common_error(msg)
+
     def load_stock_success(self):
         self._parent.close_state_tooltip()
         show_dialog(self._parent, '加载成功')
@@ -100,31 +171,8 @@ class PageOneHandler(QObject):
     def set_progress(self, progress):
         self._parent.updateProgress.setValue(progress)
 
-    def add_row_to_table(self, code: str, name: str, date_str: str, row: pd.Series):
-        table = self._parent.stockUpdataTable
-        pos = table.rowCount()
-        table.insertRow(pos)
-
-        # 创建并设置每个单元格的内容和居中对齐
-        table.setItem(pos, 0, QTableWidgetItem(code))
-        table.item(pos, 0).setTextAlignment(Qt.AlignCenter)  # 股票代码居中
-
-        table.setItem(pos, 1, QTableWidgetItem(name))
-        table.item(pos, 1).setTextAlignment(Qt.AlignCenter)  # 股票名称居中
-
-        table.setItem(pos, 2, QTableWidgetItem(date_str))
-        table.item(pos, 2).setTextAlignment(Qt.AlignCenter)  # 日期居中
-
-        table.setItem(pos, 3, QTableWidgetItem(str(row['开盘'])))
-        table.item(pos, 3).setTextAlignment(Qt.AlignCenter)  # 开盘价居中
-
-        table.setItem(pos, 4, QTableWidgetItem(str(row['最高'])))
-        table.item(pos, 4).setTextAlignment(Qt.AlignCenter)  # 最高价居中
-
-        table.setItem(pos, 5, QTableWidgetItem(str(row['最低'])))
-        table.item(pos, 5).setTextAlignment(Qt.AlignCenter)  # 最低价居中
-
-        table.setItem(pos, 6, QTableWidgetItem(str(row['收盘'])))
-        table.item(pos, 6).setTextAlignment(Qt.AlignCenter)  # 收盘价居中
+    def set_task_progress(self, progress: int, eta: float):
+        show_task_progress(self._parent.updateProgress, progress, eta)
 
-        table.scrollToBottom()
+    def add_rows_to_table(self, rows: list):
+        self._parent.stockUpdataModel.append(pd.DataFrame(rows))
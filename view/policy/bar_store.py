@@ -0,0 +1,476 @@
+import os
+import re
+import json
+import zlib
+import shutil
+import threading
+import numpy as np
+import pandas as pd
+from typing import List, Dict, NamedTuple, Tuple
+
+# 列式日线仓库：所有股票的日线按代码顺序首尾相接，每列一个 .npy 文件，
+# meta.json 记录列文件所在的 base_<n> 目录和每只股票在列数组中的 (起始行, 行数)。
+# 压实时把新的列文件写到新目录，最后替换 meta.json 一次性切换，中途中断时仍读旧目录。
+# 加载全市场只需读取十几个列文件，而不是逐个打开 3000 多个 pkl。
+# manifest.json 记录每只股票的 (最后日期, 行数, 校验和)，判断哪些股票需要更新时只读这一个小文件。
+#
+# 日常增量更新走追加：新行写到每列一个的 <列>.delta 文件末尾，delta.json 记录各段属于哪只股票。
+# 读取时把基础列和追加段按日期合并，同一日期以后写入的为准；
+# 追加段累积到一定规模后整体压实回 .npy，清空追加段。
+
+META_FILE = "meta.json"
+BASE_DIR_PREFIX = "base_"
+MANIFEST_FILE = "manifest.json"
+DELTA_FILE = "delta.json"
+STORE_VERSION = 1
+MANIFEST_VERSION = 2
+COMPACT_RATIO = 0.1       # 追加行数超过基础行数的这个比例时压实
+COMPACT_CHUNKS = 30000    # 追加段数超过这个数时压实（delta.json 每次都整体重写）
+
+# (中文列名, 文件名, dtype)，顺序即 akshare stock_zh_a_hist 的列顺序（股票代码除外）
+BAR_COLUMNS: List[Tuple[str, str, str]] = [
+    ('日期', 'date', 'datetime64[ns]'),
+    ('开盘', 'open', 'float64'),
+    ('收盘', 'close', 'float64'),
+    ('最高', 'high', 'float64'),
+    ('最低', 'low', 'float64'),
+    ('成交量', 'volume', 'int64'),
+    ('成交额', 'amount', 'float64'),
+    ('振幅', 'amplitude', 'float64'),
+    ('涨跌幅', 'pct_chg', 'float64'),
+    ('涨跌额', 'chg', 'float64'),
+    ('换手率', 'turnover', 'float64'),
+]
+CODE_COLUMN = '股票代码'
+
+
+class ManifestEntry(NamedTuple):
+    last_date: np.datetime64  # 最后一根日线的日期
+    rows: int                 # 日线行数
+    checksum: int             # 逐行 (日期, 收盘价) 的 CRC32，末尾追加时可以接着算
+
+
+def _checksum(dates: np.ndarray, closes: np.ndarray, crc: int = 0) -> int:
+    rec = np.empty(len(dates), dtype=[('date', '<i8'), ('close', '<f8')])
+    rec['date'] = dates.astype('datetime64[ns]').view('int64')
+    rec['close'] = closes
+    return zlib.crc32(rec.tobytes(), crc)
+
+
+def _manifest_entry(dates: np.ndarray, closes: np.ndarray) -> ManifestEntry:
+    """由一只股票（按日期排序）的日期、收盘价列生成清单条目"""
+    if len(dates) == 0:
+        return ManifestEntry(np.datetime64('NaT', 'D'), 0, 0)
+    return ManifestEntry(dates[-1].astype('datetime64[D]'), int(len(dates)), _checksum(dates, closes))
+
+
+def _dedup_by_date(cols: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """按日期排序去重，同一日期保留最后出现的一行"""
+    dates = cols['date']
+    _, first = np.unique(dates[::-1], return_index=True)
+    keep = len(dates) - 1 - first
+    return {key: arr[keep] for key, arr in cols.items()}
+
+
+class BarStore:
+    """合并存储全市场日线的列式仓库"""
+
+    def __init__(self, root: str):
+        self.root = root
+        self._lock = threading.RLock()
+        self._columns: Dict[str, np.ndarray] = None
+        self._index: Dict[str, Tuple[int, int]] = {}
+        self._delta: Dict[str, np.ndarray] = {}
+        self._delta_chunks: Dict[str, List[Tuple[int, int]]] = {}
+        self._delta_rows = 0
+        self._pending: Dict[str, pd.DataFrame] = {}
+        self._appends: Dict[str, List[pd.DataFrame]] = {}
+        self._manifest: Dict[str, ManifestEntry] = None
+
+    def _path(self, file: str) -> str:
+        return os.path.join(self.root, file)
+
+    def exists(self) -> bool:
+        return os.path.exists(self._path(META_FILE))
+
+    def stamp(self) -> str:
+        """仓库内容的版本标记（基础列和追加段的修改时间），派生文件据此判断是否过期"""
+        delta = self._path(DELTA_FILE)
+        delta_mtime = os.path.getmtime(delta) if os.path.exists(delta) else 0
+        return f"{os.path.getmtime(self.meta_path())}:{delta_mtime}"
+
+    def _ensure_loaded(self):
+        """一次性读取全部列文件和追加段"""
+        if self._columns is not None:
+            return
+        self._columns = {}
+        self._index = {}
+        if not self.exists():
+            return
+        meta = self._read_meta()
+        for code, start, length in zip(meta['codes'], meta['starts'], meta['lengths']):
+            self._index[code] = (start, length)
+        # 早期版本的列文件直接放在仓库根目录，meta.json 里没有 dir
+        base = self._path(meta.get('dir', ''))
+        for _, key, _ in BAR_COLUMNS:
+            self._columns[key] = np.load(os.path.join(base, f"{key}.npy"), allow_pickle=False)
+        self._load_delta()
+
+    def _read_meta(self) -> dict:
+        with open(self._path(META_FILE), encoding='utf-8') as f:
+            return json.load(f)
+
+    def _load_delta(self):
+        self._delta, self._delta_chunks, self._delta_rows = {}, {}, 0
+        path = self._path(DELTA_FILE)
+        if not os.path.exists(path):
+            return
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+        rows = data['rows']
+        delta = {}
+        for _, key, dtype in BAR_COLUMNS:
+            file = self._path(f"{key}.delta")
+            arr = np.fromfile(file, dtype=dtype, count=rows) if os.path.exists(file) else np.empty(0, dtype=dtype)
+            if len(arr) < rows:
+                # 列文件比索引短只可能是文件被截断，丢弃追加段，缺的日线下次更新时会重新下载
+                print(f"日线追加段不完整（{key}），已忽略")
+                return
+            delta[key] = arr
+        for code, start, length in data['chunks']:
+            self._delta_chunks.setdefault(code, []).append((start, length))
+        self._delta, self._delta_rows = delta, rows
+
+    def manifest(self) -> Dict[str, ManifestEntry]:
+        """各股票已落盘日线的清单，只读 manifest.json；清单缺失或与仓库对不上时由列文件重建"""
+        with self._lock:
+            if self._manifest is None:
+                self._manifest = self._read_manifest()
+            if self._manifest is None:
+                self._ensure_loaded()
+                self._manifest = self._build_manifest()
+                if self.exists():
+                    self._write_manifest()
+            return self._manifest
+
+    def _read_manifest(self) -> Dict[str, ManifestEntry]:
+        path = self._path(MANIFEST_FILE)
+        if not self.exists() or not os.path.exists(path):
+            return None
+        try:
+            with open(path, encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"日线清单读取失败，将重建: {e}")
+            return None
+        # 清单与仓库不是同一次写出的（例如写到一半中断）时作废
+        if data.get('version') != MANIFEST_VERSION or data.get('stamp') != self.stamp():
+            return None
+        return {code: ManifestEntry(np.datetime64(last, 'D'), rows, crc)
+                for code, last, rows, crc in zip(data['codes'], data['last'], data['rows'], data['crc'])}
+
+    def _build_manifest(self) -> Dict[str, ManifestEntry]:
+        manifest = {}
+        for code in set(self._index) | set(self._delta_chunks):
+            cols = self._stored_columns(code)
+            manifest[code] = _manifest_entry(cols['date'], cols['close'])
+        return manifest
+
+    def _write_manifest(self):
+        codes = sorted(self._manifest)
+        data = {
+            'version': MANIFEST_VERSION,
+            'stamp': self.stamp(),
+            'codes': codes,
+            'last': [str(self._manifest[c].last_date) for c in codes],
+            'rows': [self._manifest[c].rows for c in codes],
+            'crc': [self._manifest[c].checksum for c in codes],
+        }
+        tmp = self._path(MANIFEST_FILE + ".tmp")
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        os.replace(tmp, self._path(MANIFEST_FILE))
+
+    def codes(self) -> List[str]:
+        with self._lock:
+            return sorted(set(self.manifest()) | set(self._pending) | set(self._appends))
+
+    def __contains__(self, code: str) -> bool:
+        with self._lock:
+            return code in self._pending or code in self._appends or code in self.manifest()
+
+    def _stored_columns(self, code: str, extra: List[Dict[str, np.ndarray]] = ()) -> Dict[str, np.ndarray]:
+        """已落盘的基础列 + 追加段（+ extra），按日期合并；没有数据时返回空列"""
+        parts = []
+        if code in self._index:
+            start, length = self._index[code]
+            parts.append({key: self._columns[key][start:start + length] for _, key, _ in BAR_COLUMNS})
+        for start, length in self._delta_chunks.get(code, ()):
+            parts.append({key: self._delta[key][start:start + length] for _, key, _ in BAR_COLUMNS})
+        parts.extend(extra)
+        if not parts:
+            return {key: np.empty(0, dtype=dtype) for _, key, dtype in BAR_COLUMNS}
+        if len(parts) == 1:
+            return parts[0]
+        return _dedup_by_date({key: np.concatenate([p[key] for p in parts]) for _, key, _ in BAR_COLUMNS})
+
+    def _columns_of(self, code: str) -> Dict[str, np.ndarray]:
+        """含尚未落盘数据的完整日线列"""
+        if code in self._pending:
+            return self._normalize(code, self._pending[code])
+        return self._stored_columns(code, [self._normalize(code, df) for df in self._appends.get(code, ())])
+
+    def _slice_frame(self, code: str, cols: Dict[str, np.ndarray]) -> pd.DataFrame:
+        data = {name: cols[key].copy() for name, key, _ in BAR_COLUMNS}
+        df = pd.DataFrame(data)
+        df.insert(1, CODE_COLUMN, code)
+        return df
+
+    def get(self, code: str) -> pd.DataFrame:
+        """读取单只股票日线，不存在时返回空 DataFrame"""
+        with self._lock:
+            self._ensure_loaded()
+            if code in self._pending:
+                return self._pending[code].copy()
+            if code not in self._index and code not in self._delta_chunks and code not in self._appends:
+                return pd.DataFrame()
+            return self._slice_frame(code, self._columns_of(code))
+
+    def load_all(self, codes: List[str] = None) -> Dict[str, pd.DataFrame]:
+        """批量还原多只股票的日线，codes 为空表示全部"""
+        with self._lock:
+            if codes is None:
+                codes = self.codes()
+            return {code: self.get(code) for code in codes if code in self}
+
+    def last_dates(self, codes: List[str]) -> np.ndarray:
+        """各股票最后一根日线的日期（含尚未落盘的），没有数据的为 NaT；不读取列文件"""
+        with self._lock:
+            manifest = self.manifest()
+            out = np.full(len(codes), np.datetime64('NaT'), dtype='datetime64[ns]')
+            for i, code in enumerate(codes):
+                if code in self._pending:
+                    df = self._pending[code]
+                    if not df.empty:
+                        out[i] = pd.to_datetime(df['日期']).max()
+                    continue
+                if code in manifest:
+                    out[i] = manifest[code].last_date
+                for df in self._appends.get(code, ()):
+                    if not df.empty:
+                        last = np.datetime64(pd.to_datetime(df['日期']).max(), 'ns')
+                        out[i] = last if np.isnat(out[i]) else max(out[i], last)
+            return out
+
+    def meta_path(self) -> str:
+        return self._path(META_FILE)
+
+    def snapshot(self) -> Tuple[Dict[str, np.ndarray], Dict[str, Tuple[int, int]]]:
+        """落盘待写数据后返回合并了追加段的 (列数组, 代码索引)，供派生文件使用"""
+        with self._lock:
+            self.flush()
+            self._ensure_loaded()
+            if not self._delta_chunks:
+                return dict(self._columns), dict(self._index)
+            columns, index, _ = self._merged()
+            return columns, index
+
+    def put(self, code: str, df: pd.DataFrame):
+        """登记一只股票的完整日线，flush() 时整体重写"""
+        with self._lock:
+            self._appends.pop(code, None)
+            self._pending[code] = df.copy()
+
+    def append(self, code: str, df: pd.DataFrame):
+        """登记一只股票新增的日线，flush() 时只追加这些行；与已有日期重复的以新行为准"""
+        if df is None or df.empty:
+            return
+        with self._lock:
+            if code in self._pending:
+                self._pending[code] = pd.concat([self._pending[code], df])
+            else:
+                self._appends.setdefault(code, []).append(df.copy())
+
+    def _normalize(self, code: str, df: pd.DataFrame) -> Dict[str, np.ndarray]:
+        df = df.sort_values('日期', kind='mergesort').drop_duplicates('日期', keep='last')
+        return self._to_columns(code, df)
+
+    def _normalize_appends(self) -> Dict[str, Dict[str, np.ndarray]]:
+        """把全部登记的追加行一次性整理成每只股票按日期排序去重的列"""
+        codes = list(self._appends)
+        frames = [df for code in codes for df in self._appends[code]]
+        counts = [sum(len(df) for df in self._appends[code]) for code in codes]
+        df = pd.concat(frames, ignore_index=True)
+        df['_ord'] = np.repeat(np.arange(len(codes)), counts)
+        df['日期'] = pd.to_datetime(df['日期'])
+        df = (df.sort_values(['_ord', '日期'], kind='mergesort')
+                .drop_duplicates(['_ord', '日期'], keep='last'))
+        cols = self._to_columns('', df)
+        bounds = np.searchsorted(df['_ord'].to_numpy(), np.arange(len(codes) + 1))
+        return {code: {key: arr[bounds[i]:bounds[i + 1]] for key, arr in cols.items()}
+                for i, code in enumerate(codes) if bounds[i + 1] > bounds[i]}
+
+    def _to_columns(self, code: str, df: pd.DataFrame) -> Dict[str, np.ndarray]:
+        out = {}
+        for name, key, dtype in BAR_COLUMNS:
+            if name in df.columns:
+                col = df[name]
+                if dtype == 'int64':
+                    col = col.fillna(0)
+                out[key] = col.to_numpy().astype(dtype)
+            elif dtype == 'datetime64[ns]':
+                raise ValueError(f"[{code}] 缺失列：日期")
+            else:
+                out[key] = np.full(len(df), 0 if dtype == 'int64' else np.nan, dtype=dtype)
+        return out
+
+    def flush(self, force: bool = False):
+        """
+        落盘登记的数据：只有追加时写到追加段末尾；有整体替换、追加段过大或 force 时压实重写列文件。
+        """
+        with self._lock:
+            if not self._pending and not self._appends and not force:
+                return
+            self._ensure_loaded()
+            if self._pending or force or not self.exists() or self._needs_compaction():
+                self.compact()
+            else:
+                self._flush_appends()
+
+    def _needs_compaction(self) -> bool:
+        rows = self._delta_rows + sum(len(df) for frames in self._appends.values() for df in frames)
+        chunks = sum(len(c) for c in self._delta_chunks.values()) + len(self._appends)
+        base = len(self._columns.get('date', ()))
+        return rows > COMPACT_RATIO * max(base, 1) or chunks > COMPACT_CHUNKS
+
+    def _flush_appends(self):
+        manifest = self.manifest()
+        new = self._normalize_appends()
+        if not new:
+            self._appends = {}
+            return
+
+        # 先把行写到各列追加段末尾（截掉上次中断可能留下的半截数据），再更新索引
+        offset = self._delta_rows
+        chunks = []
+        for code, cols in new.items():
+            chunks.append((code, offset, len(cols['date'])))
+            offset += len(cols['date'])
+        for _, key, dtype in BAR_COLUMNS:
+            arr = np.concatenate([cols[key] for cols in new.values()]).astype(dtype, copy=False)
+            with open(self._path(f"{key}.delta"), 'ab') as f:
+                f.truncate(self._delta_rows * arr.itemsize)
+                f.write(arr.tobytes())
+            old = self._delta.get(key, np.empty(0, dtype=dtype))
+            self._delta[key] = np.concatenate([old, arr])
+        for code, start, length in chunks:
+            self._delta_chunks.setdefault(code, []).append((start, length))
+        self._delta_rows = offset
+        all_chunks = [[code, s, n] for code, spans in self._delta_chunks.items() for s, n in spans]
+        tmp = self._path(DELTA_FILE + ".tmp")
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({'version': STORE_VERSION, 'rows': self._delta_rows, 'chunks': all_chunks}, f)
+        os.replace(tmp, self._path(DELTA_FILE))
+
+        # 清单：新行都在原最后日期之后时接着算校验和，否则按合并后的日线重算
+        for code, cols in new.items():
+            old = manifest.get(code)
+            if old is not None and old.rows and cols['date'][0].astype('datetime64[D]') > old.last_date:
+                manifest[code] = ManifestEntry(cols['date'][-1].astype('datetime64[D]'),
+                                               old.rows + len(cols['date']),
+                                               _checksum(cols['date'], cols['close'], old.checksum))
+            else:
+                merged = self._stored_columns(code)
+                manifest[code] = _manifest_entry(merged['date'], merged['close'])
+        self._appends = {}
+        self._write_manifest()
+
+    def _merged(self) -> Tuple[Dict[str, np.ndarray], Dict[str, Tuple[int, int]], Dict[str, ManifestEntry]]:
+        """基础列、追加段和登记数据合并后的 (列数组, 代码索引, 清单)"""
+        old_manifest = self._manifest or {}
+        manifest: Dict[str, ManifestEntry] = {}
+        parts: Dict[str, List[np.ndarray]] = {key: [] for _, key, _ in BAR_COLUMNS}
+        index = {}
+        offset = 0
+        for code in sorted(set(self._index) | set(self._delta_chunks) | set(self._pending) | set(self._appends)):
+            cols = self._columns_of(code)
+            if code in self._pending or code in self._appends or code not in old_manifest:
+                manifest[code] = _manifest_entry(cols['date'], cols['close'])
+            else:
+                manifest[code] = old_manifest[code]
+            length = len(cols['date'])
+            for key, arr in cols.items():
+                parts[key].append(arr)
+            index[code] = (offset, length)
+            offset += length
+        columns = {}
+        for _, key, dtype in BAR_COLUMNS:
+            arr = np.concatenate(parts[key]) if parts[key] else np.empty(0, dtype=dtype)
+            columns[key] = arr.astype(dtype, copy=False)
+        return columns, index, manifest
+
+    def compact(self):
+        """把追加段和登记的数据并入基础列，整体重写列文件并清空追加段"""
+        with self._lock:
+            self._ensure_loaded()
+            columns, index, manifest = self._merged()
+
+            # 新的列文件写到新目录，旧目录和 meta.json 保持不动
+            gen = self._read_meta().get('gen', -1) + 1 if self.exists() else 0
+            sub_dir = f"{BASE_DIR_PREFIX}{gen}"
+            data_dir = self._path(sub_dir)
+            shutil.rmtree(data_dir, ignore_errors=True)  # 上次压实中断留下的半成品
+            os.makedirs(data_dir)
+            for _, key, _ in BAR_COLUMNS:
+                np.save(os.path.join(data_dir, f"{key}.npy"), columns[key], allow_pickle=False)
+
+            # 替换 meta.json 是唯一的切换点：之前中断读到的是旧目录和旧索引，之后中断读到的是新的
+            codes = list(index)
+            meta = {'version': STORE_VERSION, 'gen': gen, 'dir': sub_dir, 'codes': codes,
+                    'starts': [index[c][0] for c in codes], 'lengths': [index[c][1] for c in codes]}
+            tmp = self._path(META_FILE + ".tmp")
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(meta, f)
+            os.replace(tmp, self._path(META_FILE))
+            # 切换后、清空追加段前中断也不会错：追加段已并入新目录，再按日期去重合并一次结果相同。
+            # 先删 delta.json，之后列追加段即使没删完也不会再被读取
+            for file in [DELTA_FILE] + [f"{key}.delta" for _, key, _ in BAR_COLUMNS]:
+                if os.path.exists(self._path(file)):
+                    os.remove(self._path(file))
+            self._remove_old_bases(sub_dir)
+
+            self._columns = columns
+            self._index = index
+            self._delta, self._delta_chunks, self._delta_rows = {}, {}, 0
+            self._pending = {}
+            self._appends = {}
+            self._manifest = manifest
+            self._write_manifest()
+
+    def _remove_old_bases(self, current: str):
+        """清理切换前的列文件目录（以及早期版本放在根目录的列文件）"""
+        for name in os.listdir(self.root):
+            if name.startswith(BASE_DIR_PREFIX) and name != current:
+                shutil.rmtree(self._path(name), ignore_errors=True)
+        for _, key, _ in BAR_COLUMNS:
+            if os.path.exists(self._path(f"{key}.npy")):
+                os.remove(self._path(f"{key}.npy"))
+
+    def migrate_from_pickles(self, pkl_dir: str) -> int:
+        """一次性把旧的 <code>.pkl 文件导入仓库，返回导入的股票数"""
+        pattern = re.compile(r"\d{6}")
+        cnt = 0
+        with self._lock:
+            for file in sorted(os.listdir(pkl_dir)):
+                stem, ext = os.path.splitext(file)
+                if ext != '.pkl' or not pattern.fullmatch(stem):
+                    continue
+                df = pd.read_pickle(os.path.join(pkl_dir, file))
+                if df.empty or '日期' not in df.columns:
+                    continue
+                df['日期'] = pd.to_datetime(df['日期'])
+                self.put(stem, df)
+                cnt += 1
+            # 没有旧数据也写出一个空仓库，避免每次启动都重新扫描
+            self.flush(force=True)
+        return cnt
@@ -1,16 +1,80 @@
 
+import numpy as np
 import pandas as pd
 import datetime
 
-from typing import List, Dict, Tuple
-from view.policy.stock import get_cache_dir, get_sh_series, stock_name, update_sh, get_current_stock_info
+from typing import List, Dict, Sequence, Tuple
+from view.policy.exit_rules import ExitRule, HoldingBars, first_exit, BOLL_TIMEOUT_EXITS
+from view.policy.stock import get_cache_dir, get_sh_index, stock_name, get_spot_index, spot_index_of
+from view.policy.spot_index import SpotIndex
+from view.policy.indicators import sma, rolling_std
+
+def get_sh(dt) -> float:
+    """dt 当天（非交易日取之前最近一个交易日）的上证指数收盘价"""
+    return get_sh_index(dt).asof(dt)
+
+# 各周期在日线上的最大跨度，用于在日线中回找卖出日
+PERIOD_DELTAS = {
+    0: pd.Timedelta(days=5),    # 三日线
+    1: pd.Timedelta(days=7),    # 周线
+    2: pd.Timedelta(days=31),   # 月线
+}
+
+def period_key(df: pd.DataFrame, policySelect: int) -> pd.Series:
+    """日线所属周期的分组键（df 需已按日期排序且索引从 0 开始）"""
+    if policySelect == 0:
+        return pd.Series(df.index // 3, index=df.index)
+    elif policySelect == 1:
+        return pd.to_datetime(df['日期']).dt.to_period('W').dt.start_time
+    else:
+        return pd.to_datetime(df['日期']).dt.to_period('M').dt.start_time
+
+def mark_breaks(policy_df: pd.DataFrame):
+    """由 MA20/STD 计算上下轨并标记突破/跌破"""
+    policy_df['Upper'] = policy_df['MA20'] + 2 * policy_df['STD']
+    policy_df['Lower'] = policy_df['MA20'] - 2 * policy_df['STD']
+    policy_df['Break_Upper'] = policy_df['最高'] >= policy_df['Upper']
+    policy_df['Break_Lower'] = policy_df['最低'] <= policy_df['Lower']
+
+def build_policy_df(df: pd.DataFrame, policySelect: int, window: int = 20) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """把日线合成 3日/周/月 线并计算布林带，返回 (排序后的日线, 周期线)"""
+    df = df.sort_values('日期').reset_index(drop=True)
+    df['trade_no'] = period_key(df, policySelect)
+
+    policy_df = (
+        df.groupby(df['trade_no'])
+          .agg(日期=('日期', 'last'),
+               开盘=('开盘', 'first'),
+               收盘=('收盘', 'last'),
+               最高=('最高', 'max'),
+               最低=('最低', 'min'))
+          .reset_index(drop=True)
+    )
+
+    # 布林线
+    policy_df['MA20']  = sma(policy_df['收盘'], window)
+    policy_df['STD']   = rolling_std(policy_df['收盘'], window)
+    mark_breaks(policy_df)
+    return df, policy_df
+
+def get_market_filter(code: str,
+                      spot: SpotIndex,
+                      marketValMin: int,
+                      marketValMax: int,
+                      peRatioMin: int,
+                      peRatioMax: int) -> Tuple[float, float]:
+    """按实时快照过滤市值/市盈率，通过返回 (市值(亿), 市盈率)，否则返回 None"""
+    info = spot.get(code)
+    if info is None:
+        return None
+    marketVal = info.market_val
+    if marketVal < marketValMin or marketVal > marketValMax:
+        return None
+    peRatio = info.pe
+    if peRatio < peRatioMin or peRatio > peRatioMax:
+        return None
+    return marketVal, peRatio
 
-def get_sh(dt) -> int:
-    val = get_sh_series().get(dt)
-    if val is None:
-        update_sh()
-    val = get_sh_series().get(dt)
-    return val
 #推荐值:
 #3250 - 3450:3日线
 #3450以上:周线
@@ -30,43 +94,115 @@ def boll_reverse_backtest(code: str,
                           peRatioMin: int = 20,
                           peRatioMax: int = 80,
                           window: int = 20) -> pd.DataFrame:
-    if period_e is None:
-        period_e = datetime.date.today().strftime("%Y-%m-%d")
-
     if df.empty:
-        return pd.DataFrame(), None
-    df = df.sort_values('日期').reset_index(drop=True)
-
-    # 2) 合成 3 日线
-    if policySelect == 0:
-        df['trade_no'] = df.index // 3
-        period_delta = pd.Timedelta(days=5)
-    elif policySelect == 1:
-        df['trade_no'] = pd.to_datetime(df['日期']).dt.to_period('W').dt.start_time
-        period_delta = pd.Timedelta(days=7)
-    elif policySelect == 2:
-        df['trade_no'] = pd.to_datetime(df['日期']).dt.to_period('M').dt.start_time
-        period_delta = pd.Timedelta(days=31)
-
-    policy_df = (
-        df.groupby(df['trade_no'])
-          .agg(日期=('日期', 'last'),
-               开盘=('开盘', 'first'),
-               收盘=('收盘', 'last'),
-               最高=('最高', 'max'),
-               最低=('最低', 'min'))
-          .reset_index(drop=True)
-    )
+        return pd.DataFrame()
 
-    # 3) 布林线
-    policy_df['MA20']  = policy_df['收盘'].rolling(window).mean()
-    policy_df['STD']   = policy_df['收盘'].rolling(window).std()
-    policy_df['Upper'] = policy_df['MA20'] + 2 * policy_df['STD']
-    policy_df['Lower'] = policy_df['MA20'] - 2 * policy_df['STD']
+    # 2) 合成 3 日线 / 周线 / 月线，3) 布林线，4) 标记突破/跌破
+    df, policy_df = build_policy_df(df, policySelect, window)
 
-    # 4) 标记突破/跌破
-    policy_df['Break_Upper'] = policy_df['最高'] >= policy_df['Upper']
-    policy_df['Break_Lower'] = policy_df['最低'] <= policy_df['Lower']
+    filtered = get_market_filter(code, get_spot_index(),
+                                 marketValMin, marketValMax, peRatioMin, peRatioMax)
+    if filtered is None:
+        return pd.DataFrame()
+    marketVal, peRatio = filtered
+
+    trades = extract_reverse_trades(code, df, policy_df, policySelect, sellPos, upperBreak,
+                                    period_s, period_e, sh_min, sh_max, marketVal, peRatio)
+    return pd.DataFrame(trades)
+
+def first_true(mask: np.ndarray) -> int:
+    """布尔数组中第一个 True 的位置，没有则返回 -1"""
+    if len(mask) == 0:
+        return -1
+    i = int(mask.argmax())
+    return i if mask[i] else -1
+
+def last_true(mask: np.ndarray) -> int:
+    """布尔数组中最后一个 True 的位置，没有则返回 -1"""
+    hits = np.flatnonzero(mask)
+    return int(hits[-1]) if len(hits) else -1
+
+def next_true_index(mask: np.ndarray) -> np.ndarray:
+    """next[i] 为 i 及之后第一个 True 的位置，没有则为 len(mask)；多出的 next[len(mask)] 同样为 len(mask)"""
+    n = len(mask)
+    idx = np.where(mask, np.arange(n), n)
+    nxt = np.minimum.accumulate(idx[::-1])[::-1]
+    return np.append(nxt, n)
+
+class TradeMatcher:
+    """把日线和周期线转成 NumPy 数组，撮合时用二分查找定位日期区间"""
+
+    def __init__(self, df: pd.DataFrame, sub: pd.DataFrame, sellPos: int):
+        self.days = df['日期'].to_numpy()
+        self.day_low = df['最低'].to_numpy()
+        self.day_high = df['最高'].to_numpy()
+        self.day_close = df['收盘'].to_numpy()
+        self.dates = sub['日期'].to_numpy()
+        self.lower = sub['Lower'].to_numpy()
+        # 卖出参考线：0 中轨，1 上轨
+        self.sell_line = (sub['MA20'] if sellPos == 0 else sub['Upper']).to_numpy()
+        self.next_sell = next_true_index(sub['最高'].to_numpy() >= self.sell_line)
+
+    def day(self, i: int) -> pd.Timestamp:
+        return pd.Timestamp(self.days[i])
+
+    def day_span(self, start, end) -> Tuple[int, int]:
+        """日期在 [start, end] 内的日线行范围"""
+        return (int(np.searchsorted(self.days, np.datetime64(start), side='left')),
+                int(np.searchsorted(self.days, np.datetime64(end), side='right')))
+
+    def sell_day_span(self, buy_date, sell_date, period_delta) -> Tuple[int, int]:
+        """买入日之后、且落在卖出周期 [sell_date - period_delta, sell_date] 内的日线行范围"""
+        sell_date = pd.Timestamp(sell_date)
+        a = max(int(np.searchsorted(self.days, np.datetime64(buy_date), side='right')),
+                int(np.searchsorted(self.days, np.datetime64(sell_date - period_delta), side='left')))
+        b = int(np.searchsorted(self.days, np.datetime64(sell_date), side='right'))
+        return a, max(a, b)
+
+def trade_record(code: str,
+                 buy_price: float,
+                 sell_price: float,
+                 buy_date,
+                 sell_date,
+                 sh: float,
+                 marketVal: float,
+                 peRatio: float) -> dict:
+    """一笔交易记录，价格/市值/市盈率保留两位小数，收益率按保留后的价格计算"""
+    buy_price = round(buy_price, 2)
+    sell_price = round(sell_price, 2)
+    buy_date = pd.Timestamp(buy_date)
+    sell_date = pd.Timestamp(sell_date)
+    return {
+        '代码': code,
+        '名称': stock_name(code),
+        '买入价': buy_price,
+        '卖出价': sell_price,
+        '买入日期': buy_date.strftime("%Y-%m-%d"),
+        '卖出日期': sell_date.strftime("%Y-%m-%d"),
+        '收益率': (sell_price - buy_price) / buy_price,
+        '持有天数': (sell_date - buy_date).days,
+        '上证指数': sh,
+        '市值': round(marketVal, 2),
+        '市盈率': round(peRatio, 2)
+    }
+
+def extract_reverse_trades(code: str,
+                           df: pd.DataFrame,
+                           policy_df: pd.DataFrame,
+                           policySelect: int,
+                           sellPos: int,
+                           upperBreak: bool,
+                           period_s: str,
+                           period_e: str,
+                           sh_min: int,
+                           sh_max: int,
+                           marketVal: float,
+                           peRatio: float,
+                           exit_rules: Sequence[ExitRule] = BOLL_TIMEOUT_EXITS) -> List[dict]:
+    """在已算好布林带的周期线上逐笔撮合买卖，返回交易记录列表"""
+    if period_e is None:
+        period_e = datetime.date.today().strftime("%Y-%m-%d")
+    period_delta = PERIOD_DELTAS[policySelect]
 
     # 5) 时间过滤
     period_s = pd.to_datetime(period_s)
@@ -76,173 +212,107 @@ def boll_reverse_backtest(code: str,
         (policy_df['日期'] <= period_e)
     ].reset_index(drop=True)
 
-    upper_dates = sub.loc[sub['Break_Upper'], '日期'].tolist()
-    lower_dates = sub.loc[sub['Break_Lower'], '日期'].tolist()
     sh = 0
     trades = []
-    curr_stock_info = get_current_stock_info()
-    stock_info = curr_stock_info[curr_stock_info['代码'] == code]
-    marketVal = stock_info['总市值'].values[0] / 100000000
-    if marketVal < marketValMin or marketVal > marketValMax:
-        return pd.DataFrame(trades)
-    peRatio = stock_info['市盈率-动态'].values[0]
-    if peRatio < peRatioMin or peRatio > peRatioMax:
-        return pd.DataFrame(trades)
+    m = TradeMatcher(df, sub, sellPos)
+    # 每根日线当天的上证指数，一次查完；候选买入日直接按日线行号取
+    sh_at = get_sh_index(m.days[-1] if len(m.days) else None).asof_many(m.days)
 
     if upperBreak:
-        for up_date in reversed(upper_dates):
-            lows_after = [d for d in lower_dates if d > up_date]
-            if not lows_after:
+        up_pos = np.flatnonzero(sub['Break_Upper'].to_numpy())
+        low_pos = np.flatnonzero(sub['Break_Lower'].to_numpy())
+        for k in range(len(up_pos) - 1, -1, -1):
+            up = up_pos[k]
+            # 突破上轨之后的第一次跌破下轨
+            j = np.searchsorted(low_pos, up, side='right')
+            if j == len(low_pos):
                 continue
-            low_date = min(lows_after)
+            low = low_pos[j]
 
-            # 区间干净检查
-            mids = sub[(sub['日期'] > up_date) & (sub['日期'] < low_date)]
-            if mids['Break_Upper'].any() or mids['Break_Lower'].any():
+            # 区间干净检查：low 已是其后第一次跌破，只需看两者之间有没有再次突破上轨
+            if k + 1 < len(up_pos) and up_pos[k + 1] < low:
                 continue
 
             # 在原始日线数据中找到该周期内首次达到买入价的具体日期
-            buy_day_candidates = df[(df['日期'] >= up_date) & (df['日期'] <= low_date)]
-            buy_price = policy_df[policy_df['日期'] == low_date]['Lower'].values[0]
-            buy_day_candidates = buy_day_candidates[buy_day_candidates['最低'] <= buy_price]
-            if buy_day_candidates.empty:
+            buy_price = m.lower[low]
+            a, b = m.day_span(m.dates[up], m.dates[low])
+            buy_i = first_true(m.day_low[a:b] <= buy_price)
+            if buy_i < 0:
                 continue
-            buy_bar = buy_day_candidates.iloc[0]
+            buy_date = m.day(a + buy_i)
 
             # 检查上证指数是否在指定范围内
-            sh = get_sh(buy_bar['日期'])
-            if sh < sh_min or sh > sh_max:
-                continue  # 上证不在区间，跳过
+            sh = sh_at[a + buy_i]
+            if not sh_min <= sh <= sh_max:
+                continue  # 上证不在区间（或没有数据），跳过
 
             # 卖出日
-            sell_candidates = sub[sub['日期'] > low_date]
-            if sellPos == 0:
-                cond = sell_candidates['最高'] >= sell_candidates['MA20']
-            else:
-                cond = sell_candidates['最高'] >= sell_candidates['Upper']
-            if not cond.any():
+            sell = m.next_sell[low + 1]
+            if sell >= len(m.dates):
                 continue
-            sell_policy_bar = sell_candidates[cond].iloc[0]
+            sell_price = m.sell_line[sell]
 
             # 在原始日线数据中找到该周期内首次达到卖出价的具体日期
-            sell_date = sell_policy_bar['日期']
-            sell_day_candidates = df[(df['日期'] > buy_bar['日期']) & (df['日期'] >= (sell_date - period_delta)) & (df['日期'] <= sell_date)]
-            if sellPos == 0:
-                sell_price = sell_policy_bar['MA20']
-            else:
-                sell_price = sell_policy_bar['Upper']
-            sell_day_candidates = sell_day_candidates[sell_day_candidates['最高'] >= sell_price]
-            if sell_day_candidates.empty:
+            a, b = m.sell_day_span(buy_date, m.dates[sell], period_delta)
+            sell_i = first_true(m.day_high[a:b] >= sell_price)
+            if sell_i < 0:
                 continue
-            sell_bar = sell_day_candidates.iloc[0]
-
-            # 保留两位小数
-            buy_price = round(buy_price, 2)
-            sell_price = round(sell_price, 2)
-            marketVal = round(marketVal, 2)
-            peRatio = round(peRatio, 2)
-
-            name = stock_name(code)
-            trades.append({
-                '代码': code,
-                '名称': name,
-                '买入价': buy_price,
-                '卖出价': sell_price,
-                '买入日期': buy_bar['日期'].strftime("%Y-%m-%d"),
-                '卖出日期': sell_bar['日期'].strftime("%Y-%m-%d"),
-                '收益率': (sell_price - buy_price) / buy_price,
-                '持有天数': (sell_bar['日期'] - buy_bar['日期']).days,
-                '上证指数': sh,
-                '市值': marketVal,
-                '市盈率': peRatio
-            })
+            sell_day = m.day(a + sell_i)
+
+            trades.append(trade_record(code, buy_price, sell_price, buy_date, sell_day, sh, marketVal, peRatio))
     else:
+        low_pos = np.flatnonzero(sub['Break_Lower'].to_numpy())
         # 标记是否已经发生过买入操作
         has_bought = False
-        for low_date in lower_dates:
+        for low in low_pos:
             if has_bought:
                 break  # 如果已经买入，不再处理后续的突破
 
-            # 在原始日线数据中找到该周期内首次达到买入价的具体日期
-            buy_day_candidates = df[(df['日期'] <= low_date)]
-            buy_price = policy_df[policy_df['日期'] == low_date]['Lower'].values[0]
-            buy_day_candidates = buy_day_candidates[buy_day_candidates['最低'] <= buy_price]
-            if buy_day_candidates.empty:
+            # 在原始日线数据中找到该周期内（含之前）最后一次达到买入价的具体日期
+            buy_price = m.lower[low]
+            b = int(np.searchsorted(m.days, m.dates[low], side='right'))
+            buy_i = last_true(m.day_low[:b] <= buy_price)
+            if buy_i < 0:
                 continue
-            buy_bar = buy_day_candidates.iloc[-1]
+            buy_date = m.day(buy_i)
 
             # 检查上证指数是否在指定范围内
-            sh = get_sh(buy_bar['日期'])
-            if sh < sh_min or sh > sh_max:
-                continue  # 上证不在区间，跳过
+            sh = sh_at[buy_i]
+            if not sh_min <= sh <= sh_max:
+                continue  # 上证不在区间（或没有数据），跳过
 
             # 卖出日
-            sell_candidates = sub[sub['日期'] > low_date]
-            if sellPos == 0:
-                cond = sell_candidates['最高'] >= sell_candidates['MA20']
-            else:
-                cond = sell_candidates['最高'] >= sell_candidates['Upper']
-            if not cond.any():
+            sell = m.next_sell[low + 1]
+            if sell >= len(m.dates):
                 continue
-            sell_policy_bar = sell_candidates[cond].iloc[0]
+            sell_price = m.sell_line[sell]
 
             # 在原始日线数据中找到该周期内首次达到卖出价的具体日期
-            sell_date = sell_policy_bar['日期']
-            sell_day_candidates = df[(df['日期'] > buy_bar['日期']) & (df['日期'] >= (sell_date - period_delta)) & (df['日期'] <= sell_date)]
-            if sellPos == 0:
-                sell_price = sell_policy_bar['MA20']
-            else:
-                sell_price = sell_policy_bar['Upper']
-            sell_day_candidates = sell_day_candidates[sell_day_candidates['最高'] >= sell_price]
-            if sell_day_candidates.empty:
+            a, b = m.sell_day_span(buy_date, m.dates[sell], period_delta)
+            sell_i = first_true(m.day_high[a:b] >= sell_price)
+            if sell_i < 0:
                 continue
-            sell_bar = sell_day_candidates.iloc[0]
-
-
-            # 逐天遍历，检查是否跌破买入价的90%
-            sell_candidates = df[(df['日期'] > buy_bar['日期']) & (df['日期'] <= sell_bar['日期'])]
-            threshold_price = buy_price * 0.9  # 买入价的90%
-            for _, row in sell_candidates.iterrows():
-                if row['最低'] <= threshold_price and (row['日期'] - buy_bar['日期']).days > 80:
-                    # 如果某一天的最低价跌破了买入价的90%，则在这一天卖出
-                    sell_date = row['日期']
-                    sell_price = threshold_price
-                    break
-                if row['收盘'] > buy_price and (row['日期'] - buy_bar['日期']).days > 80:
-                    sell_date = row['日期']
-                    sell_price = row['收盘']
-                    break
-
-            # 保留两位小数
-            buy_price = round(buy_price, 2)
-            sell_price = round(sell_price, 2)
-            marketVal = round(marketVal, 2)
-            peRatio = round(peRatio, 2)
-
-            name = stock_name(code)
-            trades.append({
-                '代码': code,
-                '名称': name,
-                '买入价': buy_price,
-                '卖出价': sell_price,
-                '买入日期': buy_bar['日期'].strftime("%Y-%m-%d"),
-                '卖出日期': sell_bar['日期'].strftime("%Y-%m-%d"),
-                '收益率': (sell_price - buy_price) / buy_price,
-                '持有天数': (sell_bar['日期'] - buy_bar['日期']).days,
-                '上证指数': sh,
-                '市值': marketVal,
-                '市盈率': peRatio
-            })
+            sell_i += a
+            sell_day = m.day(sell_i)
+
+            # 持仓期内按离场规则提前卖出（卖出日期仍记为上面的卖出日）
+            hold = slice(buy_i + 1, sell_i + 1)
+            bars = HoldingBars(m.days[hold], m.day_low[hold], m.day_high[hold], m.day_close[hold],
+                               buy_price, buy_date)
+            exit_i, exit_price = first_exit(exit_rules, bars)
+            if exit_i >= 0:
+                sell_price = exit_price
+
+            trades.append(trade_record(code, buy_price, sell_price, buy_date, sell_day, sh, marketVal, peRatio))
 
             # 标记已经发生过买入操作
             has_bought = True
-    df_trades = pd.DataFrame(trades)
-    return df_trades
+    return trades
 
 def boll_find(
     code: str,
     df: pd.DataFrame,
-    curr_all_stock: pd.DataFrame,
+    curr_all_stock,
     policySelect: int,
     upperBreak: bool,
     marketValMin: int = 50,
@@ -250,48 +320,26 @@ def boll_find(
     peRatioMin: int = 20,
     peRatioMax: int = 80,
     window: int = 20,
+    policy_df: pd.DataFrame = None,
 ) -> pd.DataFrame:
-    """扫描：最近一次“突破上轨后又跌破下轨”是否已完成"""
+    """扫描：最近一次“突破上轨后又跌破下轨”是否已完成，policy_df 为指标缓存中已算好的周期线"""
     # 1. 基础过滤
-    info = curr_all_stock[curr_all_stock['代码'] == code]
-    if info.empty:
+    spot = curr_all_stock if isinstance(curr_all_stock, SpotIndex) else spot_index_of(curr_all_stock)
+    info = spot.get(code)
+    if info is None:
         return pd.DataFrame()
-    marketVal = info['总市值'].values[0] / 1e8
-    peRatio = info['市盈率-动态'].values[0]
+    marketVal = info.market_val
+    peRatio = info.pe
     if not (marketValMin <= marketVal <= marketValMax and peRatioMin <= peRatio <= peRatioMax):
         return pd.DataFrame()
 
     # 2. 数据检查
     if df.empty or len(df) < window + 5:
         return pd.DataFrame()
-    df = df.sort_values('日期').reset_index(drop=True)
 
-    # 3. 合成周期
-    if policySelect == 0:
-        df['trade_no'] = df.index // 3
-    elif policySelect == 1:
-        df['trade_no'] = pd.to_datetime(df['日期']).dt.to_period('W').dt.start_time
-    else:
-        df['trade_no'] = pd.to_datetime(df['日期']).dt.to_period('M').dt.start_time
-
-    policy_df = (
-        df.groupby(df['trade_no'])
-          .agg(日期=('日期', 'last'),
-               开盘=('开盘', 'first'),
-               收盘=('收盘', 'last'),
-               最高=('最高', 'max'),
-               最低=('最低', 'min'))
-          .reset_index(drop=True)
-    )
-
-    # 3) 布林线
-    policy_df['MA20']  = policy_df['收盘'].rolling(window).mean()
-    policy_df['STD']   = policy_df['收盘'].rolling(window).std()
-    policy_df['Upper'] = policy_df['MA20'] + 2 * policy_df['STD']
-    policy_df['Lower'] = policy_df['MA20'] - 2 * policy_df['STD']
-
-    policy_df['Break_Upper'] = policy_df['最高'] >= policy_df['Upper']
-    policy_df['Break_Lower'] = policy_df['最低'] <= policy_df['Lower']
+    # 3. 合成周期并计算布林线（缓存中已有则直接使用）
+    if policy_df is None:
+        df, policy_df = build_policy_df(df, policySelect, window)
 
     # 5. 只看今天之前已完结的周期
     hist = policy_df.iloc[:-1]
@@ -306,7 +354,7 @@ def boll_find(
     if last_break_upper_date is None:
         return pd.DataFrame()
 
-    curr_price = info['最新价'].values[0]
+    curr_price = info.price
     lower_now = policy_df['Lower'].iloc[-1]
     if lower_now is None:
         print('lower_now is none')
@@ -332,9 +380,9 @@ def boll_find(
         above_ma20   = seg['最高'] >= seg['MA20']
 
         # 向下穿越标志
-        down_cross = broken_lower & ~broken_lower.shift(1).fillna(False)
+        down_cross = broken_lower & ~broken_lower.shift(1, fill_value=False)
         # 向上穿越标志
-        up_cross   = above_ma20 & ~above_ma20.shift(1).fillna(False)
+        up_cross   = above_ma20 & ~above_ma20.shift(1, fill_value=False)
 
         # 找最近一次 down_cross 之后有没有 up_cross
         down_idx = seg.index[down_cross]
@@ -0,0 +1,70 @@
+import numpy as np
+import pandas as pd
+from collections.abc import Mapping
+from typing import Callable, List
+from view.policy.stock import get_spot_index
+from view.policy.boll_break import get_market_filter, extract_reverse_trades
+from view.policy.indicator_cache import stack_bars, get_indicator_cache
+
+# 全市场面板版布林回测：所有股票拼成一张 (代码 × 日期) 长表，按股票切片撮合交易。
+# 周期线长表取自指标缓存（IndicatorCache.panel），只有日线有更新的股票才重新计算。
+
+
+def split_panel(panel: pd.DataFrame, count: int) -> np.ndarray:
+    """长表中第 i 只股票的行范围为 [bounds[i], bounds[i + 1])"""
+    return np.searchsorted(panel['_ord'].to_numpy(), np.arange(count + 1), side='left')
+
+
+def boll_reverse_backtest_panel(stock_data: Mapping,
+                                policySelect: int,
+                                sellPos: int,
+                                upperBreak: bool,
+                                period_s: str = "2023-01-16",
+                                period_e: str = None,
+                                sh_min: int = 3100,
+                                sh_max: int = 3600,
+                                marketValMin: int = 50,
+                                marketValMax: int = 20000,
+                                peRatioMin: int = 20,
+                                peRatioMax: int = 80,
+                                window: int = 20,
+                                codes: List[str] = None,
+                                on_trades: Callable[[pd.DataFrame], None] = None,
+                                on_progress: Callable[[int], None] = None,
+                                is_cancelled: Callable[[], bool] = None) -> pd.DataFrame:
+    """与逐只调用 boll_reverse_backtest 结果相同的全市场批量回测"""
+    if codes is None:
+        codes = list(stock_data)
+
+    # 市值/市盈率不合格的股票在读取日线之前就剔除
+    spot = get_spot_index()
+    kept = spot.filter_codes(codes, marketValMin, marketValMax, peRatioMin, peRatioMax)
+    infos = [get_market_filter(code, spot, marketValMin, marketValMax, peRatioMin, peRatioMax) for code in kept]
+
+    daily = stack_bars(stock_data, kept)
+    policy = get_indicator_cache(policySelect, window).panel(stock_data, kept)
+    day_bounds = split_panel(daily, len(kept))
+    policy_bounds = split_panel(policy, len(kept))
+
+    all_trades = []
+    total = len(kept)
+    for i, code in enumerate(kept):
+        if is_cancelled is not None and is_cancelled():
+            break
+        df = daily.iloc[day_bounds[i]:day_bounds[i + 1]].drop(columns='_ord').reset_index(drop=True)
+        if not df.empty:
+            policy_df = policy.iloc[policy_bounds[i]:policy_bounds[i + 1]].drop(columns='_ord').reset_index(drop=True)
+            marketVal, peRatio = infos[i]
+            trades = extract_reverse_trades(code, df, policy_df, policySelect, sellPos, upperBreak,
+                                            period_s, period_e, sh_min, sh_max, marketVal, peRatio)
+            if trades:
+                df_trades = pd.DataFrame(trades)
+                all_trades.append(df_trades)
+                if on_trades is not None:
+                    on_trades(df_trades)
+        if on_progress is not None:
+            on_progress(int((i + 1) * 100 / total))
+
+    if not all_trades:
+        return pd.DataFrame()
+    return pd.concat(all_trades, ignore_index=True)
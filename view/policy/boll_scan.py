@@ -0,0 +1,200 @@
+import datetime
+import threading
+import numpy as np
+import pandas as pd
+from collections.abc import Mapping
+from typing import Dict, List, NamedTuple, Tuple
+from view.policy.stock import stock_name, BOLL_WINDOW
+from view.policy.spot_index import SpotIndex
+from view.policy.indicator_cache import get_indicator_cache
+
+# 增量监测：boll_find 里除「最新价 ≤ 当前下轨」以外的判断只依赖已收盘的周期线，
+# 因此对全市场一次性算出每只股票的 (当前下轨, 形态是否成立)，之后每次监测
+# 只用实时快照做市值/市盈率/价格的向量化比较。周期线有更新时状态自动重建。
+# 盯盘（BollWatch）再进一步：与上一次快照对比，只重新判断数值有变化的股票。
+
+
+class BollScanState(NamedTuple):
+    codes: np.ndarray   # 股票代码
+    lower: np.ndarray   # 最后一个周期的下轨
+    armed: np.ndarray   # 形态成立：日线足够、曾突破上轨；要求突破时还需跌破下轨后尚未回到中轨
+    generation: int     # 生成时指标缓存的版本
+
+
+def _group_max(ords: np.ndarray, values: np.ndarray, mask: np.ndarray, count: int) -> np.ndarray:
+    """每组中 mask 为 True 的行的最大 values，没有则为 -1"""
+    out = np.full(count, -1, dtype=np.int64)
+    np.maximum.at(out, ords[mask], values[mask])
+    return out
+
+
+def build_scan_state(stock_data: Mapping,
+                     codes: List[str],
+                     policySelect: int,
+                     upperBreak: bool,
+                     window: int = BOLL_WINDOW) -> BollScanState:
+    """由指标缓存中的周期线算出全部股票的监测状态，结果与逐只调用 boll_find 的形态判断一致"""
+    cache = get_indicator_cache(policySelect, window)
+    policy = cache.panel(stock_data, codes)
+    n = len(codes)
+    ords = policy['_ord'].to_numpy()
+    pos = policy.groupby('_ord').cumcount().to_numpy()
+    break_upper = policy['Break_Upper'].to_numpy()
+    break_lower = policy['Break_Lower'].to_numpy()
+
+    # 最后一个周期的下轨
+    counts = np.bincount(ords, minlength=n)
+    ends = np.cumsum(counts) - 1
+    lower_all = policy['Lower'].to_numpy()
+    lower = np.where(counts > 0, lower_all[np.clip(ends, 0, None)] if len(lower_all) else np.nan, np.nan)
+
+    last_up = _group_max(ords, pos, break_upper, n)
+    armed = (last_up >= 0) & (cache.bar_counts(codes) >= window + 5)
+
+    if upperBreak:
+        # 只看最后一次突破上轨（含）之后的区间，区间首行的「前一行」视为 False
+        seg = pos >= last_up[ords]
+        seg_start = pos == last_up[ords]
+        above = policy['最高'].to_numpy() >= policy['MA20'].to_numpy()
+        prev_lower = np.r_[False, break_lower[:-1]] & ~seg_start
+        prev_above = np.r_[False, above[:-1]] & ~seg_start
+        down_cross = seg & break_lower & ~prev_lower
+        up_cross = seg & above & ~prev_above
+
+        # 区间内从未跌破下轨，或最近一次跌破之后（含当周期）没有向上穿越中轨
+        last_down = _group_max(ords, pos, down_cross, n)
+        up_after = up_cross & (last_down[ords] >= 0) & (pos >= last_down[ords])
+        has_up_after = np.zeros(n, dtype=bool)
+        has_up_after[ords[up_after]] = True
+        armed &= (last_down < 0) | ~has_up_after
+
+    return BollScanState(np.asarray(codes, dtype=object), lower, armed, cache.generation)
+
+
+_states: Dict[Tuple[int, bool, int], BollScanState] = {}
+_states_lock = threading.Lock()
+
+
+def get_scan_state(stock_data: Mapping,
+                   policySelect: int,
+                   upperBreak: bool,
+                   window: int = BOLL_WINDOW) -> BollScanState:
+    """全市场监测状态；日线和指标缓存都没有变化时直接复用上一次的结果"""
+    with _states_lock:
+        codes = list(stock_data)
+        cache = get_indicator_cache(policySelect, window)
+        cache.refresh(stock_data, codes)
+        key = (policySelect, upperBreak, window)
+        state = _states.get(key)
+        if (state is None or state.generation != cache.generation
+                or len(state.codes) != len(codes) or (state.codes != np.asarray(codes, dtype=object)).any()):
+            state = build_scan_state(stock_data, codes, policySelect, upperBreak, window)
+            _states[key] = state
+        return state
+
+
+def scan_state(state: BollScanState,
+               spot: SpotIndex,
+               marketValMin: int,
+               marketValMax: int,
+               peRatioMin: int,
+               peRatioMax: int,
+               codes: List[str] = None) -> pd.DataFrame:
+    """用实时快照筛出当前满足监测条件的股票，列与 boll_find 的结果相同"""
+    mask = state.armed & spot.filter_mask(state.codes, marketValMin, marketValMax, peRatioMin, peRatioMax,
+                                          keep_nan=False)
+    if codes is not None:
+        mask &= np.isin(state.codes, np.asarray(codes, dtype=object))
+    rows = spot.rows(state.codes)
+    price = np.where(rows >= 0, spot.price[np.clip(rows, 0, None)], np.nan)
+    mask &= ~(price > state.lower)
+
+    hits = np.flatnonzero(mask)
+    if len(hits) == 0:
+        return pd.DataFrame()
+    hit_rows = rows[hits]
+    hit_codes = state.codes[hits]
+    return pd.DataFrame({
+        '代码': hit_codes,
+        '名称': [stock_name(code) for code in hit_codes],
+        '市值': np.round(spot.market_val[hit_rows], 2),
+        '市盈率': np.round(spot.pe[hit_rows], 2),
+        '日期': datetime.date.today().strftime("%Y-%m-%d"),
+        '价格': np.round(state.lower[hits], 2),
+    })
+
+
+def boll_find_all(stock_data: Mapping,
+                  spot: SpotIndex,
+                  policySelect: int,
+                  upperBreak: bool,
+                  marketValMin: int = 50,
+                  marketValMax: int = 20000,
+                  peRatioMin: int = 20,
+                  peRatioMax: int = 80,
+                  codes: List[str] = None,
+                  window: int = BOLL_WINDOW) -> pd.DataFrame:
+    """与对每只股票调用 boll_find 再合并的结果相同，日内重复监测时只做价格比较"""
+    state = get_scan_state(stock_data, policySelect, upperBreak, window)
+    return scan_state(state, spot, marketValMin, marketValMax, peRatioMin, peRatioMax, codes)
+
+
+def _changed(prev: SpotIndex, curr: SpotIndex, codes: np.ndarray) -> np.ndarray:
+    """两次快照之间最新价/市值/市盈率有变化（含出现或消失）的代码"""
+    prev_rows = prev.rows(codes)
+    curr_rows = curr.rows(codes)
+    moved = (prev_rows >= 0) != (curr_rows >= 0)
+    both = (prev_rows >= 0) & (curr_rows >= 0)
+    p, c = prev_rows[both], curr_rows[both]
+    diff = np.zeros(both.sum(), dtype=bool)
+    for a, b in ((prev.price[p], curr.price[c]),
+                 (prev.market_val[p], curr.market_val[c]),
+                 (prev.pe[p], curr.pe[c])):
+        diff |= (a != b) & ~(np.isnan(a) & np.isnan(b))
+    moved[both] = diff
+    return moved
+
+
+class BollWatch:
+    """
+    盯盘：记住上一次的快照和命中集合，每次新快照只重新判断已成形、且最新价/市值/市盈率
+    有变化的股票（命中与否只取决于这三项和已收盘周期的下轨）。周期线有更新时整体重判。
+    """
+
+    def __init__(self,
+                 policySelect: int,
+                 upperBreak: bool,
+                 marketValMin: int = 50,
+                 marketValMax: int = 20000,
+                 peRatioMin: int = 20,
+                 peRatioMax: int = 80,
+                 window: int = BOLL_WINDOW):
+        self.policySelect = policySelect
+        self.upperBreak = upperBreak
+        self.bounds = (marketValMin, marketValMax, peRatioMin, peRatioMax)
+        self.window = window
+        self.hits: set = set()
+        self._state: BollScanState = None
+        self._spot: SpotIndex = None
+
+    def update(self, stock_data: Mapping, spot: SpotIndex) -> Tuple[pd.DataFrame, List[str]]:
+        """返回 (新命中或数值有变化的命中行, 不再命中的代码)"""
+        state = get_scan_state(stock_data, self.policySelect, self.upperBreak, self.window)
+        full = self._state is None or state is not self._state
+        if full:
+            candidates = state.codes
+        else:
+            candidates = state.codes[state.armed & _changed(self._spot, spot, state.codes)]
+        self._state, self._spot = state, spot
+
+        if len(candidates) == 0:
+            return pd.DataFrame(), []
+        found = scan_state(state, spot, *self.bounds, codes=None if full else list(candidates))
+        found_codes = set(found['代码']) if not found.empty else set()
+        if full:
+            exits = [code for code in self.hits if code not in found_codes]
+        else:
+            exits = [code for code in candidates if code in self.hits and code not in found_codes]
+        self.hits.difference_update(exits)
+        self.hits.update(found_codes)
+        return found, exits
@@ -0,0 +1,137 @@
+import datetime
+import numpy as np
+import pandas as pd
+from collections.abc import Mapping
+from typing import Callable, List
+from view.policy.stock import stock_name
+from view.policy.spot_index import SpotIndex
+from view.policy.strategy import Strategy, CodeFeatures, FeatureReq, register_strategy
+from view.policy.boll_break import extract_reverse_trades, boll_find, trade_record
+from view.policy.boll_panel import boll_reverse_backtest_panel
+from view.policy.boll_scan import boll_find_all
+
+# 内置策略。布林反转沿用已有的全市场批量算法（面板回测、增量监测），
+# 与其他策略一起运行时按插件接口逐只计算、共用特征。
+
+BACKTEST_KEYS = ['policySelect', 'sellPos', 'upperBreak', 'period_s', 'period_e', 'sh_min', 'sh_max',
+                 'marketValMin', 'marketValMax', 'peRatioMin', 'peRatioMax']
+SCAN_KEYS = ['policySelect', 'upperBreak', 'marketValMin', 'marketValMax', 'peRatioMin', 'peRatioMax']
+
+
+@register_strategy
+class BollReverseStrategy(Strategy):
+    """突破上轨后跌破下轨买入，回到中轨/上轨卖出（boll_reverse_backtest / boll_find）"""
+
+    name = 'boll_reverse'
+    title = '布林反转'
+
+    def requires(self, params: dict) -> List[FeatureReq]:
+        return [('daily', {}), ('periods', {'policySelect': params['policySelect']})]
+
+    def backtest(self, code: str, features: CodeFeatures, spot: SpotIndex, params: dict) -> List[dict]:
+        df = features.get('daily')
+        info = spot.get(code)
+        if df.empty or info is None:
+            return []
+        return extract_reverse_trades(code, df, features.get('periods', policySelect=params['policySelect']),
+                                      params['policySelect'], params['sellPos'], params['upperBreak'],
+                                      params['period_s'], params['period_e'], params['sh_min'], params['sh_max'],
+                                      info.market_val, info.pe)
+
+    def scan(self, code: str, features: CodeFeatures, spot: SpotIndex, params: dict) -> dict:
+        found = boll_find(code, features.get('daily'), spot,
+                          policy_df=features.get('periods', policySelect=params['policySelect']),
+                          **{k: params[k] for k in SCAN_KEYS})
+        return None if found.empty else found.iloc[0].to_dict()
+
+    def backtest_universe(self, stock_data: Mapping, codes: List[str], params: dict,
+                          on_trades: Callable[[pd.DataFrame], None] = None,
+                          on_progress: Callable[[int], None] = None,
+                          is_cancelled: Callable[[], bool] = None) -> pd.DataFrame:
+        def put(df: pd.DataFrame):
+            on_trades(df.assign(策略=self.title))
+        result = boll_reverse_backtest_panel(stock_data, codes=codes,
+                                             on_trades=put if on_trades is not None else None,
+                                             on_progress=on_progress, is_cancelled=is_cancelled,
+                                             **{k: params[k] for k in BACKTEST_KEYS})
+        return result.assign(策略=self.title) if not result.empty else result
+
+    def scan_universe(self, stock_data: Mapping, spot: SpotIndex, codes: List[str], params: dict) -> pd.DataFrame:
+        # 增量监测：已收盘周期的形态状态只在日线更新后重建，日内重复监测只比较最新价
+        hits = boll_find_all(stock_data, spot, codes=codes, **{k: params[k] for k in SCAN_KEYS})
+        return hits.assign(策略=self.title) if not hits.empty else hits
+
+
+@register_strategy
+class MacdCrossStrategy(Strategy):
+    """周期线 MACD 金叉（DIF 上穿 DEA）收盘买入，死叉收盘卖出；买入日上证指数需在区间内"""
+
+    name = 'macd_cross'
+    title = 'MACD金叉'
+    fast, slow, signal = 12, 26, 9
+
+    def requires(self, params: dict) -> List[FeatureReq]:
+        sel = params['policySelect']
+        return [('daily', {}), ('periods', {'policySelect': sel}), ('macd', {'policySelect': sel}),
+                ('sh_close', {})]
+
+    def _crosses(self, features: CodeFeatures, policySelect: int):
+        dif, dea, _ = features.get('macd', policySelect=policySelect)
+        above = dif > dea
+        prev = np.r_[False, above[:-1]]
+        golden = above & ~prev
+        dead = ~above & prev
+        # 前 slow 根 EMA 尚未稳定，不取信号
+        golden[:self.slow] = False
+        return golden, dead
+
+    def backtest(self, code: str, features: CodeFeatures, spot: SpotIndex, params: dict) -> List[dict]:
+        info = spot.get(code)
+        sel = params['policySelect']
+        periods = features.get('periods', policySelect=sel)
+        if info is None or len(periods) <= self.slow:
+            return []
+        golden, dead = self._crosses(features, sel)
+        dates = periods['日期'].to_numpy()
+        close = periods['收盘'].to_numpy()
+        period_e = params['period_e'] or datetime.date.today().strftime("%Y-%m-%d")
+        inside = (dates >= np.datetime64(pd.to_datetime(params['period_s']))) & \
+                 (dates <= np.datetime64(pd.to_datetime(period_e)))
+        days = features.get('daily')['日期'].to_numpy()
+        sh_close = features.get('sh_close')
+
+        trades = []
+        sells = np.flatnonzero(dead & inside)
+        i = 0
+        for buy in np.flatnonzero(golden & inside):
+            if buy < i:
+                continue
+            j = np.searchsorted(sells, buy, side='right')
+            if j == len(sells):
+                break       # 区间结束时仍未死叉，不计入
+            sell = sells[j]
+            i = sell + 1
+            k = int(np.searchsorted(days, dates[buy], side='right')) - 1
+            sh = sh_close[k] if k >= 0 else np.nan
+            if not params['sh_min'] <= sh <= params['sh_max']:
+                continue
+            trades.append(trade_record(code, close[buy], close[sell], dates[buy], dates[sell],
+                                 sh, info.market_val, info.pe))
+        return trades
+
+    def scan(self, code: str, features: CodeFeatures, spot: SpotIndex, params: dict) -> dict:
+        info = spot.get(code)
+        periods = features.get('periods', policySelect=params['policySelect'])
+        if info is None or len(periods) <= self.slow:
+            return None
+        golden, _ = self._crosses(features, params['policySelect'])
+        if not golden[-1]:
+            return None
+        return {
+            '代码': code,
+            '名称': stock_name(code),
+            '市值': round(info.market_val, 2),
+            '市盈率': round(info.pe, 2),
+            '日期': datetime.date.today().strftime("%Y-%m-%d"),
+            '价格': round(info.price, 2),
+        }
@@ -0,0 +1,79 @@
+import time
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Callable, Dict, List, Tuple
+
+
+class TokenBucket:
+    """令牌桶限速：平均每秒 rate 次，允许 capacity 次突发"""
+
+    def __init__(self, rate: float, capacity: int = 1):
+        self.rate = rate
+        self.capacity = max(1, capacity)
+        self._tokens = float(self.capacity)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """取一个令牌，没有则阻塞到令牌补足"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+def call_with_retry(func: Callable, *args,
+                    limiter: TokenBucket = None,
+                    retries: int = 3,
+                    backoff: float = 1.0,
+                    **kwargs) -> Any:
+    """限速调用 func，失败后按 backoff * 2^n（带随机抖动）重试，重试耗尽则抛出最后一次异常"""
+    for attempt in range(retries + 1):
+        if limiter is not None:
+            limiter.acquire()
+        try:
+            return func(*args, **kwargs)
+        except Exception as e:
+            if attempt >= retries:
+                raise
+            delay = backoff * (2 ** attempt) * random.uniform(0.8, 1.2)
+            print(f"请求失败({e})，{delay:.1f} 秒后第 {attempt + 1} 次重试")
+            time.sleep(delay)
+
+
+def download_all(codes: List[str],
+                 task: Callable[[str], Any],
+                 workers: int = 8,
+                 on_result: Callable[[str, Any], None] = None,
+                 on_error: Callable[[str, Exception], None] = None,
+                 is_cancelled: Callable[[], bool] = None) -> Tuple[Dict[str, Any], Dict[str, Exception]]:
+    """
+    用有界线程池对每个代码执行 task(code)，每完成一个就回调 on_result / on_error。
+    is_cancelled() 返回 True 时丢弃尚未开始的任务。返回 (成功结果, 失败异常)。
+    """
+    results, errors = {}, {}
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        futures = {pool.submit(task, code): code for code in codes}
+        for future in as_completed(futures):
+            if is_cancelled is not None and is_cancelled():
+                pool.shutdown(wait=True, cancel_futures=True)
+                break
+            code = futures[future]
+            try:
+                res = future.result()
+            except Exception as e:
+                errors[code] = e
+                if on_error is not None:
+                    on_error(code, e)
+                continue
+            results[code] = res
+            if on_result is not None:
+                on_result(code, res)
+    return results, errors
@@ -0,0 +1,89 @@
+import numpy as np
+import pandas as pd
+from typing import List, NamedTuple, Sequence, Tuple
+
+# 离场规则：每条规则在持仓期日线数组上一次性算出「触发掩码」和「卖出价」，
+# first_exit() 取所有规则中最早触发的一天，同一天多条触发时按规则顺序优先。
+# 新增离场方式只需新增规则类，不需要逐行遍历。
+
+
+class HoldingBars(NamedTuple):
+    """买入后（不含买入当天）的持仓期日线"""
+    days: np.ndarray        # datetime64
+    low: np.ndarray
+    high: np.ndarray
+    close: np.ndarray
+    buy_price: float
+    buy_date: pd.Timestamp
+
+    def held_days(self) -> np.ndarray:
+        """每根日线距买入日的自然日天数"""
+        return (self.days - np.datetime64(self.buy_date)) // np.timedelta64(1, 'D')
+
+
+class ExitRule:
+    """离场规则基类"""
+
+    def evaluate(self, bars: HoldingBars) -> Tuple[np.ndarray, np.ndarray]:
+        """返回 (是否触发, 触发时的卖出价)，两者与 bars 等长"""
+        raise NotImplementedError
+
+
+class StopLoss(ExitRule):
+    """止损：最低价跌破 买入价 × ratio 时按该价卖出，持有超过 min_days 天后才生效"""
+
+    def __init__(self, ratio: float = 0.9, min_days: int = 0):
+        self.ratio = ratio
+        self.min_days = min_days
+
+    def evaluate(self, bars: HoldingBars):
+        threshold = bars.buy_price * self.ratio
+        hit = (bars.low <= threshold) & (bars.held_days() > self.min_days)
+        return hit, np.full(len(hit), threshold)
+
+
+class TakeProfit(ExitRule):
+    """止盈：最高价达到 买入价 × ratio 时按该价卖出，持有超过 min_days 天后才生效"""
+
+    def __init__(self, ratio: float = 1.1, min_days: int = 0):
+        self.ratio = ratio
+        self.min_days = min_days
+
+    def evaluate(self, bars: HoldingBars):
+        target = bars.buy_price * self.ratio
+        hit = (bars.high >= target) & (bars.held_days() > self.min_days)
+        return hit, np.full(len(hit), target)
+
+
+class HoldingPeriodExit(ExitRule):
+    """持有超过 max_days 天后按收盘价卖出；profit_only 时只在收盘价高于买入价时卖出"""
+
+    def __init__(self, max_days: int = 80, profit_only: bool = True):
+        self.max_days = max_days
+        self.profit_only = profit_only
+
+    def evaluate(self, bars: HoldingBars):
+        hit = bars.held_days() > self.max_days
+        if self.profit_only:
+            hit = hit & (bars.close > bars.buy_price)
+        return hit, bars.close
+
+
+def first_exit(rules: Sequence[ExitRule], bars: HoldingBars) -> Tuple[int, float]:
+    """所有规则中最早触发的 (位置, 卖出价)，都不触发返回 (-1, None)"""
+    best_i, best_price = -1, None
+    for rule in rules:
+        hit, prices = rule.evaluate(bars)
+        if not hit.any():
+            continue
+        i = int(hit.argmax())
+        if best_i < 0 or i < best_i:
+            best_i, best_price = i, prices[i]
+    return best_i, best_price
+
+
+# boll 回测（不要求先突破上轨）的默认离场：持有超过 80 天后跌破买入价 90% 止损，或收盘价回到买入价之上
+BOLL_TIMEOUT_EXITS: List[ExitRule] = [
+    StopLoss(0.9, min_days=80),
+    HoldingPeriodExit(80, profit_only=True),
+]
@@ -0,0 +1,45 @@
+import numpy as np
+import pandas as pd
+
+# 指数日线的查询结构：日期和收盘价各一个有序 NumPy 数组，
+# 按「不晚于该日的最近交易日」取值，整批日期用一次 searchsorted 完成。
+
+
+class IndexSeries:
+    """按日期升序的指数收盘价"""
+
+    def __init__(self, dates: np.ndarray, values: np.ndarray):
+        dates = np.asarray(dates, dtype='datetime64[ns]')
+        order = np.argsort(dates, kind='stable')
+        self.dates = dates[order]
+        self.values = np.asarray(values, dtype=np.float64)[order]
+        self._series: pd.Series = None
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> 'IndexSeries':
+        """由含 日期/收盘 两列的日线生成"""
+        if df is None or df.empty:
+            return cls(np.empty(0, dtype='datetime64[ns]'), np.empty(0))
+        return cls(pd.to_datetime(df['日期']).to_numpy(), df['收盘'].to_numpy(dtype=np.float64))
+
+    def __len__(self) -> int:
+        return len(self.dates)
+
+    @property
+    def last_date(self) -> pd.Timestamp:
+        return pd.Timestamp(self.dates[-1]) if len(self.dates) else None
+
+    def asof_many(self, dates) -> np.ndarray:
+        """每个日期当天或之前最近一个交易日的收盘价，早于第一条数据的为 NaN"""
+        idx = np.searchsorted(self.dates, np.asarray(dates, dtype='datetime64[ns]'), side='right') - 1
+        return np.where(idx >= 0, self.values[np.clip(idx, 0, None)] if len(self.values) else np.nan, np.nan)
+
+    def asof(self, date) -> float:
+        return float(self.asof_many([np.datetime64(pd.Timestamp(date), 'ns')])[0])
+
+    @property
+    def series(self) -> pd.Series:
+        """以日期为索引的 pd.Series（兼容旧的 get_sh_series 返回值）"""
+        if self._series is None:
+            self._series = pd.Series(self.values, index=pd.DatetimeIndex(self.dates, name='日期'), name='收盘')
+        return self._series
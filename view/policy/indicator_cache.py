@@ -0,0 +1,274 @@
+import os
+import threading
+import numpy as np
+import pandas as pd
+from collections.abc import Mapping
+from typing import Dict, List, Tuple
+from view.policy.stock import CACHE_DIR, BOLL_WINDOW
+from view.policy.boll_break import mark_breaks
+
+# 布林带指标缓存：每个 (周期, 窗口) 一个文件，保存全市场合成后的周期线和 MA20/STD，
+# 按代码记录生成时的 (日线行数, 最后日期, 最后收盘价)。
+# 日线只是在末尾追加时，只重算最后一个周期及之后的行，滚动窗口用缓存中前 window-1 行补足；
+# 历史数据有改动（行数变少或原最后一根对不上）时整只重算。
+
+INDICATOR_DIR = os.path.join(CACHE_DIR, "indicators")
+CACHE_VERSION = 1
+BAR_FIELDS = ['日期', '开盘', '最高', '最低', '收盘']
+BAND_COLUMNS = ['日期', '开盘', '收盘', '最高', '最低', 'MA20', 'STD']
+_read_only = False  # 只读：刷新结果只留在内存，不写缓存文件（多进程子进程使用）
+
+
+def stack_bars(stock_data: Mapping, codes: List[str]) -> pd.DataFrame:
+    """把多只股票日线拼成按 (_ord, 日期) 排序的长表，'_ord' 为股票序号"""
+    if hasattr(stock_data, 'panel'):
+        daily = stock_data.panel(codes)
+    else:
+        frames = [stock_data[code][BAR_FIELDS].assign(_ord=i) for i, code in enumerate(codes)]
+        if not frames:
+            return pd.DataFrame(columns=['_ord'] + BAR_FIELDS)
+        daily = pd.concat(frames, ignore_index=True)
+    return daily.sort_values(['_ord', '日期'], kind='mergesort').reset_index(drop=True)
+
+
+def assign_trade_no(daily: pd.DataFrame, policySelect: int, pos: np.ndarray = None):
+    """给长表中的日线标上所属周期，pos 为每根日线在本股票中的序号（三日线使用）"""
+    if policySelect == 0:
+        if pos is None:
+            pos = daily.groupby('_ord').cumcount().to_numpy()
+        daily['trade_no'] = pos // 3
+    elif policySelect == 1:
+        daily['trade_no'] = pd.to_datetime(daily['日期']).dt.to_period('W').dt.start_time
+    else:
+        daily['trade_no'] = pd.to_datetime(daily['日期']).dt.to_period('M').dt.start_time
+
+
+def aggregate_periods(daily: pd.DataFrame) -> pd.DataFrame:
+    """按 (_ord, trade_no) 合成周期线"""
+    return (
+        daily.groupby(['_ord', 'trade_no'], sort=True)
+             .agg(日期=('日期', 'last'),
+                  开盘=('开盘', 'first'),
+                  收盘=('收盘', 'last'),
+                  最高=('最高', 'max'),
+                  最低=('最低', 'min'))
+             .reset_index(level='_ord')
+             .reset_index(drop=True)
+    )
+
+
+def rolling_bands(policy: pd.DataFrame, window: int):
+    """分组滚动计算 MA20/STD，在每只股票边界处重新起算"""
+    closes = policy.groupby('_ord', sort=False)['收盘']
+    policy['MA20'] = closes.rolling(window).mean().droplevel(0)
+    policy['STD'] = closes.rolling(window).std().droplevel(0)
+
+
+def _period_start(date: np.datetime64, policySelect: int) -> np.datetime64:
+    period = 'W' if policySelect == 1 else 'M'
+    return np.datetime64(pd.Timestamp(date).to_period(period).start_time, 'ns')
+
+
+def _bars(stock_data: Mapping, code: str) -> Tuple[np.ndarray, np.ndarray]:
+    """单只股票按日期排序的 (日期, 收盘价)"""
+    if hasattr(stock_data, 'view'):
+        v = stock_data.view(code)
+        return v.dates, np.round(v.close.astype(np.float64), 3)
+    df = stock_data[code].sort_values('日期')
+    return df['日期'].to_numpy(dtype='datetime64[ns]'), df['收盘'].to_numpy(dtype=np.float64)
+
+
+def _empty_table() -> pd.DataFrame:
+    data = {'代码': pd.Series(dtype=object), '日期': pd.Series(dtype='datetime64[ns]')}
+    data.update({col: pd.Series(dtype=np.float64) for col in BAND_COLUMNS[1:]})
+    return pd.DataFrame(data)
+
+
+class IndicatorCache:
+    """一个 (周期, 窗口) 组合的全市场布林带缓存"""
+
+    def __init__(self, root: str, policySelect: int, window: int = BOLL_WINDOW):
+        self.root = root
+        self.policySelect = policySelect
+        self.window = window
+        self._lock = threading.RLock()
+        self._table: pd.DataFrame = None                        # '代码' + BAND_COLUMNS，按 (代码, 日期) 排序
+        self._spans: Dict[str, Tuple[int, int]] = {}            # 代码 → (起始行, 行数)
+        self._meta: Dict[str, Tuple[int, np.datetime64, float]] = {}  # 代码 → (日线行数, 最后日期, 最后收盘)
+        self.generation = 0  # 每次有股票被重算时加一，派生状态据此判断是否过期
+
+    def path(self) -> str:
+        return os.path.join(self.root, f"boll_{self.policySelect}_{self.window}.pkl")
+
+    def _ensure_loaded(self):
+        if self._table is not None:
+            return
+        self._table = _empty_table()
+        self._meta = {}
+        if os.path.exists(self.path()):
+            try:
+                data = pd.read_pickle(self.path())
+                if data.get('version') == CACHE_VERSION:
+                    self._table = data['table']
+                    self._meta = data['meta']
+            except Exception as e:
+                print(f"指标缓存读取失败，将重新计算: {e}")
+        self._reindex()
+
+    def _reindex(self):
+        codes = self._table['代码'].to_numpy()
+        uniq, starts, counts = np.unique(codes, return_index=True, return_counts=True)
+        self._spans = {code: (int(s), int(n)) for code, s, n in zip(uniq, starts, counts)}
+
+    def save(self):
+        os.makedirs(self.root, exist_ok=True)
+        tmp = self.path() + ".tmp"
+        pd.to_pickle({'version': CACHE_VERSION, 'table': self._table, 'meta': self._meta}, tmp)
+        os.replace(tmp, self.path())
+
+    def refresh(self, stock_data: Mapping, codes: List[str] = None, save: bool = True) -> int:
+        """使 codes 的缓存与日线一致，返回重新计算的股票数"""
+        with self._lock:
+            self._ensure_loaded()
+            if codes is None:
+                codes = list(stock_data)
+            full, tail, tail_start = [], [], []
+            new_meta = {}
+            for code in codes:
+                if code not in stock_data:
+                    continue
+                dates, closes = _bars(stock_data, code)
+                n = len(dates)
+                if n == 0:
+                    continue
+                meta = (n, dates[-1], float(closes[-1]))
+                old = self._meta.get(code)
+                if old == meta and code in self._spans:
+                    continue
+                new_meta[code] = meta
+                old_n = old[0] if old is not None else 0
+                if (old is None or code not in self._spans or old_n > n
+                        or dates[old_n - 1] != old[1] or float(closes[old_n - 1]) != old[2]):
+                    full.append(code)
+                    continue
+                # 只在末尾追加：从原最后一个周期的第一根日线开始重算
+                if self.policySelect == 0:
+                    start = (old_n - 1) // 3 * 3
+                else:
+                    start = int(np.searchsorted(dates, _period_start(old[1], self.policySelect), side='left'))
+                tail.append(code)
+                tail_start.append(start)
+
+            if not full and not tail:
+                return 0
+
+            pieces = [self._table[~self._table['代码'].isin(full + tail)]]
+            if full:
+                pieces.append(self._compute_full(stock_data, full))
+            if tail:
+                pieces.extend(self._compute_tail(stock_data, tail, np.array(tail_start, dtype=np.int64)))
+            self._table = (pd.concat(pieces, ignore_index=True)
+                             .sort_values(['代码', '日期'], kind='mergesort')
+                             .reset_index(drop=True))
+            self._meta.update(new_meta)
+            self._reindex()
+            self.generation += 1
+            if save and not _read_only:
+                self.save()
+            return len(full) + len(tail)
+
+    def _compute_full(self, stock_data: Mapping, codes: List[str]) -> pd.DataFrame:
+        daily = stack_bars(stock_data, codes)
+        assign_trade_no(daily, self.policySelect)
+        policy = aggregate_periods(daily)
+        rolling_bands(policy, self.window)
+        policy.insert(0, '代码', np.asarray(codes, dtype=object)[policy['_ord'].to_numpy()])
+        return policy[['代码'] + BAND_COLUMNS]
+
+    def _compute_tail(self, stock_data: Mapping, codes: List[str], starts: np.ndarray) -> List[pd.DataFrame]:
+        """增量重算：返回 [保留的旧行, 新算出的行]"""
+        daily = stack_bars(stock_data, codes)
+        pos = daily.groupby('_ord').cumcount().to_numpy()
+        ords = daily['_ord'].to_numpy()
+        daily = daily[pos >= starts[ords]].reset_index(drop=True)
+        assign_trade_no(daily, self.policySelect, pos[pos >= starts[ords]])
+        new = aggregate_periods(daily)
+
+        # 旧行去掉最后一个周期；其后 window-1 行作为滚动窗口的上文
+        take = np.concatenate([np.arange(s, s + n - 1) for s, n in (self._spans[c] for c in codes)])
+        kept = self._table.iloc[take].reset_index(drop=True)
+        kept_ord = np.repeat(np.arange(len(codes)), [self._spans[c][1] - 1 for c in codes])
+        ctx = kept.assign(_ord=kept_ord).groupby('_ord').tail(self.window - 1)
+
+        both = pd.concat([ctx[['_ord'] + BAR_FIELDS].assign(_new=False), new.assign(_new=True)],
+                         ignore_index=True)
+        both = both.sort_values('_ord', kind='mergesort').reset_index(drop=True)
+        rolling_bands(both, self.window)
+        new = both[both['_new']].reset_index(drop=True)
+        new.insert(0, '代码', np.asarray(codes, dtype=object)[new['_ord'].to_numpy()])
+        return [kept, new[['代码'] + BAND_COLUMNS]]
+
+    def panel(self, stock_data: Mapping, codes: List[str]) -> pd.DataFrame:
+        """
+        codes 的周期线长表，按 (_ord, 日期) 排序，'_ord' 为股票在 codes 中的序号，没有日线的股票不出现。
+        每只股票的切片与对其日线单独调用 build_policy_df 得到的 policy_df 相同（含突破标记）
+        """
+        with self._lock:
+            self.refresh(stock_data, codes)
+            ords = [i for i, c in enumerate(codes) if c in self._spans]
+            spans = [self._spans[codes[i]] for i in ords]
+            take = (np.concatenate([np.arange(s, s + n) for s, n in spans])
+                    if spans else np.empty(0, dtype=np.int64))
+            policy = self._table.iloc[take][BAND_COLUMNS].reset_index(drop=True)
+            policy.insert(0, '_ord', np.repeat(np.array(ords, dtype=np.int64), [n for _, n in spans]))
+        mark_breaks(policy)
+        return policy
+
+    def bar_counts(self, codes: List[str]) -> np.ndarray:
+        """生成缓存时各股票的日线行数，没有缓存的为 0"""
+        with self._lock:
+            self._ensure_loaded()
+            return np.array([self._meta[c][0] if c in self._meta else 0 for c in codes], dtype=np.int64)
+
+    def frame(self, code: str) -> pd.DataFrame:
+        """单只股票的周期线（需先 refresh），与 build_policy_df 返回的 policy_df 相同"""
+        with self._lock:
+            self._ensure_loaded()
+            if code not in self._spans:
+                return _empty_table()[BAND_COLUMNS]
+            s, n = self._spans[code]
+            policy_df = self._table.iloc[s:s + n][BAND_COLUMNS].reset_index(drop=True)
+        mark_breaks(policy_df)
+        return policy_df
+
+
+def set_read_only(read_only: bool = True):
+    """多进程子进程调用：缓存文件由父进程刷新，子进程只读"""
+    global _read_only
+    _read_only = read_only
+
+
+_caches: Dict[Tuple[int, int], IndicatorCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_indicator_cache(policySelect: int, window: int = BOLL_WINDOW) -> IndicatorCache:
+    with _caches_lock:
+        key = (policySelect, window)
+        if key not in _caches:
+            _caches[key] = IndicatorCache(INDICATOR_DIR, policySelect, window)
+        return _caches[key]
+
+
+def refresh_indicator_caches(stock_data: Mapping) -> int:
+    """日线更新后，增量刷新磁盘上已有的全部指标缓存"""
+    if not os.path.isdir(INDICATOR_DIR):
+        return 0
+    cnt = 0
+    for file in os.listdir(INDICATOR_DIR):
+        stem, ext = os.path.splitext(file)
+        parts = stem.split('_')
+        if ext != '.pkl' or len(parts) != 3 or parts[0] != 'boll':
+            continue
+        cnt += get_indicator_cache(int(parts[1]), int(parts[2])).refresh(stock_data)
+    return cnt
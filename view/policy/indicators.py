@@ -0,0 +1,362 @@
+import math
+import numpy as np
+import pandas as pd
+from collections import deque
+from typing import Dict, Tuple, Type
+
+# 技术指标：每个指标有两种形式，结果一致（浮点误差内）。
+#   批量形式：对整段序列一次算出，返回与输入等长的 NumPy 数组，前面不足窗口的位置为 NaN；
+#   逐根形式：OnlineXxx.update() 每来一根 K 线 O(1) 更新并返回当前值，
+#            state() 得到只含数字/列表的字典（可存 pickle/JSON），restore() 还原后接着更新。
+# 口径与国内行情软件一致：STD 为样本标准差，MACD 柱 = 2 × (DIF - DEA)，KDJ 初值 50，ATR 为 TR 的简单平均。
+# 缺失值（NaN，如停牌）按 pandas 批量形式的口径处理，两种形式在有缺失值时结果也一致：
+#   滑动窗口内有 NaN 时结果为 NaN，NaN 移出窗口后恢复；EMA 遇到 NaN 沿用上一个值，
+#   下一个有效值按间隔的根数衰减旧值的权重（ewm 的 ignore_na=False）。
+
+RESYNC_EVERY = 1024     # 滑动窗口累加和每更新这么多次后重新精确求和，避免误差累积
+
+
+def _series(values) -> pd.Series:
+    return pd.Series(np.asarray(values, dtype=np.float64))
+
+
+# ---------- 批量形式 ----------
+
+def sma(values, window: int) -> np.ndarray:
+    """简单移动平均"""
+    return _series(values).rolling(window).mean().to_numpy()
+
+
+def rolling_std(values, window: int) -> np.ndarray:
+    """滚动样本标准差（ddof=1）"""
+    return _series(values).rolling(window).std().to_numpy()
+
+
+def bollinger(close, window: int = 20, k: float = 2.0) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """布林带 (中轨, 上轨, 下轨)"""
+    mid = sma(close, window)
+    std = rolling_std(close, window)
+    return mid, mid + k * std, mid - k * std
+
+
+def ema(values, span: int) -> np.ndarray:
+    """指数移动平均，alpha = 2 / (span + 1)，首值为第一根"""
+    return _series(values).ewm(span=span, adjust=False).mean().to_numpy()
+
+
+def macd(close, fast: int = 12, slow: int = 26, signal: int = 9) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """MACD (DIF, DEA, 柱)"""
+    dif = ema(close, fast) - ema(close, slow)
+    dea = ema(dif, signal)
+    return dif, dea, 2 * (dif - dea)
+
+
+def _rsv(high, low, close, n: int) -> np.ndarray:
+    """未成熟随机值，前 n-1 根按已有数据计算，最高等于最低时取 50"""
+    llv = _series(low).rolling(n, min_periods=1).min().to_numpy()
+    hhv = _series(high).rolling(n, min_periods=1).max().to_numpy()
+    span = hhv - llv
+    close = np.asarray(close, dtype=np.float64)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(span > 0, (close - llv) / np.where(span > 0, span, 1) * 100, 50.0)
+
+
+def _smooth(values: np.ndarray, m: int, init: float = 50.0) -> np.ndarray:
+    """Y = ((m-1) × Y' + X) / m，Y' 初值为 init"""
+    return _series(np.concatenate([[init], values])).ewm(alpha=1 / m, adjust=False).mean().to_numpy()[1:]
+
+
+def kdj(high, low, close, n: int = 9, m1: int = 3, m2: int = 3) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """KDJ (K, D, J)"""
+    k = _smooth(_rsv(high, low, close, n), m1)
+    d = _smooth(k, m2)
+    return k, d, 3 * k - 2 * d
+
+
+def true_range(high, low, close) -> np.ndarray:
+    """真实波幅，第一根为 最高 - 最低"""
+    high = np.asarray(high, dtype=np.float64)
+    low = np.asarray(low, dtype=np.float64)
+    prev = np.concatenate([[np.nan], np.asarray(close, dtype=np.float64)[:-1]])
+    with np.errstate(invalid='ignore'):
+        tr = np.fmax(high - low, np.fmax(np.abs(high - prev), np.abs(low - prev)))
+    return tr
+
+
+def atr(high, low, close, n: int = 14) -> np.ndarray:
+    """平均真实波幅"""
+    return sma(true_range(high, low, close), n)
+
+
+# ---------- 逐根形式 ----------
+
+class OnlineIndicator:
+    """逐根更新的指标。子类的状态只放数字和 deque，deque 由 _DEQUES 列出"""
+
+    _DEQUES: Tuple[str, ...] = ()
+    _CHILDREN: Tuple[str, ...] = ()
+
+    def update(self, *bar):
+        raise NotImplementedError
+
+    def state(self) -> dict:
+        """可序列化的状态"""
+        state = {'type': type(self).__name__}
+        for name, value in self.__dict__.items():
+            if name in self._DEQUES:
+                value = [list(v) if isinstance(v, tuple) else v for v in value]
+            elif name in self._CHILDREN:
+                value = value.state()
+            state[name] = value
+        return state
+
+    @classmethod
+    def from_state(cls, state: dict) -> 'OnlineIndicator':
+        obj = cls.__new__(cls)
+        for name, value in state.items():
+            if name == 'type':
+                continue
+            if name in cls._DEQUES:
+                value = deque(tuple(v) if isinstance(v, list) else v for v in value)
+            elif name in cls._CHILDREN:
+                value = restore(value)
+            setattr(obj, name, value)
+        return obj
+
+    def copy(self) -> 'OnlineIndicator':
+        """独立的副本，例如用盘中未走完的 K 线试算而不改动原状态"""
+        return restore(self.state())
+
+
+class OnlineRollingStats(OnlineIndicator):
+    """滑动窗口均值和样本标准差（加入/移出各一次 Welford 更新，只统计非 NaN 值）"""
+
+    _DEQUES = ('buf',)
+
+    def __init__(self, window: int):
+        self.window = window
+        self.buf = deque()
+        self.nans = 0       # 窗口内 NaN 的个数
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.updates = 0
+
+    def update(self, x: float) -> Tuple[float, float]:
+        x = float(x)
+        self.buf.append(x)
+        if math.isnan(x):
+            self.nans += 1
+        else:
+            n = len(self.buf) - self.nans
+            d = x - self.mean
+            self.mean += d / n
+            self.m2 += d * (x - self.mean)
+        if len(self.buf) > self.window:
+            y = self.buf.popleft()
+            if math.isnan(y):
+                self.nans -= 1
+            else:
+                n = len(self.buf) - self.nans
+                if n == 0:
+                    self.mean = self.m2 = 0.0
+                else:
+                    d = y - self.mean
+                    self.mean -= d / n
+                    self.m2 -= d * (y - self.mean)
+        self.updates += 1
+        if self.updates % RESYNC_EVERY == 0:
+            self._resync()
+        return self.value
+
+    def _resync(self):
+        values = [v for v in self.buf if not math.isnan(v)]
+        if not values:
+            self.mean = self.m2 = 0.0
+            return
+        self.mean = math.fsum(values) / len(values)
+        self.m2 = math.fsum((v - self.mean) ** 2 for v in values)
+
+    @property
+    def value(self) -> Tuple[float, float]:
+        """(均值, 标准差)，不足一个窗口或窗口内有 NaN 时为 NaN"""
+        if len(self.buf) < self.window or self.nans:
+            return math.nan, math.nan
+        std = math.sqrt(max(self.m2, 0.0) / (self.window - 1)) if self.window > 1 else math.nan
+        return self.mean, std
+
+
+class OnlineSMA(OnlineIndicator):
+    _DEQUES = ('buf',)
+
+    def __init__(self, window: int):
+        self.window = window
+        self.buf = deque()
+        self.nans = 0       # 窗口内 NaN 的个数，累加和只含非 NaN 值
+        self.total = 0.0
+        self.updates = 0
+
+    def update(self, x: float) -> float:
+        x = float(x)
+        self.buf.append(x)
+        if math.isnan(x):
+            self.nans += 1
+        else:
+            self.total += x
+        if len(self.buf) > self.window:
+            y = self.buf.popleft()
+            if math.isnan(y):
+                self.nans -= 1
+            else:
+                self.total -= y
+        self.updates += 1
+        if self.updates % RESYNC_EVERY == 0:
+            self.total = math.fsum(v for v in self.buf if not math.isnan(v))
+        return self.value
+
+    @property
+    def value(self) -> float:
+        return self.total / self.window if len(self.buf) == self.window and not self.nans else math.nan
+
+
+class OnlineBollinger(OnlineIndicator):
+    _CHILDREN = ('stats',)
+
+    def __init__(self, window: int = 20, k: float = 2.0):
+        self.k = k
+        self.stats = OnlineRollingStats(window)
+
+    def update(self, close: float) -> Tuple[float, float, float]:
+        self.stats.update(close)
+        return self.value
+
+    @property
+    def value(self) -> Tuple[float, float, float]:
+        """(中轨, 上轨, 下轨)"""
+        mid, std = self.stats.value
+        return mid, mid + self.k * std, mid - self.k * std
+
+
+class OnlineEMA(OnlineIndicator):
+    def __init__(self, span: int = None, alpha: float = None, init: float = None):
+        self.alpha = alpha if alpha is not None else 2 / (span + 1)
+        self.ema = math.nan if init is None else float(init)
+        self.old_wt = 1.0   # 旧值的权重，遇到 NaN 时按 (1 - alpha) 逐根衰减
+
+    def update(self, x: float) -> float:
+        x = float(x)
+        if math.isnan(self.ema):
+            if not math.isnan(x):
+                self.ema = x
+            return self.ema
+        self.old_wt *= 1 - self.alpha
+        if not math.isnan(x):
+            self.ema = (self.old_wt * self.ema + self.alpha * x) / (self.old_wt + self.alpha)
+            self.old_wt = 1.0
+        return self.ema
+
+    @property
+    def value(self) -> float:
+        return self.ema
+
+
+class OnlineMACD(OnlineIndicator):
+    _CHILDREN = ('fast', 'slow', 'signal')
+
+    def __init__(self, fast: int = 12, slow: int = 26, signal: int = 9):
+        self.fast = OnlineEMA(fast)
+        self.slow = OnlineEMA(slow)
+        self.signal = OnlineEMA(signal)
+
+    def update(self, close: float) -> Tuple[float, float, float]:
+        dif = self.fast.update(close) - self.slow.update(close)
+        dea = self.signal.update(dif)
+        return dif, dea, 2 * (dif - dea)
+
+    @property
+    def value(self) -> Tuple[float, float, float]:
+        """(DIF, DEA, 柱)"""
+        dif = self.fast.value - self.slow.value
+        dea = self.signal.value
+        return dif, dea, 2 * (dif - dea)
+
+
+class OnlineKDJ(OnlineIndicator):
+    """最高/最低用单调队列维护，均摊 O(1)；NaN 的最高/最低不进队列"""
+
+    _DEQUES = ('highs', 'lows')
+    _CHILDREN = ('k_ema', 'd_ema')
+
+    def __init__(self, n: int = 9, m1: int = 3, m2: int = 3):
+        self.n = n
+        self.highs = deque()    # (序号, 最高)，最高价单调递减
+        self.lows = deque()     # (序号, 最低)，最低价单调递增
+        self.count = 0
+        # K、D 为初值 50 的 EMA，RSV 为 NaN 时沿用上一个值
+        self.k_ema = OnlineEMA(alpha=1 / m1, init=50.0)
+        self.d_ema = OnlineEMA(alpha=1 / m2, init=50.0)
+
+    def update(self, high: float, low: float, close: float) -> Tuple[float, float, float]:
+        i = self.count
+        self.count += 1
+        if not math.isnan(high):
+            while self.highs and self.highs[-1][1] <= high:
+                self.highs.pop()
+            self.highs.append((i, float(high)))
+        if not math.isnan(low):
+            while self.lows and self.lows[-1][1] >= low:
+                self.lows.pop()
+            self.lows.append((i, float(low)))
+        while self.highs and self.highs[0][0] <= i - self.n:
+            self.highs.popleft()
+        while self.lows and self.lows[0][0] <= i - self.n:
+            self.lows.popleft()
+
+        # 窗口内没有最高或最低时与批量形式一样取 50
+        if self.highs and self.lows and self.highs[0][1] > self.lows[0][1]:
+            hhv, llv = self.highs[0][1], self.lows[0][1]
+            rsv = (close - llv) / (hhv - llv) * 100
+        else:
+            rsv = 50.0
+        self.d_ema.update(self.k_ema.update(rsv))
+        return self.value
+
+    @property
+    def value(self) -> Tuple[float, float, float]:
+        """(K, D, J)"""
+        k, d = self.k_ema.value, self.d_ema.value
+        return k, d, 3 * k - 2 * d
+
+
+def _fmax(*values: float) -> float:
+    """忽略 NaN 的最大值，全为 NaN 时为 NaN（同 np.fmax）"""
+    values = [v for v in values if not math.isnan(v)]
+    return max(values) if values else math.nan
+
+
+class OnlineATR(OnlineIndicator):
+    _CHILDREN = ('tr',)
+
+    def __init__(self, n: int = 14):
+        self.prev_close = math.nan
+        self.tr = OnlineSMA(n)
+
+    def update(self, high: float, low: float, close: float) -> float:
+        prev = self.prev_close
+        tr = _fmax(high - low, abs(high - prev), abs(low - prev))
+        self.prev_close = float(close)
+        return self.tr.update(tr)
+
+    @property
+    def value(self) -> float:
+        return self.tr.value
+
+
+ONLINE_INDICATORS: Dict[str, Type[OnlineIndicator]] = {
+    cls.__name__: cls for cls in (OnlineRollingStats, OnlineSMA, OnlineBollinger, OnlineEMA,
+                                  OnlineMACD, OnlineKDJ, OnlineATR)
+}
+
+
+def restore(state: dict) -> OnlineIndicator:
+    """由 state() 的结果还原指标"""
+    return ONLINE_INDICATORS[state['type']].from_state(state)
@@ -0,0 +1,161 @@
+import os
+import json
+import shutil
+import threading
+import numpy as np
+import pandas as pd
+from collections.abc import Mapping
+from typing import Dict, Iterator, List, NamedTuple, Tuple
+from view.policy.bar_store import BarStore
+
+# 全市场 OHLC 内存映射镜像：日期 int64(ns)，开高低收 float32，各列连续存放，
+# 按代码 (起始行, 行数) 切片得到的是映射文件上的视图，不拷贝、不常驻内存。
+# 每次重建写入新的 ohlc_<n> 目录，旧目录仍可能被映射（Windows 下无法覆盖），稍后再清理。
+
+OHLC_META_FILE = "ohlc.json"
+OHLC_FIELDS: List[Tuple[str, str]] = [  # (中文列名, 文件名)
+    ('开盘', 'open'),
+    ('最高', 'high'),
+    ('最低', 'low'),
+    ('收盘', 'close'),
+]
+PRICE_DECIMALS = 3  # float32 还原为 float64 时的小数位，A 股价格最多两位小数
+
+
+class OhlcView(NamedTuple):
+    """单只股票的零拷贝数组视图"""
+    dates: np.ndarray   # datetime64[ns]
+    open: np.ndarray    # float32
+    high: np.ndarray
+    low: np.ndarray
+    close: np.ndarray
+
+
+class OhlcUniverse(Mapping):
+    """以内存映射数组为后端的 {代码: DataFrame} 只读映射，DataFrame 在访问时才构造"""
+
+    def __init__(self, data_dir: str, index: Dict[str, Tuple[int, int]]):
+        self.data_dir = data_dir
+        self._index = index
+        self._dates = np.load(os.path.join(data_dir, "date.npy"), mmap_mode='r')
+        self._prices = {key: np.load(os.path.join(data_dir, f"{key}.npy"), mmap_mode='r')
+                        for _, key in OHLC_FIELDS}
+
+    def codes(self) -> List[str]:
+        return list(self._index)
+
+    def view(self, code: str) -> OhlcView:
+        start, length = self._index[code]
+        end = start + length
+        return OhlcView(self._dates[start:end].view('datetime64[ns]'),
+                        self._prices['open'][start:end],
+                        self._prices['high'][start:end],
+                        self._prices['low'][start:end],
+                        self._prices['close'][start:end])
+
+    def frame(self, code: str) -> pd.DataFrame:
+        """还原为策略使用的 日期/开盘/最高/最低/收盘 DataFrame"""
+        v = self.view(code)
+        data = {'日期': np.array(v.dates)}
+        for name, key in OHLC_FIELDS:
+            data[name] = np.round(getattr(v, key).astype(np.float64), PRICE_DECIMALS)
+        return pd.DataFrame(data)
+
+    def panel(self, codes: List[str] = None) -> pd.DataFrame:
+        """多只股票首尾相接的长表，'_ord' 列为股票在 codes 中的序号，直接从映射数组拼接"""
+        if codes is None:
+            codes = self.codes()
+        codes = [c for c in codes if c in self._index]
+        spans = [self._index[c] for c in codes]
+        lengths = np.array([n for _, n in spans], dtype=np.int64)
+        take = np.concatenate([np.arange(s, s + n) for s, n in spans]) if spans else np.empty(0, dtype=np.int64)
+        data = {
+            '_ord': np.repeat(np.arange(len(codes)), lengths),
+            '日期': self._dates[take].view('datetime64[ns]'),
+        }
+        for name, key in OHLC_FIELDS:
+            data[name] = np.round(self._prices[key][take].astype(np.float64), PRICE_DECIMALS)
+        return pd.DataFrame(data)
+
+    def __getitem__(self, code: str) -> pd.DataFrame:
+        if code not in self._index:
+            raise KeyError(code)
+        return self.frame(code)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._index)
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def __contains__(self, code) -> bool:
+        return code in self._index
+
+
+_build_lock = threading.Lock()
+
+
+def _read_meta(store: BarStore) -> dict:
+    path = os.path.join(store.root, OHLC_META_FILE)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _is_fresh(store: BarStore, meta: dict) -> bool:
+    if meta is None or not store.exists():
+        return False
+    if meta.get('source_stamp') != store.stamp():
+        return False
+    return os.path.isdir(os.path.join(store.root, meta['dir']))
+
+
+def build_ohlc_mmap(store: BarStore) -> dict:
+    """从日线仓库生成 OHLC 镜像文件，返回镜像元数据"""
+    columns, index = store.snapshot()
+    old = _read_meta(store)
+    gen = old['gen'] + 1 if old else 0
+    sub_dir = f"ohlc_{gen}"
+    data_dir = os.path.join(store.root, sub_dir)
+    os.makedirs(data_dir, exist_ok=True)
+
+    np.save(os.path.join(data_dir, "date.npy"),
+            columns['date'].view('int64').astype(np.int64, copy=False), allow_pickle=False)
+    for _, key in OHLC_FIELDS:
+        np.save(os.path.join(data_dir, f"{key}.npy"),
+                columns[key].astype(np.float32), allow_pickle=False)
+
+    codes = list(index)
+    meta = {
+        'gen': gen,
+        'dir': sub_dir,
+        'source_stamp': store.stamp(),
+        'codes': codes,
+        'starts': [index[c][0] for c in codes],
+        'lengths': [index[c][1] for c in codes],
+    }
+    tmp = os.path.join(store.root, OHLC_META_FILE + ".tmp")
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(meta, f)
+    os.replace(tmp, os.path.join(store.root, OHLC_META_FILE))
+
+    # 清理旧镜像，仍被映射的目录删不掉就留到下次
+    for name in os.listdir(store.root):
+        if name.startswith("ohlc_") and name != sub_dir:
+            shutil.rmtree(os.path.join(store.root, name), ignore_errors=True)
+    return meta
+
+
+def open_ohlc_universe(store: BarStore) -> OhlcUniverse:
+    """打开 OHLC 镜像，仓库有更新时先重建"""
+    with _build_lock:
+        meta = _read_meta(store)
+        if not _is_fresh(store, meta):
+            print("正在生成 OHLC 内存映射文件...")
+            meta = build_ohlc_mmap(store)
+        index = {code: (s, n) for code, s, n in zip(meta['codes'], meta['starts'], meta['lengths'])}
+        return OhlcUniverse(os.path.join(store.root, meta['dir']), index)
@@ -0,0 +1,82 @@
+import os
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Callable, List
+
+# 多进程并行：把代码列表切成小分片交给进程池，子进程自己映射日线缓存，
+# 父进程只传代码和参数，每完成一个分片就把结果回调出去，便于界面边算边显示。
+# 本模块不能依赖 Qt，子进程会导入它。
+
+PARALLEL_WORKERS = max(1, (os.cpu_count() or 1) - 1)
+SHARD_SIZE = 100
+
+
+def _init_worker(state: dict):
+    """
+    子进程初始化：沿用父进程准备好的快照、上证指数和交易日历（stock.worker_state），
+    指标缓存只读，避免每个子进程各自联网、同时写缓存文件
+    """
+    from view.policy.stock import use_worker_state
+    from view.policy.indicator_cache import set_read_only
+    use_worker_state(state)
+    set_read_only()
+
+
+def sweep_shard(codes: List[str], params: dict) -> pd.DataFrame:
+    """子进程：对一批代码按参数寻优的各撮合键回测"""
+    from view.policy.stock import get_stock_data
+    from view.policy.param_sweep import sweep_trades
+    return sweep_trades(get_stock_data(backing="mmap"), codes, **params)
+
+
+def strategy_backtest_shard(codes: List[str], params: dict) -> pd.DataFrame:
+    """子进程：对一批代码运行所选策略的回测"""
+    from view.policy.stock import get_stock_data
+    from view.policy.strategy import get_strategy, backtest_strategies
+    strategies = [get_strategy(name) for name in params['strategies']]
+    return backtest_strategies(strategies, get_stock_data(backing="mmap"), codes, params['params'])
+
+
+def strategy_scan_shard(codes: List[str], params: dict) -> pd.DataFrame:
+    """子进程：对一批代码逐只运行所选策略的监测（特征预处理已在主进程完成）"""
+    from view.policy.stock import get_stock_data
+    from view.policy.strategy import get_strategy, run_scan
+    strategies = [get_strategy(name) for name in params['strategies']]
+    return run_scan(strategies, get_stock_data(backing="mmap"), codes, params['params'], prepare=False)
+
+
+def run_sharded(shard_func: Callable[[List[str], dict], pd.DataFrame],
+                codes: List[str],
+                params: dict,
+                state: dict,
+                workers: int = PARALLEL_WORKERS,
+                shard_size: int = SHARD_SIZE,
+                on_result: Callable[[pd.DataFrame], None] = None,
+                on_progress: Callable[[int], None] = None,
+                is_cancelled: Callable[[], bool] = None) -> pd.DataFrame:
+    """
+    在进程池中按分片执行 shard_func(codes, params)，结果按完成顺序回调 on_result。
+    is_cancelled() 返回 True 时丢弃尚未开始的分片，已在运行的分片跑完即结束。
+    """
+    shards = [codes[i:i + shard_size] for i in range(0, len(codes), shard_size)]
+    total = len(codes)
+    done = 0
+    results = []
+    with ProcessPoolExecutor(max_workers=max(1, workers),
+                             initializer=_init_worker, initargs=(state,)) as pool:
+        futures = {pool.submit(shard_func, shard, params): len(shard) for shard in shards}
+        for future in as_completed(futures):
+            if is_cancelled is not None and is_cancelled():
+                pool.shutdown(wait=True, cancel_futures=True)
+                break
+            df = future.result()
+            done += futures[future]
+            if not df.empty:
+                results.append(df)
+                if on_result is not None:
+                    on_result(df)
+            if on_progress is not None:
+                on_progress(int(done * 100 / total))
+    if not results:
+        return pd.DataFrame()
+    return pd.concat(results, ignore_index=True)
@@ -0,0 +1,203 @@
+import re
+import itertools
+import numpy as np
+import pandas as pd
+from collections.abc import Mapping
+from typing import Callable, Dict, List, NamedTuple, Sequence, Tuple
+from view.policy.stock import get_spot_index, BOLL_WINDOW
+from view.policy.spot_index import SpotIndex
+from view.policy.boll_break import extract_reverse_trades
+from view.policy.boll_panel import split_panel
+from view.policy.scan_plan import sh_range_reachable
+from view.policy.indicator_cache import stack_bars, get_indicator_cache
+
+# 参数寻优：一次任务评估多组回测参数，输出每组的平均收益率/平均持有天数/日收益率/交易次数。
+# 日线长表只拼一次，每个周期的布林带只从指标缓存取一次，所有组合共用。
+# 撮合结果只取决于 (周期, 卖出位置, 突破上轨, 上证区间)：市值/市盈率区间只是按代码筛选已撮合的交易；
+# 要求突破上轨时每笔交易互不影响，上证区间也只是按买入日指数事后筛选，这类组合只撮合一遍。
+
+POLICY_NAMES = ['三日线', '周线', '月线']
+SELL_POS_NAMES = ['中轨', '上轨']
+# 子进程回传的交易记录只保留汇总需要的列
+TRADE_COLUMNS = ['_key', '_period', '代码', '收益率', '持有天数', '上证指数']
+
+# 撮合键：(周期, 卖出位置, 突破上轨, 上证下限, 上证上限)，上证区间不影响撮合时为 None
+TradeKey = Tuple[int, int, bool, float, float]
+
+
+class SweepCombo(NamedTuple):
+    """一组回测参数"""
+    policySelect: int
+    sellPos: int
+    upperBreak: bool
+    sh_min: int
+    sh_max: int
+    marketValMin: int
+    marketValMax: int
+    peRatioMin: int
+    peRatioMax: int
+
+    def trade_key(self) -> TradeKey:
+        if self.upperBreak:
+            return self.policySelect, self.sellPos, True, None, None
+        return self.policySelect, self.sellPos, False, self.sh_min, self.sh_max
+
+
+def parse_values(text: str) -> List[int]:
+    """解析逗号/空格分隔的整数列表，如 "3100, 3200"，去重后保持输入顺序"""
+    parts = [p for p in re.split(r'[,，\s]+', text.strip()) if p]
+    if not parts:
+        raise ValueError(f"没有输入数值: {text!r}")
+    return list(dict.fromkeys(int(p) for p in parts))
+
+
+def value_ranges(mins: Sequence[int], maxs: Sequence[int]) -> List[Tuple[int, int]]:
+    """下限 × 上限的所有区间，下限大于上限的组合丢弃"""
+    return [(lo, hi) for lo, hi in itertools.product(mins, maxs) if lo <= hi]
+
+
+def sweep_combos(policySelects: Sequence[int],
+                 sellPositions: Sequence[int],
+                 upperBreaks: Sequence[bool],
+                 sh_ranges: Sequence[Tuple[int, int]],
+                 market_ranges: Sequence[Tuple[int, int]],
+                 pe_ranges: Sequence[Tuple[int, int]]) -> List[SweepCombo]:
+    """各参数取值的笛卡尔积"""
+    return [SweepCombo(sel, pos, ub, sh[0], sh[1], mv[0], mv[1], pe[0], pe[1])
+            for sel, pos, ub, sh, mv, pe in itertools.product(policySelects, sellPositions, upperBreaks,
+                                                              sh_ranges, market_ranges, pe_ranges)]
+
+
+def sweep_trade_keys(combos: Sequence[SweepCombo], period_e: str = None) -> List[TradeKey]:
+    """需要撮合的键，上证区间在 period_e 之前从未到达的直接跳过"""
+    keys = []
+    for key in dict.fromkeys(c.trade_key() for c in combos):
+        if key[3] is not None and not sh_range_reachable(key[3], key[4], period_e):
+            continue
+        keys.append(key)
+    return keys
+
+
+def plan_sweep(codes: List[str], spot: SpotIndex, combos: Sequence[SweepCombo]) -> List[str]:
+    """至少满足一组市值/市盈率区间的股票（缺失值视为通过，与单次回测相同）"""
+    mask = np.zeros(len(codes), dtype=bool)
+    for bounds in dict.fromkeys((c.marketValMin, c.marketValMax, c.peRatioMin, c.peRatioMax) for c in combos):
+        mask |= spot.filter_mask(codes, *bounds)
+    return [code for code, ok in zip(codes, mask) if ok]
+
+
+def sweep_trades(stock_data: Mapping,
+                 codes: List[str],
+                 keys: Sequence[TradeKey],
+                 periods: Sequence[Tuple[str, str]],
+                 window: int = BOLL_WINDOW,
+                 on_progress: Callable[[int], None] = None,
+                 is_cancelled: Callable[[], bool] = None) -> pd.DataFrame:
+    """
+    对 codes 按每个撮合键、每个 (period_s, period_e) 区间撮合交易，返回 TRADE_COLUMNS 长表，
+    '_key'/'_period' 为键和区间在 keys/periods 中的序号。
+    日线切片在各周期间共用，同一周期的布林带在各键、各区间间共用。
+    """
+    spot = get_spot_index()
+    codes = [code for code in codes if code in spot]
+    infos = [spot.get(code) for code in codes]
+    daily = stack_bars(stock_data, codes)
+    day_bounds = split_panel(daily, len(codes))
+    days = [daily.iloc[day_bounds[i]:day_bounds[i + 1]].drop(columns='_ord').reset_index(drop=True)
+            for i in range(len(codes))]
+
+    by_policy: Dict[int, List[int]] = {}
+    for k, key in enumerate(keys):
+        by_policy.setdefault(key[0], []).append(k)
+
+    frames = []
+    total = max(1, len(codes) * len(by_policy))
+    done = 0
+    for policySelect, key_ids in by_policy.items():
+        policy = get_indicator_cache(policySelect, window).panel(stock_data, codes)
+        policy_bounds = split_panel(policy, len(codes))
+        for i, code in enumerate(codes):
+            if is_cancelled is not None and is_cancelled():
+                break
+            df = days[i]
+            if not df.empty:
+                policy_df = policy.iloc[policy_bounds[i]:policy_bounds[i + 1]].drop(columns='_ord').reset_index(drop=True)
+                for k in key_ids:
+                    _, sellPos, upperBreak, sh_min, sh_max = keys[k]
+                    if sh_min is None:
+                        sh_min, sh_max = -np.inf, np.inf
+                    for p, (period_s, period_e) in enumerate(periods):
+                        trades = extract_reverse_trades(code, df, policy_df, policySelect, sellPos, upperBreak,
+                                                        period_s, period_e, sh_min, sh_max,
+                                                        infos[i].market_val, infos[i].pe)
+                        if trades:
+                            frames.append(pd.DataFrame(trades).assign(_key=k, _period=p)[TRADE_COLUMNS])
+            done += 1
+            if on_progress is not None:
+                on_progress(int(done * 100 / total))
+
+    if not frames:
+        return pd.DataFrame(columns=TRADE_COLUMNS)
+    return pd.concat(frames, ignore_index=True)
+
+
+def combo_trades(combo: SweepCombo,
+                 key_index: Dict[TradeKey, int],
+                 groups: Dict[int, pd.DataFrame],
+                 spot: SpotIndex) -> pd.DataFrame:
+    """从按撮合键分组的交易中取出属于 combo 的部分，没有时返回 None"""
+    t = groups.get(key_index.get(combo.trade_key()))
+    if t is not None and combo.upperBreak:
+        sh = t['上证指数'].to_numpy(dtype=float)
+        t = t[(sh >= combo.sh_min) & (sh <= combo.sh_max)]
+    if t is not None and not t.empty:
+        codes = t['代码'].unique()
+        ok = dict(zip(codes, spot.filter_mask(list(codes), combo.marketValMin, combo.marketValMax,
+                                              combo.peRatioMin, combo.peRatioMax)))
+        t = t[t['代码'].map(ok).to_numpy(dtype=bool)]
+    return t
+
+
+def trade_stats(trades: pd.DataFrame) -> dict:
+    """交易次数/平均收益率(%)/平均持有天数/日收益率(%)，没有交易时统计值为 NaN"""
+    count = 0 if trades is None else len(trades)
+    avg_ret = trades['收益率'].mean() if count else np.nan
+    avg_days = trades['持有天数'].mean() if count else np.nan
+    day_ret = avg_ret * 100 / avg_days if count and avg_days else np.nan
+    return {
+        '交易次数': count,
+        '平均收益率': round(avg_ret * 100, 2),
+        '平均持有天数': round(avg_days, 2),
+        '日收益率': round(day_ret, 3),
+    }
+
+
+def combo_labels(combo: SweepCombo) -> dict:
+    """结果表中描述一组参数的列"""
+    return {
+        '周期': POLICY_NAMES[combo.policySelect],
+        '卖出位置': SELL_POS_NAMES[combo.sellPos],
+        '突破上轨': '是' if combo.upperBreak else '否',
+        '上证区间': f'{combo.sh_min}-{combo.sh_max}',
+        '市值区间': f'{combo.marketValMin}-{combo.marketValMax}',
+        '市盈率区间': f'{combo.peRatioMin}-{combo.peRatioMax}',
+    }
+
+
+def group_trades(trades: pd.DataFrame, period: int = None) -> Dict[int, pd.DataFrame]:
+    """按撮合键分组，period 不为 None 时只取该区间的交易"""
+    if period is not None and not trades.empty:
+        trades = trades[trades['_period'].to_numpy() == period]
+    return {k: g for k, g in trades.groupby('_key')} if not trades.empty else {}
+
+
+def sweep_grid(combos: Sequence[SweepCombo],
+               keys: Sequence[TradeKey],
+               trades: pd.DataFrame,
+               spot: SpotIndex,
+               period: int = None) -> pd.DataFrame:
+    """把撮合结果按组合汇总成结果表，收益率和日收益率为百分比，没有交易的组合统计值为 NaN"""
+    key_index = {key: k for k, key in enumerate(keys)}
+    groups = group_trades(trades, period)
+    return pd.DataFrame([{**combo_labels(c), **trade_stats(combo_trades(c, key_index, groups, spot))}
+                         for c in combos])
@@ -0,0 +1,237 @@
+import heapq
+import numpy as np
+import pandas as pd
+from collections.abc import Mapping
+from typing import Dict, List, NamedTuple, Tuple
+from view.policy.stock import get_sh_index
+from view.policy.ohlc_mmap import PRICE_DECIMALS
+
+# 组合模拟：把全市场回测得到的交易信号（买入日/买入价/卖出日/卖出价）按日期排成事件队列，
+# 在同一个账户里按资金、仓位和最大持仓数决定哪些信号真正成交，输出逐日资金曲线。
+# 逐日循环只处理有事件的日子：先卖出到期持仓，再按顺序买入当天的信号，当天买入当天卖出的最后平仓。
+# 资金曲线在模拟结束后按成交记录整段累加持仓市值，不逐日遍历持仓。
+
+SIGNAL_COLUMNS = ['代码', '买入日期', '买入价', '卖出日期', '卖出价']
+
+
+class PortfolioConfig(NamedTuple):
+    initial_cash: float = 1000000.0     # 初始资金（元）
+    max_positions: int = 10             # 最大同时持仓数
+    position_pct: float = 0.1           # 单笔买入占当前总资产的比例
+    lot_size: int = 100                 # 每手股数
+    fee_rate: float = 0.0003            # 买卖双边费率
+
+
+class PortfolioResult(NamedTuple):
+    equity: pd.DataFrame    # 日期/现金/持仓市值/总资产/持仓数
+    fills: pd.DataFrame     # 实际成交的信号，附 股数/盈亏/收益率
+    stats: dict
+
+
+class _Closes:
+    """按需读取并缓存各股票的 (日期, 收盘价)"""
+
+    def __init__(self, stock_data: Mapping):
+        self._stock_data = stock_data
+        self._bars: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+
+    def get(self, code: str) -> Tuple[np.ndarray, np.ndarray]:
+        bars = self._bars.get(code)
+        if bars is None:
+            if hasattr(self._stock_data, 'view'):
+                v = self._stock_data.view(code)
+                bars = (v.dates.astype('datetime64[D]'), np.round(v.close.astype(np.float64), PRICE_DECIMALS))
+            else:
+                df = self._stock_data[code].sort_values('日期')
+                bars = (pd.to_datetime(df['日期']).to_numpy().astype('datetime64[D]'),
+                        df['收盘'].to_numpy(dtype=np.float64))
+            self._bars[code] = bars
+        return bars
+
+    def asof(self, code: str, days: np.ndarray, side: str = 'right') -> np.ndarray:
+        """days 当天（side='left' 为前一天）或之前最近一根日线的收盘价，之前没有日线的为 NaN"""
+        dates, close = self.get(code)
+        idx = np.searchsorted(dates, days, side=side) - 1
+        if not len(close):
+            return np.full(len(days), np.nan)
+        return np.where(idx >= 0, close[np.clip(idx, 0, None)], np.nan)
+
+
+def signal_arrays(trades: pd.DataFrame) -> Dict[str, np.ndarray]:
+    """交易记录 → 按 (买入日期, 代码) 排序的信号数组，买入日期晚于卖出日期的丢弃"""
+    df = trades[SIGNAL_COLUMNS]
+    buy_day = pd.to_datetime(df['买入日期']).to_numpy().astype('datetime64[D]')
+    sell_day = pd.to_datetime(df['卖出日期']).to_numpy().astype('datetime64[D]')
+    codes = df['代码'].astype(str).to_numpy()
+    keep = np.flatnonzero(buy_day <= sell_day)
+    order = keep[np.lexsort((codes[keep], buy_day[keep]))]
+    return {
+        'code': codes[order],
+        'buy_day': buy_day[order],
+        'buy_price': df['买入价'].to_numpy(dtype=np.float64)[order],
+        'sell_day': sell_day[order],
+        'sell_price': df['卖出价'].to_numpy(dtype=np.float64)[order],
+    }
+
+
+def simulate_portfolio(trades: pd.DataFrame,
+                       stock_data: Mapping,
+                       config: PortfolioConfig = PortfolioConfig(),
+                       calendar: np.ndarray = None) -> PortfolioResult:
+    """
+    按日期顺序模拟一个账户：同一股票持有期间不重复买入，持仓数达到上限或资金不足一手时放弃信号。
+    calendar 为资金曲线使用的交易日，默认取上证指数的交易日。
+    """
+    sig = signal_arrays(trades)
+    n = len(sig['code'])
+    closes = _Closes(stock_data)
+    fee = config.fee_rate
+    lot = config.lot_size
+
+    cash = float(config.initial_cash)
+    held: Dict[str, int] = {}           # 代码 → 持仓序号
+    shares: List[int] = []
+    signal_of: List[int] = []
+    proceeds: List[float] = []
+    costs: List[float] = []
+    sells: List[Tuple[np.datetime64, int]] = []     # (卖出日, 持仓序号) 小顶堆
+    cash_events: List[Tuple[np.datetime64, float]] = []
+    skipped = 0
+
+    def close_due(day):
+        nonlocal cash
+        while sells and sells[0][0] <= day:
+            sell_day, p = heapq.heappop(sells)
+            s = signal_of[p]
+            amount = shares[p] * sig['sell_price'][s] * (1 - fee)
+            cash += amount
+            proceeds[p] = amount
+            cash_events.append((sell_day, amount))
+            del held[sig['code'][s]]
+
+    i = 0
+    while i < n or sells:
+        day = sig['buy_day'][i] if i < n else sells[0][0]
+        if sells and sells[0][0] < day:
+            day = sells[0][0]
+        # 1) 卖出此前买入、今天或之前到期的持仓
+        close_due(day)
+        # 2) 买入今天的信号，仓位按前一交易日收盘的总资产计算
+        j = i
+        while j < n and sig['buy_day'][j] == day:
+            j += 1
+        if j > i:
+            equity = cash
+            for code, p in held.items():
+                price = closes.asof(code, np.array([day]), side='left')[0]
+                equity += shares[p] * (sig['buy_price'][signal_of[p]] if np.isnan(price) else price)
+            budget = equity * config.position_pct
+            for s in range(i, j):
+                code = sig['code'][s]
+                price = sig['buy_price'][s]
+                if code in held or len(held) >= config.max_positions or price <= 0:
+                    skipped += 1
+                    continue
+                count = int(min(budget, cash) / (price * (1 + fee)) // lot) * lot
+                if count <= 0:
+                    skipped += 1
+                    continue
+                cost = count * price * (1 + fee)
+                cash -= cost
+                cash_events.append((day, -cost))
+                held[code] = len(shares)
+                heapq.heappush(sells, (sig['sell_day'][s], len(shares)))
+                shares.append(count)
+                signal_of.append(s)
+                costs.append(cost)
+                proceeds.append(np.nan)
+            i = j
+        # 3) 当天买入当天卖出的
+        close_due(day)
+
+    fills = _fill_frame(sig, signal_of, shares, costs, proceeds)
+    equity = _equity_curve(sig, fills, closes, config, cash_events, calendar)
+    return PortfolioResult(equity, fills, _portfolio_stats(equity, fills, skipped, config))
+
+
+def _fill_frame(sig: Dict[str, np.ndarray], signal_of: List[int], shares: List[int],
+                costs: List[float], proceeds: List[float]) -> pd.DataFrame:
+    idx = np.asarray(signal_of, dtype=np.int64)
+    costs = np.asarray(costs, dtype=np.float64)
+    proceeds = np.asarray(proceeds, dtype=np.float64)
+    return pd.DataFrame({
+        '代码': sig['code'][idx],
+        '买入日期': sig['buy_day'][idx],
+        '买入价': sig['buy_price'][idx],
+        '卖出日期': sig['sell_day'][idx],
+        '卖出价': sig['sell_price'][idx],
+        '股数': np.asarray(shares, dtype=np.int64),
+        '盈亏': (proceeds - costs).round(2),
+        '收益率': (proceeds - costs) / costs if len(costs) else np.empty(0),
+    })
+
+
+def _equity_curve(sig: Dict[str, np.ndarray], fills: pd.DataFrame, closes: _Closes, config: PortfolioConfig,
+                  cash_events: List[Tuple[np.datetime64, float]], calendar: np.ndarray) -> pd.DataFrame:
+    """逐日 现金/持仓市值/总资产/持仓数：每笔成交在 [买入日, 卖出日) 上整段累加按收盘价计的市值"""
+    columns = ['日期', '现金', '持仓市值', '总资产', '持仓数']
+    if fills.empty:
+        return pd.DataFrame(columns=columns)
+    first = fills['买入日期'].min().to_datetime64().astype('datetime64[D]')
+    last = fills['卖出日期'].max().to_datetime64().astype('datetime64[D]')
+    if calendar is None:
+        calendar = get_sh_index(pd.Timestamp(last)).dates
+    days = np.asarray(calendar).astype('datetime64[D]')
+    days = days[(days >= first) & (days <= last)]
+    # 停牌或指数缺数据的日子也要出现在曲线上
+    days = np.union1d(days, np.concatenate([fills['买入日期'].to_numpy().astype('datetime64[D]'),
+                                            fills['卖出日期'].to_numpy().astype('datetime64[D]')]))
+
+    value = np.zeros(len(days))
+    count = np.zeros(len(days), dtype=np.int64)
+    buy = np.searchsorted(days, fills['买入日期'].to_numpy().astype('datetime64[D]'))
+    sell = np.searchsorted(days, fills['卖出日期'].to_numpy().astype('datetime64[D]'))
+    for code, n_shares, a, b in zip(fills['代码'], fills['股数'], buy, sell):
+        if b <= a:
+            continue
+        value[a:b] += n_shares * closes.asof(code, days[a:b])
+        count[a:b] += 1
+
+    delta = np.zeros(len(days))
+    if cash_events:
+        when, amount = zip(*cash_events)
+        np.add.at(delta, np.searchsorted(days, np.asarray(when, dtype='datetime64[D]')), amount)
+    cash = config.initial_cash + np.cumsum(delta)
+    return pd.DataFrame({
+        '日期': pd.to_datetime(days),
+        '现金': cash.round(2),
+        '持仓市值': value.round(2),
+        '总资产': (cash + value).round(2),
+        '持仓数': count,
+    })
+
+
+def max_drawdown(equity: np.ndarray) -> float:
+    """最大回撤（比例），资金曲线为空时为 0"""
+    if not len(equity):
+        return 0.0
+    peak = np.maximum.accumulate(equity)
+    return float(np.max((peak - equity) / peak))
+
+
+def _portfolio_stats(equity: pd.DataFrame, fills: pd.DataFrame, skipped: int, config: PortfolioConfig) -> dict:
+    """总收益率/年化收益率/最大回撤/胜率均为百分比"""
+    final = float(equity['总资产'].iloc[-1]) if not equity.empty else config.initial_cash
+    total_ret = final / config.initial_cash - 1
+    years = (equity['日期'].iloc[-1] - equity['日期'].iloc[0]).days / 365.25 if len(equity) > 1 else 0
+    annual = (final / config.initial_cash) ** (1 / years) - 1 if years > 0 and final > 0 else np.nan
+    return {
+        '期末资产': round(final, 2),
+        '总收益率': round(total_ret * 100, 2),
+        '年化收益率': round(annual * 100, 2),
+        '最大回撤': round(max_drawdown(equity['总资产'].to_numpy(dtype=float)) * 100, 2),
+        '成交笔数': len(fills),
+        '放弃信号': int(skipped),
+        '胜率': round(float((fills['盈亏'] > 0).mean()) * 100, 2) if len(fills) else np.nan,
+        '最大持仓数': int(equity['持仓数'].max()) if not equity.empty else 0,
+    }
@@ -0,0 +1,65 @@
+import pandas as pd
+from typing import List, NamedTuple
+from view.policy.stock import get_sh_series
+from view.policy.spot_index import SpotIndex
+
+# 回测/监测的规划阶段：只用实时快照和上证指数决定哪些股票值得算，
+# 不读取任何日线，被剔除的股票后面既不加载也不计算。
+
+
+class ScanPlan(NamedTuple):
+    codes: List[str]    # 需要计算的股票
+    total: int          # 规划前的股票总数
+
+    @property
+    def skipped(self) -> int:
+        return self.total - len(self.codes)
+
+    def summary(self) -> str:
+        return f"评估 {len(self.codes)} 只，跳过 {self.skipped} 只"
+
+
+def sh_range_reachable(sh_min: int, sh_max: int, period_e: str = None) -> bool:
+    """
+    上证指数在 period_e 之前是否到达过 [sh_min, sh_max]。
+    买入日都不晚于 period_e，从未到达时任何股票都不会成交；
+    本地指数没覆盖到 period_e 时无法断定，按可达处理。
+    """
+    if sh_min > sh_max:
+        return False
+    sh = get_sh_series()
+    if sh.empty:
+        return True
+    dates = pd.to_datetime(sh.index)
+    end = pd.to_datetime(period_e) if period_e else pd.Timestamp.today().normalize()
+    if dates.max() < end:
+        return True
+    values = sh[dates <= end]
+    return bool(((values >= sh_min) & (values <= sh_max)).any())
+
+
+def plan_backtest(codes: List[str],
+                  spot: SpotIndex,
+                  sh_min: int,
+                  sh_max: int,
+                  period_e: str,
+                  marketValMin: int,
+                  marketValMax: int,
+                  peRatioMin: int,
+                  peRatioMax: int) -> ScanPlan:
+    """回测规划：上证区间不可达时全部跳过，否则按市值/市盈率剔除（缺失值视为通过）"""
+    if not sh_range_reachable(sh_min, sh_max, period_e):
+        return ScanPlan([], len(codes))
+    kept = spot.filter_codes(codes, marketValMin, marketValMax, peRatioMin, peRatioMax)
+    return ScanPlan(kept, len(codes))
+
+
+def plan_boll_find(codes: List[str],
+                   spot: SpotIndex,
+                   marketValMin: int,
+                   marketValMax: int,
+                   peRatioMin: int,
+                   peRatioMax: int) -> ScanPlan:
+    """监测规划：按市值/市盈率剔除（缺失值视为不通过）"""
+    kept = spot.filter_codes(codes, marketValMin, marketValMax, peRatioMin, peRatioMax, keep_nan=False)
+    return ScanPlan(kept, len(codes))
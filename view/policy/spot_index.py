@@ -0,0 +1,67 @@
+import numpy as np
+import pandas as pd
+from typing import Dict, List, NamedTuple
+
+# 实时快照的代码索引：代码 → 行号字典 + NumPy 列（总市值(亿)/市盈率-动态/最新价），
+# 按代码取值 O(1)，市值/市盈率过滤可以对整批代码一次完成。
+
+
+class SpotRecord(NamedTuple):
+    market_val: float   # 总市值（亿）
+    pe: float           # 市盈率-动态
+    price: float        # 最新价
+
+
+class SpotIndex:
+    """按代码索引的实时快照"""
+
+    def __init__(self, spot: pd.DataFrame):
+        spot = spot.drop_duplicates('代码', keep='first')
+        self.codes = spot['代码'].astype(str).to_numpy()
+        self.row: Dict[str, int] = {code: i for i, code in enumerate(self.codes)}
+        self.market_val = pd.to_numeric(spot['总市值'], errors='coerce').to_numpy(dtype=float) / 100000000
+        self.pe = pd.to_numeric(spot['市盈率-动态'], errors='coerce').to_numpy(dtype=float)
+        self.price = pd.to_numeric(spot['最新价'], errors='coerce').to_numpy(dtype=float)
+
+    def __contains__(self, code: str) -> bool:
+        return code in self.row
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def get(self, code: str) -> SpotRecord:
+        i = self.row.get(code)
+        if i is None:
+            return None
+        return SpotRecord(self.market_val[i], self.pe[i], self.price[i])
+
+    def rows(self, codes: List[str]) -> np.ndarray:
+        """代码对应的行号，快照中没有的代码为 -1"""
+        return np.array([self.row.get(code, -1) for code in codes], dtype=np.int64)
+
+    def filter_mask(self,
+                    codes: List[str],
+                    marketValMin: float,
+                    marketValMax: float,
+                    peRatioMin: float,
+                    peRatioMax: float,
+                    keep_nan: bool = True) -> np.ndarray:
+        """
+        批量判断市值/市盈率是否在区间内，快照中没有的代码一律不通过。
+        keep_nan=True 时缺失值视为通过（回测的原有口径），False 时视为不通过（监测的原有口径）。
+        """
+        rows = self.rows(codes)
+        found = rows >= 0
+        safe = np.where(found, rows, 0)
+        mv = self.market_val[safe]
+        pe = self.pe[safe]
+        if keep_nan:
+            ok = ~((mv < marketValMin) | (mv > marketValMax) | (pe < peRatioMin) | (pe > peRatioMax))
+        else:
+            ok = (mv >= marketValMin) & (mv <= marketValMax) & (pe >= peRatioMin) & (pe <= peRatioMax)
+        return found & ok
+
+    def filter_codes(self, codes: List[str], *bounds, keep_nan: bool = True) -> List[str]:
+        """保留市值/市盈率合格的代码，顺序不变"""
+        mask = self.filter_mask(codes, *bounds, keep_nan=keep_nan)
+        return [code for code, ok in zip(codes, mask) if ok]
@@ -1,296 +1,468 @@
-
-
-import os
-import akshare as ak
-import pandas as pd
-import time
-import re
-import random
-import datetime
-from typing import List, Dict, Tuple
-
-CACHE_DIR = "./cache"
-os.makedirs(CACHE_DIR, exist_ok=True)
-
-# ----------- 全局参数 -----------
-START_DATE = "20230103"          # 首次下载起点
-ADJUST = "qfq"                   # 前复权
-PE_LOW, PE_HIGH = 20, 45         # PE 过滤
-BOLL_WINDOW = 20                 # 布林周期（基于 3 日线）
-_sh_cache = None  # 保存已加载的 Series
-_stock_code_name_dict = None    # 全局变量，存储股票代码与名称的字典
-STOCK_CODE_NAME_DICT_FILE = os.path.join(CACHE_DIR, "stock_code_name_dict.pkl")
-
-# 全局变量，存储股票代码到 DataFrame 的映射
-_global_stock_data_dict: Dict[str, pd.DataFrame] = None
-
-_curr_all_stock = None
-_all_stock_file_path = "cache/all_stock.pkl"
-def get_cache_dir() -> str:
-    return CACHE_DIR
-
-def get_sh_series() -> pd.Series:
-    """延迟加载上证指数日线"""
-    global _sh_cache
-    if _sh_cache is None:
-        df = load_or_update("000001", False, '')
-        _sh_cache = df.set_index('日期')['收盘']
-    return _sh_cache
-
-def update_sh():
-    global _sh_cache
-    df = load_or_update("000001", True, last_trading_day())
-    _sh_cache = df.set_index('日期')['收盘']
-
-def _is_trade_time() -> bool:
-    """判断当前是否处于 A 股交易时段（工作日 09:00–15:00）"""
-    now = datetime.datetime.now()
-    if now.weekday() >= 5:          # 周六/周日
-        return False
-    market_open = now.replace(hour=9, minute=0, second=0, microsecond=0)
-    market_close = now.replace(hour=15, minute=0, second=0, microsecond=0)
-    return market_open <= now <= market_close
-
-def _is_today_data(df: pd.DataFrame) -> bool:
-    """文件里的日期列是否为今天"""
-    return (df['日期'].astype(str) == datetime.datetime.now().strftime('%Y-%m-%d')).any()
-
-def get_current_stock_info(update: bool = False):
-    global _curr_all_stock
-
-    # 1. 内存变量有效且无需强制更新 → 直接返回
-    if _curr_all_stock is not None and not update:
-        # 非交易时段：任何缓存都直接用
-        if not _is_trade_time():
-            print("直接使用缓存的实时股票信息")
-            return _curr_all_stock
-        # 交易时段：只要日期是今天也直接用
-        if _is_today_data(_curr_all_stock):
-            return _curr_all_stock
-
-    # 2. 尝试读本地缓存
-    if os.path.exists(_all_stock_file_path):
-        try:
-            local_df = pd.read_pickle(_all_stock_file_path)
-            # 非交易时段：文件是今天的就接受
-            if not _is_trade_time() and _is_today_data(local_df):
-                _curr_all_stock = local_df
-                print("不在交易时间内,实时股票信息从文件读取")
-                return _curr_all_stock
-            # 交易时段：文件是今天的且不要求强制刷新就接受
-            if _is_trade_time() and _is_today_data(local_df) and not update:
-                _curr_all_stock = local_df
-                print("在交易时间内,但不要求更新,实时股票信息从文件读取")
-                return _curr_all_stock
-        except Exception:
-            pass  # 文件损坏就重新拉
-
-    # 3. 走到这里说明必须重新拉取
-    print("正在重新获取实时股票信息...")
-    _curr_all_stock = ak.stock_zh_a_spot_em()
-    _curr_all_stock['日期'] = datetime.datetime.now().strftime('%Y-%m-%d')
-
-    os.makedirs(os.path.dirname(_all_stock_file_path), exist_ok=True)
-    _curr_all_stock.to_pickle(_all_stock_file_path)
-    print("实时数据已更新并保存到缓存文件")
-    return _curr_all_stock
-
-def _is_today_data(data: pd.DataFrame) -> bool:
-    # 获取数据中的最新日期
-    if '日期' not in data.columns:
-        return False  # 如果没有日期列，返回 False
-    latest_date = data['日期'].max()
-    # 检查是否为当天日期
-    return latest_date == datetime.datetime.now().strftime('%Y-%m-%d')
-
-def _local_path(code: str) -> str:
-    return os.path.join(CACHE_DIR, f"{code}.pkl")
-
-def last_trading_day(date: str = None) -> str:
-    # 如果没有传入日期，则使用当前日期
-    if date is None:
-        dt = pd.Timestamp.today()
-    else:
-        dt = pd.to_datetime(date, format="%Y%m%d")
-
-    # 如果当前时间是下午3点之前，回退到上一个交易日
-    if dt.hour < 15 and date is None:  # 只有使用当前日期时才考虑小时
-        dt -= pd.Timedelta(days=1)
-
-    # 如果日期是周末，回退到上一个周五
-    while dt.weekday() >= 5:  # 周六或周日
-        dt -= pd.Timedelta(days=1)
-
-    return dt.strftime("%Y%m%d")
-
-def load_or_update_stock_code_name_dict(update: bool = False, ak_spot = None):
-    global _stock_code_name_dict
-    if update is False and os.path.exists(STOCK_CODE_NAME_DICT_FILE):
-        # 如果文件存在，直接加载
-        print("加载本地股票代码与名称字典库文件...")
-        _stock_code_name_dict = pd.read_pickle(STOCK_CODE_NAME_DICT_FILE)
-    else:
-        print("本地股票代码与名称字典库文件不存在，正在获取最新数据...")
-        if ak_spot is None:
-            spot = get_current_stock_info()
-        else:
-            spot = ak_spot
-        spot = spot[spot['代码'].str.fullmatch(r'\d{6}')]  # 确保代码是6位数字
-
-        # 提取股票代码和名称
-        codes = spot['代码'].str.zfill(6).tolist()
-        names = spot.set_index('代码')['名称'].to_dict()
-
-        # 保存到全局变量和文件
-        _stock_code_name_dict = pd.Series(names, name="股票名称")
-        _stock_code_name_dict.to_pickle(STOCK_CODE_NAME_DICT_FILE)
-        print("股票代码与名称字典库文件已保存到本地。")
-
-#更新个股信息,update为True才更新
-def load_or_update(code: str, update: bool, update_day: str) -> pd.DataFrame:
-    pkl_path = _local_path(code)
-
-    # 加载或更新股票代码与名称字典库文件
-    if _stock_code_name_dict is None:
-        load_or_update_stock_code_name_dict()
-
-    # 新增：上证指数 000001 的缓存
-    if code == "000001":
-        pkl_path = _local_path("sh_index")
-        if os.path.exists(pkl_path):
-            return pd.read_pickle(pkl_path)
-
-        df_idx = ak.stock_zh_index_daily(symbol="sh000001")
-        df_idx['日期'] = pd.to_datetime(df_idx['date'])
-        df_idx = df_idx.rename(columns={'close': '收盘'})
-        # 补齐缺失列
-        df_idx['开盘'] = df_idx['收盘']  # 指数没有开高低，用收盘填充
-        df_idx['最高'] = df_idx['收盘']
-        df_idx['最低'] = df_idx['收盘']
-        df_idx = df_idx[['日期', '开盘', '最高', '最低', '收盘']]
-        df_idx.to_pickle(pkl_path)
-        return df_idx
-
-    # 本地已有则读
-    if os.path.exists(pkl_path):
-        df_old = pd.read_pickle(pkl_path)
-        last_date = df_old['日期'].max() if not df_old.empty else \
-                    pd.to_datetime(START_DATE) - pd.Timedelta(days=1)
-    else:
-        df_old = pd.DataFrame()
-        last_date = pd.to_datetime(START_DATE) - pd.Timedelta(days=1)
-
-    if update :
-        update_day_dt = pd.to_datetime(last_trading_day(update_day))  # 确保使用最近的交易日
-        if update_day_dt.date() > last_date.date():
-            start_str = (last_date + pd.Timedelta(days=1)).strftime("%Y%m%d")
-            end_str = update_day_dt.strftime("%Y%m%d")  # 使用调整后的交易日日期
-            print('{} need update, last:{}, start:{}, end{}'.format(code, last_date.date(), start_str, end_str))
-            #time.sleep(random.uniform(0.2, 0.3))
-            time.sleep(0.2)
-            df_new = ak.stock_zh_a_hist(symbol=code,
-                                        period="daily",
-                                        start_date=start_str,
-                                        end_date=end_str,
-                                        adjust=ADJUST)
-            if not df_new.empty:
-                df_new['日期'] = pd.to_datetime(df_new['日期'])
-                df_old = pd.concat([df_old, df_new]).drop_duplicates('日期').sort_values('日期')
-                df_old.to_pickle(pkl_path)
-    return df_old
-
-def stock_name(code: str) -> str:
-    if _stock_code_name_dict is None:
-        load_or_update_stock_code_name_dict()
-    if _stock_code_name_dict is None:
-        load_or_update_stock_code_name_dict(update=True)
-    if _stock_code_name_dict is None:
-        return None
-    if code in _stock_code_name_dict:
-        return _stock_code_name_dict[code]
-    else:
-        return None
-
-def get_all_stock_from_cache() -> Tuple[List[str], Dict[str, str]]:
-    import warnings
-    warnings.filterwarnings("ignore", category=FutureWarning)
-    '''
-    codes = ['002415', '600012']
-    names = ['海康威视', '皖通高速']
-    '''
-    codes, names = [], {}
-    pe_pattern = re.compile(r"\d{6}")
-    dir = get_cache_dir()
-
-    if _stock_code_name_dict is None:
-        load_or_update_stock_code_name_dict()
-
-    for file in os.listdir(dir):
-        # 只处理 6 位数字 .pkl 文件
-        m = pe_pattern.fullmatch(file.split(".")[0])
-        if not m:
-            continue
-        code = m.group(0)
-        codes.append(code)
-        if code in _stock_code_name_dict.index:
-            names[code] = _stock_code_name_dict[code]
-
-    return codes, names
-
-def get_all_stock() -> Tuple[List[str], Dict[str, str]]:
-    spot = get_current_stock_info()
-
-    sh_delist = ak.stock_info_sh_delist()
-    delist_codes = set(sh_delist['公司代码'].astype(str).str.zfill(6))
-
-    spot = spot[~spot['代码'].isin(delist_codes)]
-
-    # 增强退市股票过滤条件
-    delisting_keywords = ['退市', '退', 'DELIST', '终止上市']
-    delisting_pattern = '|'.join(delisting_keywords)
-
-    spot = spot[~spot['名称'].str.contains(delisting_pattern, na=False, case=False)]
-
-    if '退市整理' in spot.columns or 'delisting_status' in spot.columns:
-        status_col = '退市整理' if '退市整理' in spot.columns else 'delisting_status'
-        spot = spot[spot[status_col] != 1]  # 假设1表示退市状态
-
-    #spot = spot[~spot['名称'].str.startswith('退市', na=False)]
-
-    spot = spot[spot['代码'].str.fullmatch(r'\d{6}')]
-    spot = spot[~spot['名称'].str.contains('ST', na=False)]
-    spot = spot[~spot['代码'].str.startswith(('30', '81', '83', '87', '43', '688', '689', '9'))]
-    #spot = spot[~spot['名称'].str.contains('指数', na=False)]
-    # 只排除名称含“指数”且代码不是 000001 的行
-    spot = spot[~(spot['名称'].str.contains('指数', na=False) & (spot['代码'] != '000001'))]
-
-    # 剔除常见指数代码
-    index_codes = {
-        '000300', '000905', '399001',
-        '399006', '399101', '399102',
-        '399106', '399300', '399905'
-    }
-    spot = spot[~spot['代码'].isin(index_codes)]
-
-    '''
-    pe_col = next((c for c in spot.columns
-                   if '市盈率' in str(c) or str(c).upper() == 'PE'), None)
-    if pe_col is None:
-        raise RuntimeError("找不到市盈率字段")
-    spot = spot[spot[pe_col].notna() & spot[pe_col].between(pe_low, pe_high)]
-    '''
-
-    load_or_update_stock_code_name_dict(update=True, ak_spot=spot)
-
-    codes = spot['代码'].str.zfill(6).tolist()
-    names = spot.set_index('代码')['名称'].to_dict()
-    return codes, names
-
-def get_stock_data() -> Dict[str, pd.DataFrame]:
-    global _global_stock_data_dict
-    if _global_stock_data_dict is None:
-        _global_stock_data_dict = {}
-        codes, _ = get_all_stock_from_cache()
-        for code in codes:
-            _global_stock_data_dict[code] = load_or_update(code, False, '')
-    return _global_stock_data_dict
+
+
+import os
+import akshare as ak
+import numpy as np
+import pandas as pd
+import time
+import re
+import random
+import atexit
+import datetime
+import threading
+from typing import List, Dict, Tuple
+from view.policy.bar_store import BarStore
+from view.policy.ohlc_mmap import OhlcUniverse, open_ohlc_universe
+from view.policy.downloader import TokenBucket, call_with_retry
+from view.policy.spot_index import SpotIndex
+from view.policy.trade_calendar import TradeCalendar
+from view.policy.index_series import IndexSeries
+
+CACHE_DIR = "./cache"
+os.makedirs(CACHE_DIR, exist_ok=True)
+BAR_STORE_DIR = os.path.join(CACHE_DIR, "bars")
+
+# ----------- 全局参数 -----------
+START_DATE = "20230103"          # 首次下载起点
+ADJUST = "qfq"                   # 前复权
+PE_LOW, PE_HIGH = 20, 45         # PE 过滤
+BOLL_WINDOW = 20                 # 布林周期（基于 3 日线）
+HIST_RATE = 5.0                  # 日线接口限速：每秒请求数
+HIST_BURST = 5                   # 日线接口允许的突发请求数
+HIST_WORKERS = 8                 # 并发下载线程数
+HIST_RETRIES = 3                 # 单只股票下载失败的重试次数
+_sh_index: IndexSeries = None  # 已加载的上证指数
+_sh_refreshed = False  # 本次运行是否已经联网刷新过上证指数
+_sh_lock = threading.RLock()
+_stock_code_name_dict = None    # 全局变量，存储股票代码与名称的字典
+_hist_limiter = TokenBucket(HIST_RATE, HIST_BURST)  # 所有下载线程共享的限速器
+STOCK_CODE_NAME_DICT_FILE = os.path.join(CACHE_DIR, "stock_code_name_dict.pkl")
+
+# 全局变量，存储股票代码到 DataFrame 的映射
+_global_stock_data_dict: Dict[str, pd.DataFrame] = None
+
+# 全市场日线列式仓库，首次使用时从旧的 <code>.pkl 迁移
+_bar_store: BarStore = None
+# 内存映射的 OHLC 镜像，get_stock_data(backing="mmap") 使用
+_ohlc_universe: OhlcUniverse = None
+
+_curr_all_stock = None
+_spot_index_cache: Tuple[pd.DataFrame, SpotIndex] = (None, None)  # (快照, 其代码索引)
+_all_stock_file_path = "cache/all_stock.pkl"
+_offline = False  # 离线模式：任何联网请求都直接报错，只用本地缓存（基准测试使用）
+# 交易日历，首次使用时由本地上证指数推出
+TRADE_CALENDAR_FILE = os.path.join(CACHE_DIR, "trade_calendar.pkl")
+_trade_calendar: TradeCalendar = None
+_calendar_refreshed = False  # 本次运行是否已经联网刷新过日历
+def get_cache_dir() -> str:
+    return CACHE_DIR
+
+def set_offline(offline: bool = True):
+    """打开离线模式后，需要联网的地方都抛出 RuntimeError，由调用方按失败处理"""
+    global _offline
+    _offline = offline
+
+def _check_online(what: str):
+    if _offline:
+        raise RuntimeError(f"离线模式，不{what}")
+
+def get_bar_store() -> BarStore:
+    """延迟打开日线仓库，仓库不存在时一次性导入旧 pkl 缓存"""
+    global _bar_store
+    if _bar_store is None:
+        store = BarStore(BAR_STORE_DIR)
+        if not store.exists():
+            print("首次使用日线仓库，正在从旧的 pkl 缓存迁移...")
+            cnt = store.migrate_from_pickles(CACHE_DIR)
+            print(f"迁移完成，共 {cnt} 只股票")
+        _bar_store = store
+    return _bar_store
+
+def flush_stock_data():
+    """把 load_or_update 中更新过的日线写回仓库"""
+    global _ohlc_universe
+    if _bar_store is not None:
+        _bar_store.flush()
+        _ohlc_universe = None  # 下次访问时按需重建镜像
+
+atexit.register(flush_stock_data)
+
+def get_sh_index(until=None) -> IndexSeries:
+    """
+    延迟加载上证指数。until 晚于本地最后一个交易日且早于当前交易日时，
+    本次运行联网刷新一次；之后不论是否补齐都不再刷新，查询按最近的前一交易日取值。
+    """
+    global _sh_index
+    with _sh_lock:
+        if _sh_index is None:
+            _sh_index = IndexSeries.from_frame(load_or_update("000001", False, ''))
+        if until is not None and not _sh_refreshed:
+            need = min(pd.Timestamp(until), pd.to_datetime(last_trading_day()))
+            if _sh_index.last_date is None or _sh_index.last_date < need:
+                update_sh()
+        return _sh_index
+
+def get_sh_series() -> pd.Series:
+    """延迟加载上证指数日线"""
+    return get_sh_index().series
+
+def update_sh():
+    global _sh_index, _sh_refreshed, _trade_calendar
+    with _sh_lock:
+        _sh_refreshed = True
+        try:
+            df = load_or_update("000001", True, last_trading_day())
+        except Exception as e:
+            print(f"上证指数刷新失败，继续使用本地数据: {e}")
+            return
+        _sh_index = IndexSeries.from_frame(df)
+        _trade_calendar = None  # 下次使用时并入新的指数日期
+
+def _is_trade_time() -> bool:
+    """判断当前是否处于 A 股交易时段（工作日 09:00–15:00）"""
+    now = datetime.datetime.now()
+    if now.weekday() >= 5:          # 周六/周日
+        return False
+    market_open = now.replace(hour=9, minute=0, second=0, microsecond=0)
+    market_close = now.replace(hour=15, minute=0, second=0, microsecond=0)
+    return market_open <= now <= market_close
+
+def _is_today_data(df: pd.DataFrame) -> bool:
+    """文件里的日期列是否为今天"""
+    return (df['日期'].astype(str) == datetime.datetime.now().strftime('%Y-%m-%d')).any()
+
+def get_current_stock_info(update: bool = False):
+    global _curr_all_stock
+
+    # 1. 内存变量有效且无需强制更新 → 直接返回
+    if _curr_all_stock is not None and not update:
+        # 非交易时段：任何缓存都直接用
+        if not _is_trade_time():
+            print("直接使用缓存的实时股票信息")
+            return _curr_all_stock
+        # 交易时段：只要日期是今天也直接用
+        if _is_today_data(_curr_all_stock):
+            return _curr_all_stock
+
+    # 2. 尝试读本地缓存
+    if os.path.exists(_all_stock_file_path):
+        try:
+            local_df = pd.read_pickle(_all_stock_file_path)
+            # 非交易时段：文件是今天的就接受
+            if not _is_trade_time() and _is_today_data(local_df):
+                _curr_all_stock = local_df
+                print("不在交易时间内,实时股票信息从文件读取")
+                return _curr_all_stock
+            # 交易时段：文件是今天的且不要求强制刷新就接受
+            if _is_trade_time() and _is_today_data(local_df) and not update:
+                _curr_all_stock = local_df
+                print("在交易时间内,但不要求更新,实时股票信息从文件读取")
+                return _curr_all_stock
+        except Exception:
+            pass  # 文件损坏就重新拉
+
+    # 3. 走到这里说明必须重新拉取
+    _check_online("获取实时股票信息")
+    print("正在重新获取实时股票信息...")
+    _curr_all_stock = ak.stock_zh_a_spot_em()
+    _curr_all_stock['日期'] = datetime.datetime.now().strftime('%Y-%m-%d')
+
+    os.makedirs(os.path.dirname(_all_stock_file_path), exist_ok=True)
+    _curr_all_stock.to_pickle(_all_stock_file_path)
+    print("实时数据已更新并保存到缓存文件")
+    return _curr_all_stock
+
+def spot_index_of(spot: pd.DataFrame) -> SpotIndex:
+    """快照的代码索引，同一个快照只建一次"""
+    global _spot_index_cache
+    cached_spot, cached_index = _spot_index_cache
+    if cached_spot is not spot:
+        cached_index = SpotIndex(spot)
+        _spot_index_cache = (spot, cached_index)
+    return cached_index
+
+def get_spot_index(update: bool = False) -> SpotIndex:
+    """按代码索引的实时快照"""
+    return spot_index_of(get_current_stock_info(update))
+
+def set_current_stock_info(snapshot: pd.DataFrame):
+    """直接指定实时快照（供多进程子进程沿用父进程已获取的数据）"""
+    global _curr_all_stock
+    _curr_all_stock = snapshot
+
+def worker_state() -> dict:
+    """
+    多进程运行前在父进程里调用：按需联网刷新一次上证指数和交易日历，
+    连同实时快照一起交给子进程（见 use_worker_state），子进程不再各自刷新和写缓存文件。
+    指标缓存由调用方按用到的周期先刷新好（见 strategy.prepare_strategies）。
+    """
+    today = pd.Timestamp.today()
+    sh_index = get_sh_index(today)
+    calendar = get_trade_calendar()
+    if not calendar.covers(today) and not _calendar_refreshed:
+        calendar = refresh_trade_calendar()
+    return {
+        'spot': get_current_stock_info(),
+        'sh_index': sh_index,
+        'calendar': calendar,
+    }
+
+def use_worker_state(state: dict):
+    """子进程初始化：直接使用父进程准备好的快照、上证指数和交易日历，并进入离线模式"""
+    global _sh_index, _sh_refreshed, _trade_calendar, _calendar_refreshed
+    set_current_stock_info(state['spot'])
+    with _sh_lock:
+        _sh_index = state['sh_index']
+        _sh_refreshed = True
+    _trade_calendar = state['calendar']
+    _calendar_refreshed = True
+    set_offline(True)
+
+def _is_today_data(data: pd.DataFrame) -> bool:
+    # 获取数据中的最新日期
+    if '日期' not in data.columns:
+        return False  # 如果没有日期列，返回 False
+    latest_date = data['日期'].max()
+    # 检查是否为当天日期
+    return latest_date == datetime.datetime.now().strftime('%Y-%m-%d')
+
+def _local_path(code: str) -> str:
+    return os.path.join(CACHE_DIR, f"{code}.pkl")
+
+def get_trade_calendar() -> TradeCalendar:
+    """延迟加载交易日历，并入本地上证指数里出现过的交易日"""
+    global _trade_calendar
+    if _trade_calendar is None:
+        cal = TradeCalendar.load(TRADE_CALENDAR_FILE) or TradeCalendar()
+        sh_path = _local_path("sh_index")
+        if os.path.exists(sh_path):
+            merged = cal.merge(pd.read_pickle(sh_path)['日期'])
+            if len(merged) != len(cal) or merged.known_until != cal.known_until:
+                merged.save(TRADE_CALENDAR_FILE)
+            cal = merged
+        _trade_calendar = cal
+    return _trade_calendar
+
+def refresh_trade_calendar() -> TradeCalendar:
+    """用交易所日历刷新（含本年剩余交易日），失败时保留原日历"""
+    global _trade_calendar, _calendar_refreshed
+    _calendar_refreshed = True
+    cal = get_trade_calendar()
+    try:
+        _check_online("刷新交易日历")
+        df = ak.tool_trade_date_hist_sina()
+        cal = cal.merge(pd.to_datetime(df['trade_date']))
+        cal.save(TRADE_CALENDAR_FILE)
+        _trade_calendar = cal
+    except Exception as e:
+        print(f"交易日历刷新失败，继续使用本地日历: {e}")
+    return cal
+
+def last_trading_day(date: str = None) -> str:
+    # 如果没有传入日期，则使用当前日期
+    if date is None:
+        dt = pd.Timestamp.today()
+    else:
+        dt = pd.to_datetime(date, format="%Y%m%d")
+
+    # 如果当前时间是下午3点之前，回退到上一个交易日
+    if dt.hour < 15 and date is None:  # 只有使用当前日期时才考虑小时
+        dt -= pd.Timedelta(days=1)
+
+    # 周末和节假日回退到之前最近的交易日；日历覆盖不到的日期只跳过周末
+    return get_trade_calendar().last_on_or_before(dt).strftime("%Y%m%d")
+
+def stale_ranges(codes: List[str], update_day: str = None) -> Dict[str, Tuple[str, str]]:
+    """
+    本地日线落后于 update_day 对应交易日的股票 → 需要下载的 (起始日, 结束日)。
+    只读日线清单，不加载日线本身，也不联网（日历需要刷新时除外）。
+    """
+    day = pd.to_datetime(update_day, format="%Y%m%d") if update_day else pd.Timestamp.today()
+    if not get_trade_calendar().covers(day) and not _calendar_refreshed:
+        # 日历没覆盖到更新日，本次运行刷新一次，避免把节假日当成交易日
+        refresh_trade_calendar()
+    target = pd.to_datetime(last_trading_day(update_day or None))
+    end_str = target.strftime("%Y%m%d")
+    # 没有数据的股票从 START_DATE 起下载
+    first = pd.to_datetime(START_DATE) - pd.Timedelta(days=1)
+    ranges = {}
+    for code, last in zip(codes, get_bar_store().last_dates(codes)):
+        last_date = first if np.isnat(last) else pd.Timestamp(last)
+        if target.date() > last_date.date():
+            ranges[code] = ((last_date + pd.Timedelta(days=1)).strftime("%Y%m%d"), end_str)
+    return ranges
+
+def stale_codes(codes: List[str], update_day: str = None) -> List[str]:
+    """确实需要下载的股票，顺序不变"""
+    return list(stale_ranges(codes, update_day))
+
+def load_or_update_stock_code_name_dict(update: bool = False, ak_spot = None):
+    global _stock_code_name_dict
+    if update is False and os.path.exists(STOCK_CODE_NAME_DICT_FILE):
+        # 如果文件存在，直接加载
+        print("加载本地股票代码与名称字典库文件...")
+        _stock_code_name_dict = pd.read_pickle(STOCK_CODE_NAME_DICT_FILE)
+    else:
+        print("本地股票代码与名称字典库文件不存在，正在获取最新数据...")
+        if ak_spot is None:
+            spot = get_current_stock_info()
+        else:
+            spot = ak_spot
+        spot = spot[spot['代码'].str.fullmatch(r'\d{6}')]  # 确保代码是6位数字
+
+        # 提取股票代码和名称
+        codes = spot['代码'].str.zfill(6).tolist()
+        names = spot.set_index('代码')['名称'].to_dict()
+
+        # 保存到全局变量和文件
+        _stock_code_name_dict = pd.Series(names, name="股票名称")
+        _stock_code_name_dict.to_pickle(STOCK_CODE_NAME_DICT_FILE)
+        print("股票代码与名称字典库文件已保存到本地。")
+
+#更新个股信息,update为True才更新
+def load_or_update(code: str, update: bool, update_day: str) -> pd.DataFrame:
+    # 加载或更新股票代码与名称字典库文件
+    if _stock_code_name_dict is None:
+        load_or_update_stock_code_name_dict()
+
+    # 新增：上证指数 000001 的缓存
+    if code == "000001":
+        pkl_path = _local_path("sh_index")
+        if os.path.exists(pkl_path):
+            df_idx = pd.read_pickle(pkl_path)
+            # 要求更新且本地落后于最近交易日时才重新拉取
+            if not update or df_idx['日期'].max() >= pd.to_datetime(last_trading_day(update_day or None)):
+                return df_idx
+
+        _check_online("下载上证指数")
+        df_idx = ak.stock_zh_index_daily(symbol="sh000001")
+        df_idx['日期'] = pd.to_datetime(df_idx['date'])
+        df_idx = df_idx.rename(columns={'close': '收盘'})
+        # 补齐缺失列
+        df_idx['开盘'] = df_idx['收盘']  # 指数没有开高低，用收盘填充
+        df_idx['最高'] = df_idx['收盘']
+        df_idx['最低'] = df_idx['收盘']
+        df_idx = df_idx[['日期', '开盘', '最高', '最低', '收盘']]
+        # 先写临时文件再替换，其他进程读到的要么是旧文件要么是完整的新文件
+        tmp = pkl_path + ".tmp"
+        df_idx.to_pickle(tmp)
+        os.replace(tmp, pkl_path)
+        return df_idx
+
+    # 是否需要更新只看日线清单，确实落后时才读取本地日线并下载缺失区间
+    store = get_bar_store()
+    if update :
+        span = stale_ranges([code], update_day).get(code)
+        if span is not None:
+            start_str, end_str = span
+            _check_online(f"下载 {code} 日线")
+            print('{} need update, start:{}, end{}'.format(code, start_str, end_str))
+            df_new = call_with_retry(ak.stock_zh_a_hist,
+                                     limiter=_hist_limiter,
+                                     retries=HIST_RETRIES,
+                                     symbol=code,
+                                     period="daily",
+                                     start_date=start_str,
+                                     end_date=end_str,
+                                     adjust=ADJUST)
+            if not df_new.empty:
+                df_new['日期'] = pd.to_datetime(df_new['日期'])
+                # 只追加新行，由 flush_stock_data() 写到追加段末尾，按日期去重
+                store.append(code, df_new)
+    return store.get(code)
+
+def stock_name(code: str) -> str:
+    if _stock_code_name_dict is None:
+        load_or_update_stock_code_name_dict()
+    if _stock_code_name_dict is None:
+        load_or_update_stock_code_name_dict(update=True)
+    if _stock_code_name_dict is None:
+        return None
+    if code in _stock_code_name_dict:
+        return _stock_code_name_dict[code]
+    else:
+        return None
+
+def get_all_stock_from_cache() -> Tuple[List[str], Dict[str, str]]:
+    import warnings
+    warnings.filterwarnings("ignore", category=FutureWarning)
+    '''
+    codes = ['002415', '600012']
+    names = ['海康威视', '皖通高速']
+    '''
+    codes, names = [], {}
+
+    if _stock_code_name_dict is None:
+        load_or_update_stock_code_name_dict()
+
+    for code in get_bar_store().codes():
+        codes.append(code)
+        if code in _stock_code_name_dict.index:
+            names[code] = _stock_code_name_dict[code]
+
+    return codes, names
+
+def get_all_stock() -> Tuple[List[str], Dict[str, str]]:
+    spot = get_current_stock_info()
+
+    _check_online("获取退市股票列表")
+    sh_delist = ak.stock_info_sh_delist()
+    delist_codes = set(sh_delist['公司代码'].astype(str).str.zfill(6))
+
+    spot = spot[~spot['代码'].isin(delist_codes)]
+
+    # 增强退市股票过滤条件
+    delisting_keywords = ['退市', '退', 'DELIST', '终止上市']
+    delisting_pattern = '|'.join(delisting_keywords)
+
+    spot = spot[~spot['名称'].str.contains(delisting_pattern, na=False, case=False)]
+
+    if '退市整理' in spot.columns or 'delisting_status' in spot.columns:
+        status_col = '退市整理' if '退市整理' in spot.columns else 'delisting_status'
+        spot = spot[spot[status_col] != 1]  # 假设1表示退市状态
+
+    #spot = spot[~spot['名称'].str.startswith('退市', na=False)]
+
+    spot = spot[spot['代码'].str.fullmatch(r'\d{6}')]
+    spot = spot[~spot['名称'].str.contains('ST', na=False)]
+    spot = spot[~spot['代码'].str.startswith(('30', '81', '83', '87', '43', '688', '689', '9'))]
+    #spot = spot[~spot['名称'].str.contains('指数', na=False)]
+    # 只排除名称含“指数”且代码不是 000001 的行
+    spot = spot[~(spot['名称'].str.contains('指数', na=False) & (spot['代码'] != '000001'))]
+
+    # 剔除常见指数代码
+    index_codes = {
+        '000300', '000905', '399001',
+        '399006', '399101', '399102',
+        '399106', '399300', '399905'
+    }
+    spot = spot[~spot['代码'].isin(index_codes)]
+
+    '''
+    pe_col = next((c for c in spot.columns
+                   if '市盈率' in str(c) or str(c).upper() == 'PE'), None)
+    if pe_col is None:
+        raise RuntimeError("找不到市盈率字段")
+    spot = spot[spot[pe_col].notna() & spot[pe_col].between(pe_low, pe_high)]
+    '''
+
+    load_or_update_stock_code_name_dict(update=True, ak_spot=spot)
+
+    codes = spot['代码'].str.zfill(6).tolist()
+    names = spot.set_index('代码')['名称'].to_dict()
+    return codes, names
+
+def get_stock_data(backing: str = "frame") -> Dict[str, pd.DataFrame]:
+    """
+    backing="frame": 全部股票的完整 DataFrame 常驻内存
+    backing="mmap":  只含 日期/开盘/最高/最低/收盘 的内存映射后端，按需构造 DataFrame
+    """
+    global _global_stock_data_dict, _ohlc_universe
+    if backing == "mmap":
+        if _ohlc_universe is None:
+            _ohlc_universe = open_ohlc_universe(get_bar_store())
+        return _ohlc_universe
+    if _global_stock_data_dict is None:
+        # 一次读取整个仓库，再按代码切片还原
+        _global_stock_data_dict = get_bar_store().load_all()
+    return _global_stock_data_dict
@@ -0,0 +1,305 @@
+import importlib
+import numpy as np
+import pandas as pd
+from collections import Counter
+from collections.abc import Mapping
+from typing import Callable, Dict, List, Sequence, Tuple
+from view.policy.stock import get_spot_index, get_sh_index, BOLL_WINDOW
+from view.policy.spot_index import SpotIndex
+from view.policy.indicator_cache import BAR_FIELDS, get_indicator_cache
+from view.policy.indicators import macd
+
+# 策略插件：策略声明自己用到的特征（日线、周期线和布林带、上证指数……），给出回测交易或监测结果。
+# 同一次任务里多个策略扫过全市场时，特征由 FeatureCache 按 (代码, 特征, 参数) 只算一次、各策略共用；
+# 处理完一只股票就释放它的特征。策略用 @register_strategy 注册，回测/监测页面可以选择任意已注册的策略。
+#
+# 参数 params 与回测/监测页面的输入一致：
+#   policySelect, sellPos, upperBreak, period_s, period_e, sh_min, sh_max,
+#   marketValMin, marketValMax, peRatioMin, peRatioMax
+# 市值/市盈率由运行器在读取日线之前统一过滤；上证区间由策略自己按买入日判断。
+
+BUILTIN_MODULES = ['view.policy.builtin_strategies']
+ALL_STRATEGIES = ''     # 界面上「全部策略」的取值
+
+FeatureReq = Tuple[str, dict]   # (特征名, 参数)
+
+
+# ---------- 特征 ----------
+
+class _Feature:
+    def __init__(self, func: Callable, prepare: Callable = None):
+        self.func = func
+        self.prepare = prepare
+
+
+_FEATURES: Dict[str, _Feature] = {}
+
+
+def register_feature(name: str, prepare: Callable = None):
+    """
+    注册特征 func(cache, code, **params)。
+    prepare(stock_data, codes, **params) 可选，在逐只计算之前对整批股票调用一次（如刷新指标缓存）。
+    """
+    def wrap(func):
+        _FEATURES[name] = _Feature(func, prepare)
+        return func
+    return wrap
+
+
+class FeatureCache:
+    """一次任务内的特征缓存，computed/hits 记录各特征的计算和复用次数"""
+
+    def __init__(self, stock_data: Mapping):
+        self.stock_data = stock_data
+        self._values: Dict[Tuple[str, str, tuple], object] = {}
+        self.computed: Counter = Counter()
+        self.hits: Counter = Counter()
+
+    def get(self, code: str, name: str, **params):
+        key = (code, name, tuple(sorted(params.items())))
+        if key in self._values:
+            self.hits[name] += 1
+            return self._values[key]
+        value = _FEATURES[name].func(self, code, **params)
+        self.computed[name] += 1
+        self._values[key] = value
+        return value
+
+    def view(self, code: str) -> 'CodeFeatures':
+        return CodeFeatures(self, code)
+
+    def release(self, code: str):
+        """丢弃 code 的全部特征"""
+        for key in [k for k in self._values if k[0] == code]:
+            del self._values[key]
+
+
+class CodeFeatures:
+    """绑定到一只股票的特征访问入口"""
+
+    def __init__(self, cache: FeatureCache, code: str):
+        self.cache = cache
+        self.code = code
+
+    def get(self, name: str, **params):
+        return self.cache.get(self.code, name, **params)
+
+
+def prepare_features(stock_data: Mapping, codes: List[str], reqs: Sequence[FeatureReq]):
+    """对需要整批预处理的特征各调用一次 prepare"""
+    seen = set()
+    for name, params in reqs:
+        key = (name, tuple(sorted(params.items())))
+        feature = _FEATURES[name]
+        if key in seen or feature.prepare is None:
+            continue
+        seen.add(key)
+        feature.prepare(stock_data, codes, **params)
+
+
+@register_feature('daily')
+def _daily(cache: FeatureCache, code: str) -> pd.DataFrame:
+    """按日期排序的日线（日期/开盘/最高/最低/收盘），索引从 0 开始"""
+    df = cache.stock_data[code]
+    return df[BAR_FIELDS].sort_values('日期', kind='mergesort').reset_index(drop=True)
+
+
+def _refresh_bands(stock_data: Mapping, codes: List[str], policySelect: int, window: int = BOLL_WINDOW):
+    get_indicator_cache(policySelect, window).refresh(stock_data, codes)
+
+
+@register_feature('periods', prepare=_refresh_bands)
+def _periods(cache: FeatureCache, code: str, policySelect: int, window: int = BOLL_WINDOW) -> pd.DataFrame:
+    """合成后的周期线及布林带/突破标记，取自指标缓存（与 build_policy_df 的结果相同）"""
+    return get_indicator_cache(policySelect, window).frame(code)
+
+
+@register_feature('sh_close')
+def _sh_close(cache: FeatureCache, code: str) -> np.ndarray:
+    """每根日线当天的上证指数收盘价"""
+    days = cache.get(code, 'daily')['日期'].to_numpy()
+    return get_sh_index(days[-1] if len(days) else None).asof_many(days)
+
+
+@register_feature('macd')
+def _macd(cache: FeatureCache, code: str, policySelect: int,
+          fast: int = 12, slow: int = 26, signal: int = 9) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """周期线收盘价的 (DIF, DEA, 柱)"""
+    return macd(cache.get(code, 'periods', policySelect=policySelect)['收盘'].to_numpy(), fast, slow, signal)
+
+
+# ---------- 策略 ----------
+
+class Strategy:
+    """策略基类：子类给出 name/title，实现 requires() 和 backtest()/scan()"""
+
+    name: str = ''      # 注册名
+    title: str = ''     # 界面显示的名称
+
+    def requires(self, params: dict) -> List[FeatureReq]:
+        """本次参数下用到的特征，运行器据此预处理"""
+        return []
+
+    def backtest(self, code: str, features: CodeFeatures, spot: SpotIndex, params: dict) -> List[dict]:
+        """单只股票的交易记录，字段与 extract_reverse_trades 相同"""
+        raise NotImplementedError
+
+    def scan(self, code: str, features: CodeFeatures, spot: SpotIndex, params: dict) -> dict:
+        """单只股票当前是否满足买入条件，满足时返回一行（代码/名称/市值/市盈率/日期/价格），否则 None"""
+        return None
+
+    def backtest_universe(self, stock_data: Mapping, codes: List[str], params: dict,
+                          on_trades: Callable[[pd.DataFrame], None] = None,
+                          on_progress: Callable[[int], None] = None,
+                          is_cancelled: Callable[[], bool] = None) -> pd.DataFrame:
+        """对一批股票回测，有整批算法的策略可以覆盖"""
+        return run_backtest([self], stock_data, codes, params, on_trades, on_progress, is_cancelled)
+
+    def scan_universe(self, stock_data: Mapping, spot: SpotIndex, codes: List[str], params: dict) -> pd.DataFrame:
+        """对一批股票监测，有整批算法的策略可以覆盖"""
+        return run_scan([self], stock_data, codes, params)
+
+
+_STRATEGIES: Dict[str, Strategy] = {}
+_builtins_loaded = False
+
+
+def register_strategy(cls):
+    """类装饰器：实例化并按 name 注册"""
+    _STRATEGIES[cls.name] = cls()
+    return cls
+
+
+def _load_builtins():
+    global _builtins_loaded
+    if not _builtins_loaded:
+        _builtins_loaded = True
+        for module in BUILTIN_MODULES:
+            importlib.import_module(module)
+
+
+def get_strategy(name: str) -> Strategy:
+    _load_builtins()
+    return _STRATEGIES[name]
+
+
+def list_strategies() -> List[Strategy]:
+    """按注册顺序排列的全部策略"""
+    _load_builtins()
+    return list(_STRATEGIES.values())
+
+
+def select_strategies(name: str) -> List[Strategy]:
+    """界面选择 → 策略列表，ALL_STRATEGIES 表示全部"""
+    return list_strategies() if name == ALL_STRATEGIES else [get_strategy(name)]
+
+
+# ---------- 运行器 ----------
+
+def _requirements(strategies: Sequence[Strategy], params: dict) -> List[FeatureReq]:
+    return [req for s in strategies for req in s.requires(params)]
+
+
+def _run(strategies: Sequence[Strategy],
+         stock_data: Mapping,
+         codes: List[str],
+         params: dict,
+         keep_nan: bool,
+         step: Callable[[Strategy, str, CodeFeatures, SpotIndex], List[dict]],
+         on_rows: Callable[[pd.DataFrame], None] = None,
+         on_progress: Callable[[int], None] = None,
+         is_cancelled: Callable[[], bool] = None,
+         prepare: bool = True,
+         cache: FeatureCache = None) -> pd.DataFrame:
+    spot = get_spot_index()
+    kept = spot.filter_codes(codes, params['marketValMin'], params['marketValMax'],
+                             params['peRatioMin'], params['peRatioMax'], keep_nan=keep_nan)
+    kept = [code for code in kept if code in stock_data]
+    if prepare:
+        prepare_features(stock_data, kept, _requirements(strategies, params))
+    cache = cache if cache is not None else FeatureCache(stock_data)
+
+    frames = []
+    total = max(1, len(kept))
+    for i, code in enumerate(kept):
+        if is_cancelled is not None and is_cancelled():
+            break
+        features = cache.view(code)
+        rows = []
+        for s in strategies:
+            rows += [dict(row, 策略=s.title) for row in step(s, code, features, spot)]
+        cache.release(code)
+        if rows:
+            df = pd.DataFrame(rows)
+            frames.append(df)
+            if on_rows is not None:
+                on_rows(df)
+        if on_progress is not None:
+            on_progress(int((i + 1) * 100 / total))
+    if not frames:
+        return pd.DataFrame()
+    return pd.concat(frames, ignore_index=True)
+
+
+def run_backtest(strategies: Sequence[Strategy],
+                 stock_data: Mapping,
+                 codes: List[str],
+                 params: dict,
+                 on_trades: Callable[[pd.DataFrame], None] = None,
+                 on_progress: Callable[[int], None] = None,
+                 is_cancelled: Callable[[], bool] = None,
+                 prepare: bool = True,
+                 cache: FeatureCache = None) -> pd.DataFrame:
+    """逐只股票依次运行各策略的回测，特征共用；结果多一列 '策略'。市值/市盈率缺失视为通过"""
+    def step(s, code, features, spot):
+        return s.backtest(code, features, spot, params)
+    return _run(strategies, stock_data, codes, params, True, step, on_trades, on_progress, is_cancelled,
+                prepare, cache)
+
+
+def run_scan(strategies: Sequence[Strategy],
+             stock_data: Mapping,
+             codes: List[str],
+             params: dict,
+             on_found: Callable[[pd.DataFrame], None] = None,
+             on_progress: Callable[[int], None] = None,
+             is_cancelled: Callable[[], bool] = None,
+             prepare: bool = True,
+             cache: FeatureCache = None) -> pd.DataFrame:
+    """逐只股票依次运行各策略的监测，特征共用；结果多一列 '策略'。市值/市盈率缺失视为不通过"""
+    def step(s, code, features, spot):
+        row = s.scan(code, features, spot, params)
+        return [row] if row is not None else []
+    return _run(strategies, stock_data, codes, params, False, step, on_found, on_progress, is_cancelled,
+                prepare, cache)
+
+
+def backtest_strategies(strategies: Sequence[Strategy],
+                        stock_data: Mapping,
+                        codes: List[str],
+                        params: dict,
+                        on_trades: Callable[[pd.DataFrame], None] = None,
+                        on_progress: Callable[[int], None] = None,
+                        is_cancelled: Callable[[], bool] = None) -> pd.DataFrame:
+    """单个策略走它自己的整批算法，多个策略逐只共用特征"""
+    if len(strategies) == 1:
+        return strategies[0].backtest_universe(stock_data, codes, params, on_trades, on_progress, is_cancelled)
+    return run_backtest(strategies, stock_data, codes, params, on_trades, on_progress, is_cancelled)
+
+
+def scan_strategies(strategies: Sequence[Strategy],
+                    stock_data: Mapping,
+                    spot: SpotIndex,
+                    codes: List[str],
+                    params: dict,
+                    on_progress: Callable[[int], None] = None,
+                    is_cancelled: Callable[[], bool] = None) -> pd.DataFrame:
+    """单个策略走它自己的整批算法，多个策略逐只共用特征"""
+    if len(strategies) == 1:
+        return strategies[0].scan_universe(stock_data, spot, codes, params)
+    return run_scan(strategies, stock_data, codes, params, on_progress=on_progress, is_cancelled=is_cancelled)
+
+
+def prepare_strategies(strategies: Sequence[Strategy], stock_data: Mapping, codes: List[str], params: dict):
+    """多进程运行前在主进程里做好特征预处理，子进程只读"""
+    prepare_features(stock_data, codes, _requirements(strategies, params))
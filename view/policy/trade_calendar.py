@@ -0,0 +1,98 @@
+import os
+import numpy as np
+import pandas as pd
+from typing import Iterable
+
+# 交易日历：已知交易日的有序数组，覆盖到 known_until 为止。
+# 覆盖范围内按实际交易日判断（节假日不是交易日），范围之外退回「周一到周五」的旧规则。
+# 日历最初由本地上证指数日线的日期推出，可以用交易所日历刷新（包含本年剩余的交易日）。
+
+CALENDAR_VERSION = 1
+
+
+def _day(date) -> np.datetime64:
+    return np.datetime64(pd.Timestamp(date).date(), 'D')
+
+
+def _is_weekday(day: np.datetime64) -> bool:
+    return bool(np.is_busday(day))
+
+
+class TradeCalendar:
+    """按日判断是否交易日"""
+
+    def __init__(self, days: Iterable = (), known_until=None):
+        self.days = np.unique(np.asarray([_day(d) for d in days], dtype='datetime64[D]'))
+        if known_until is None:
+            known_until = self.days[-1] if len(self.days) else None
+        self.known_until = _day(known_until) if known_until is not None else None
+
+    def __len__(self) -> int:
+        return len(self.days)
+
+    def covers(self, date) -> bool:
+        """date 是否落在日历已知的范围内"""
+        if self.known_until is None or not len(self.days):
+            return False
+        day = _day(date)
+        return self.days[0] <= day <= self.known_until
+
+    def is_trading_day(self, date) -> bool:
+        day = _day(date)
+        if not self.covers(day):
+            return _is_weekday(day)
+        i = np.searchsorted(self.days, day)
+        return i < len(self.days) and self.days[i] == day
+
+    def last_on_or_before(self, date) -> pd.Timestamp:
+        """不晚于 date 的最近一个交易日"""
+        day = _day(date)
+        # 超出已知范围的部分按工作日回退，回退进范围后查表
+        while not self.covers(day) and not _is_weekday(day):
+            day -= np.timedelta64(1, 'D')
+        if self.covers(day):
+            i = np.searchsorted(self.days, day, side='right')
+            if i > 0:
+                day = self.days[i - 1]
+        return pd.Timestamp(day)
+
+    def has_trading_day(self, after, until) -> bool:
+        """(after, until] 之间是否有交易日"""
+        start, end = _day(after) + np.timedelta64(1, 'D'), _day(until)
+        while start <= end:
+            if self.covers(start):
+                i = np.searchsorted(self.days, start)
+                if i < len(self.days) and self.days[i] <= min(end, self.known_until):
+                    return True
+                start = self.known_until + np.timedelta64(1, 'D')
+                continue
+            if _is_weekday(start):
+                return True
+            start += np.timedelta64(1, 'D')
+        return False
+
+    def merge(self, days: Iterable, known_until=None) -> 'TradeCalendar':
+        """并入另一份交易日列表，已知范围取两者较晚的一个"""
+        other = TradeCalendar(days, known_until)
+        ends = [d for d in (self.known_until, other.known_until) if d is not None]
+        return TradeCalendar(np.concatenate([self.days, other.days]), max(ends) if ends else None)
+
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = path + ".tmp"
+        pd.to_pickle({'version': CALENDAR_VERSION, 'days': self.days, 'known_until': self.known_until}, tmp)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> 'TradeCalendar':
+        """读取日历文件，不存在或版本不符时返回 None"""
+        if not os.path.exists(path):
+            return None
+        try:
+            data = pd.read_pickle(path)
+        except Exception as e:
+            print(f"交易日历读取失败: {e}")
+            return None
+        if data.get('version') != CALENDAR_VERSION:
+            return None
+        return cls(data['days'], data['known_until'])
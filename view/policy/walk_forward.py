@@ -0,0 +1,107 @@
+import numpy as np
+import pandas as pd
+from typing import List, NamedTuple, Sequence, Tuple
+from view.policy.spot_index import SpotIndex
+from view.policy.param_sweep import (SweepCombo, TradeKey, combo_trades, trade_stats, combo_labels,
+                                     group_trades)
+
+# 滚动（walk-forward）验证：把回测区间切成一串 样本内/样本外 窗口，
+# 每个窗口在样本内挑出日收益率最高的一组参数，再记录这组参数在紧随其后的样本外区间的表现。
+# 所有窗口的所有区间由 sweep_trades 一次撮合（日线和布林带只准备一次），
+# 这里只负责切窗口和从撮合结果里选参数、汇总。
+
+DATE_FORMAT = "%Y-%m-%d"
+STAT_NAMES = ['交易次数', '平均收益率', '平均持有天数', '日收益率']
+REPORT_COLUMNS = (['样本内', '样本外', '周期', '卖出位置', '突破上轨', '上证区间', '市值区间', '市盈率区间']
+                  + [f'样本内{k}' for k in STAT_NAMES] + [f'样本外{k}' for k in STAT_NAMES])
+
+
+class WalkWindow(NamedTuple):
+    """一个滚动窗口，日期均为闭区间"""
+    in_s: str
+    in_e: str
+    out_s: str
+    out_e: str
+
+
+def walk_forward_windows(period_s: str,
+                         period_e: str,
+                         in_months: int,
+                         out_months: int,
+                         step_months: int = None) -> List[WalkWindow]:
+    """
+    从 period_s 起，样本内 in_months 个月、样本外紧接其后 out_months 个月，
+    每次向后滚动 step_months 个月（默认等于样本外长度，样本外区间首尾相接）。
+    样本外起点不早于 period_e 时停止，最后一个样本外区间截止到 period_e。
+    """
+    if in_months <= 0 or out_months <= 0:
+        raise ValueError("样本内/样本外月数必须大于 0")
+    step = pd.DateOffset(months=step_months or out_months)
+    start = pd.to_datetime(period_s)
+    end = pd.to_datetime(period_e) if period_e else pd.Timestamp.today().normalize()
+    one_day = pd.Timedelta(days=1)
+    windows = []
+    while True:
+        out_s = start + pd.DateOffset(months=in_months)
+        if out_s >= end:
+            break
+        out_e = min(out_s + pd.DateOffset(months=out_months) - one_day, end)
+        windows.append(WalkWindow(start.strftime(DATE_FORMAT), (out_s - one_day).strftime(DATE_FORMAT),
+                                  out_s.strftime(DATE_FORMAT), out_e.strftime(DATE_FORMAT)))
+        start += step
+    return windows
+
+
+def window_periods(windows: Sequence[WalkWindow]) -> List[Tuple[str, str]]:
+    """sweep_trades 的区间列表：第 i 个窗口的样本内为 2i，样本外为 2i + 1"""
+    periods = []
+    for w in windows:
+        periods += [(w.in_s, w.in_e), (w.out_s, w.out_e)]
+    return periods
+
+
+def best_combo(combos: Sequence[SweepCombo],
+               key_index: dict,
+               groups: dict,
+               spot: SpotIndex,
+               min_trades: int = 1) -> Tuple[SweepCombo, dict]:
+    """日收益率最高且交易次数不少于 min_trades 的组合，同分取靠前的；都不满足返回 (None, None)"""
+    best, best_stats = None, None
+    for c in combos:
+        stats = trade_stats(combo_trades(c, key_index, groups, spot))
+        if stats['交易次数'] < min_trades or np.isnan(stats['日收益率']):
+            continue
+        if best_stats is None or stats['日收益率'] > best_stats['日收益率']:
+            best, best_stats = c, stats
+    return best, best_stats
+
+
+def walk_forward_report(windows: Sequence[WalkWindow],
+                        combos: Sequence[SweepCombo],
+                        keys: Sequence[TradeKey],
+                        trades: pd.DataFrame,
+                        spot: SpotIndex,
+                        min_trades: int = 1) -> Tuple[pd.DataFrame, dict]:
+    """
+    trades 为 sweep_trades(periods=window_periods(windows)) 的结果。
+    返回 (每个窗口一行的结果表, 全部样本外交易合并后的统计)。
+    """
+    key_index = {key: k for k, key in enumerate(keys)}
+    rows = []
+    out_trades = []
+    for i, w in enumerate(windows):
+        row = {'样本内': f'{w.in_s}~{w.in_e}', '样本外': f'{w.out_s}~{w.out_e}'}
+        combo, in_stats = best_combo(combos, key_index, group_trades(trades, 2 * i), spot, min_trades)
+        if combo is None:
+            rows.append(row)
+            continue
+        t = combo_trades(combo, key_index, group_trades(trades, 2 * i + 1), spot)
+        if t is not None and not t.empty:
+            out_trades.append(t)
+        out_stats = trade_stats(t)
+        row.update(combo_labels(combo))
+        row.update({f'样本内{k}': v for k, v in in_stats.items()})
+        row.update({f'样本外{k}': v for k, v in out_stats.items()})
+        rows.append(row)
+    total = trade_stats(pd.concat(out_trades, ignore_index=True) if out_trades else None)
+    return pd.DataFrame(rows, columns=REPORT_COLUMNS), total
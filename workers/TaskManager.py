@@ -1,25 +1,160 @@
+import time
+import heapq
+import inspect
+import itertools
+import threading
+from typing import Callable, Dict, List
 from PySide6.QtCore import QRunnable, QObject, QThreadPool, Qt, Signal
 
+MAX_THREADS = 4  # 线程池上限，各队列的并发数之和超出时多余任务在线程池内排队
+# (队列名, 并发数, 允许排队的任务数)；排队数为 0 时队列忙就直接拒绝，与原来的行为一致
+DEFAULT_QUEUES = [
+    ('default', 1, 0),
+    ('data', 1, 1),        # 日线下载/加载，加载时可再排一个更新
+    ('backtest', 1, 0),    # 回测
+    ('scan', 1, 0),        # 布林监测
+]
+
 
 class TaskSignals(QObject):
+    started = Signal()
     finished = Signal(object)
     error = Signal(str)
+    cancelled = Signal()           # 排队期间被取消，任务不会运行，也不会再发 finished/error
+    progress = Signal(int, float)  # 百分比，预计剩余秒数（未知为 -1）
+
+
+class BatchChannel:
+    """
+    工作线程 → 界面的批量通道：结果先在工作线程里累积，
+    攒够 max_items 条或距上次发送超过 interval 秒时才合并成一次 emit。
+    任务结束时必须 close()（或用 with），把剩余结果发出去。
+    """
+
+    def __init__(self, emit: Callable, combine: Callable[[List], object] = None,
+                 max_items: int = 200, interval: float = 0.2):
+        self._emit = emit
+        self._combine = combine or (lambda items: items)
+        self.max_items = max_items
+        self.interval = interval
+        self._items = []
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def put(self, item):
+        with self._lock:
+            self._items.append(item)
+            due = len(self._items) >= self.max_items or time.monotonic() - self._last >= self.interval
+        if due:
+            self.flush()
+
+    def poll(self):
+        """没有新结果时也按时间把积压的结果发出去，可在进度回调里调用"""
+        with self._lock:
+            due = self._items and time.monotonic() - self._last >= self.interval
+        if due:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            items, self._items = self._items, []
+            self._last = time.monotonic()
+        if items:
+            self._emit(self._combine(items))
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class ProgressThrottle:
+    """进度节流：只在整数百分比变化且距上次发送超过 interval 秒时 emit，0 和 100 总是发送"""
+
+    def __init__(self, emit: Callable[[int], None], interval: float = 0.1):
+        self._emit = emit
+        self.interval = interval
+        self._value = None
+        self._last = 0.0
+        self._lock = threading.Lock()
+
+    def __call__(self, progress):
+        value = int(progress)
+        now = time.monotonic()
+        with self._lock:
+            if value == self._value:
+                return
+            if value not in (0, 100) and now - self._last < self.interval:
+                return
+            self._value = value
+            self._last = now
+        self._emit(value)
+
+
+class CancelToken:
+    """
+    协作式取消和进度上报。任务函数声明了 token 参数时由 TaskManager 传入，
+    长循环里检查 is_cancelled()，用 report(百分比) 上报进度，ETA 按已用时间线性估算。
+    """
+
+    def __init__(self, signals: TaskSignals = None):
+        self._event = threading.Event()
+        self._signals = signals
+        self._started = None
+        self._throttle = ProgressThrottle(self._emit_progress)
+
+    def cancel(self):
+        self._event.set()
+
+    def is_cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def start(self):
+        self._started = time.monotonic()
+
+    def report(self, progress):
+        self._throttle(progress)
+
+    def _emit_progress(self, value: int):
+        eta = -1.0
+        if self._started is not None and 0 < value < 100:
+            eta = (time.monotonic() - self._started) * (100 - value) / value
+        if self._signals is not None:
+            self._signals.progress.emit(value, eta)
+
+
+def _accepts_token(func) -> bool:
+    try:
+        return 'token' in inspect.signature(func).parameters
+    except (TypeError, ValueError):
+        return False
 
 
 class TaskRunnable(QRunnable):
 
-    def __init__(self, func, args=(), kwargs={}):
+    def __init__(self, func, args=(), kwargs={}, signals: TaskSignals = None, token: CancelToken = None):
         super().__init__()
         self.func = func
         self.args = args
         self.kwargs = kwargs
-        self.signals = TaskSignals()
+        self.signals = signals or TaskSignals()
+        self.token = token
         self.setAutoDelete(True)
 
     def run(self):
         try:
-            if self.kwargs != {}:
-                result = self.func(*self.args, **self.kwargs)
+            kwargs = self.kwargs
+            self.signals.started.emit()
+            if self.token is not None:
+                self.token.start()
+                if _accepts_token(self.func):
+                    kwargs = dict(kwargs, token=self.token)
+            if kwargs != {}:
+                result = self.func(*self.args, **kwargs)
             else:
                 result = self.func(*self.args)
             self.signals.finished.emit(result)
@@ -29,13 +164,51 @@ class TaskRunnable(QRunnable):
             self.signals.error.emit(str(e))
 
 
+class TaskHandle:
+    """submit_task 的返回值，用于取消任务或查询状态"""
+
+    def __init__(self, func, args, kwargs, queue: str, priority: int):
+        self.queue = queue
+        self.priority = priority
+        self.signals = TaskSignals()
+        self.token = CancelToken(self.signals)
+        self.runnable = TaskRunnable(func, args, kwargs, self.signals, self.token)
+        self.started = False
+        self.done = False
+
+    def cancel(self):
+        self.token.cancel()
+
+    def is_cancelled(self) -> bool:
+        return self.token.is_cancelled()
+
+
+class TaskQueue:
+    """命名队列：按优先级（大者优先）、同优先级按提交顺序调度，同时最多运行 concurrency 个"""
+
+    def __init__(self, name: str, concurrency: int = 1, max_pending: int = 0):
+        self.name = name
+        self.concurrency = concurrency
+        self.max_pending = max_pending
+        self.running: List[TaskHandle] = []
+        self.pending: List = []  # 堆：(-priority, 序号, TaskHandle)
+
+    def is_full(self) -> bool:
+        return len(self.running) >= self.concurrency and len(self.pending) >= self.max_pending
+
+
 class TaskManager(QObject):
     _instance = None
 
     def __init__(self):
         super().__init__()
         self.thread_pool = QThreadPool.globalInstance()
-        self.thread_pool.setMaxThreadCount(1)
+        self.thread_pool.setMaxThreadCount(MAX_THREADS)
+        self._queues: Dict[str, TaskQueue] = {}
+        self._seq = itertools.count()
+        self._lock = threading.RLock()
+        for name, concurrency, max_pending in DEFAULT_QUEUES:
+            self.add_queue(name, concurrency, max_pending)
 
     @classmethod
     def instance(cls):
@@ -43,19 +216,81 @@ class TaskManager(QObject):
             cls._instance = TaskManager()
         return cls._instance
 
+    def add_queue(self, name: str, concurrency: int = 1, max_pending: int = 0):
+        """新增或调整一个命名队列"""
+        with self._lock:
+            q = self._queues.get(name)
+            if q is None:
+                self._queues[name] = TaskQueue(name, concurrency, max_pending)
+            else:
+                q.concurrency, q.max_pending = concurrency, max_pending
+                self._dispatch(q)
+
     def submit_task(self, func, args=(), kwargs={},
-                    on_success=None, on_error=None):
-        # 获取当前是否有任务运行
-        if self.thread_pool.activeThreadCount() >= 1:
-            raise RuntimeError("请等待当前任务完成")
-        """ 提交任务并绑定回调 """
-        task = TaskRunnable(func, args, kwargs)
-        # 绑定信号到回调（使用队列连接保证线程安全）
-        if on_success:
-            task.signals.finished.connect(on_success, Qt.QueuedConnection)
-        if on_error:
-            task.signals.error.connect(on_error, Qt.QueuedConnection)
-        self.thread_pool.start(task)  # 将任务提交到线程池
+                    on_success=None, on_error=None, on_progress=None, on_start=None, on_cancel=None,
+                    queue: str = 'default', priority: int = 0) -> TaskHandle:
+        """
+        提交任务并绑定回调，队列已满时抛出 RuntimeError。
+        任务可能先排队：界面状态（提示框、清空表格）放在 on_start 里做；
+        排队期间被取消的任务只回调 on_cancel
+        """
+        with self._lock:
+            q = self._queues[queue]
+            if q.is_full():
+                raise RuntimeError("请等待当前任务完成")
+            handle = TaskHandle(func, args, kwargs, queue, priority)
+            # 先登记完成，再回调，回调里可以立即向同一队列提交新任务（使用队列连接保证线程安全）
+            handle.signals.finished.connect(lambda _: self._task_done(handle), Qt.QueuedConnection)
+            handle.signals.error.connect(lambda _: self._task_done(handle), Qt.QueuedConnection)
+            if on_success:
+                handle.signals.finished.connect(on_success, Qt.QueuedConnection)
+            if on_error:
+                handle.signals.error.connect(on_error, Qt.QueuedConnection)
+            if on_progress:
+                handle.signals.progress.connect(on_progress, Qt.QueuedConnection)
+            if on_start:
+                handle.signals.started.connect(on_start, Qt.QueuedConnection)
+            if on_cancel:
+                handle.signals.cancelled.connect(on_cancel, Qt.QueuedConnection)
+            heapq.heappush(q.pending, (-priority, next(self._seq), handle))
+            self._dispatch(q)
+            return handle
+
+    def _dispatch(self, q: TaskQueue):
+        while len(q.running) < q.concurrency and q.pending:
+            _, _, handle = heapq.heappop(q.pending)
+            if handle.is_cancelled():
+                handle.done = True  # 排队期间被取消，不再运行
+                handle.signals.cancelled.emit()
+                continue
+            handle.started = True
+            q.running.append(handle)
+            self.thread_pool.start(handle.runnable)  # 将任务提交到线程池
+
+    def _task_done(self, handle: TaskHandle):
+        with self._lock:
+            q = self._queues[handle.queue]
+            if handle in q.running:
+                q.running.remove(handle)
+            handle.done = True
+            self._dispatch(q)
+
+    def cancel_queue(self, name: str):
+        """取消队列中排队和正在运行的全部任务，排队的任务立即移出并发 cancelled"""
+        with self._lock:
+            q = self._queues[name]
+            for handle in q.running:
+                handle.cancel()
+            pending, q.pending = q.pending, []
+            for _, _, handle in pending:
+                handle.cancel()
+                handle.done = True
+                handle.signals.cancelled.emit()
+
+    def is_busy(self, queue: str = None) -> bool:
+        with self._lock:
+            queues = [self._queues[queue]] if queue else self._queues.values()
+            return any(q.running or q.pending for q in queues)
 
 
 task_manager = TaskManager.instance()